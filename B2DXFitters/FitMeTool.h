@@ -80,6 +80,12 @@ public:
   // Get the fit result (RooFitResult object)
   RooFitResult* getFitResult();
   
+  // Fit mode for simultaneous model PDFs: split the NLL by category of the
+  // RooSimultaneous index category (e.g. "sample") into nWorkers partitions
+  // of about equal measured evaluation cost, each evaluated in its own
+  // worker process for the whole fit (nWorkers <= 1: plain fitTo)
+  void setCategoryParallelFit( int nWorkers );
+  
   // Set the random seed for toy MC event generation
   void setSeed( int seed );
   // Get the random seed last generated/set and stored
@@ -213,6 +219,9 @@ protected:
   // Get all model PDF variables matching a wildcard
   RooArgSet* getMatchingVariableNames( const char* wildcard = "*Evts" , bool debug = false);  
   
+  // Fit with the NLL partitioned by category (see setCategoryParallelFit)
+  RooFitResult* fitCategoryParallel( const RooLinkedList& cmdArgs );
+  
  
 
   protected:  // Data members
@@ -227,6 +236,7 @@ protected:
   int  m_config_seed;
   bool m_config_seedSet;
   bool m_config_saveFitResult2File;
+  int  m_config_categoryWorkers;
   
   // Model PDF
   RooAbsPdf* m_modelPDF;
@@ -25,6 +25,8 @@
 #include "TH2F.h"
 #include "TH3F.h"
 #include "TTree.h"
+#include "TChain.h"
+#include "TTreeFormula.h"
 #include "TCut.h"
 #include "RooAbsData.h"
 #include "RooAbsPdf.h"
@@ -124,6 +126,8 @@ namespace GeneralUtils {
   // line 3: name of the second file, for example: FitTuple_MergedTree_Bd2DPi_D2KPiPi_MU_BDTG_MINI.root
   // line 4: name of tree for the first file, for example: DecayTree
   // line 5: name of tree for the second file, for example: DecayTree
+  // A file line may list several comma separated files (or use wildcards);
+  // they are read as one TChain (see OpenTreeChain).
   //===========================================================================
   TTree* ReadTreeData(std::vector <std::string> &FileName,int  sample, bool debug = false);
 
@@ -134,6 +138,34 @@ namespace GeneralUtils {
   //===========================================================================
   TTree* ReadTreeMC(const char* fileName, const char* treeName, bool        debug = false);
 
+  //===========================================================================
+  // Open a TChain over fileNames (each entry may be a comma separated list
+  // of files, wildcards are allowed) with a TTreeCache and asynchronous
+  // prefetching; used by ReadTreeData and ReadTreeMC.
+  // If a staging directory is set (ConfigureTreeReading, or the environment
+  // variable B2DXFITTERS_STAGING_DIR), plain local/network filesystem files
+  // are first copied there; copies are keyed by a checksum of path, size and
+  // modification time, and reused as long as the original is unchanged.
+  // Returns NULL if none of the files contains treeName.
+  //===========================================================================
+  TChain* OpenTreeChain(std::vector <TString> &fileNames, const char* treeName, bool debug = false);
+
+  //===========================================================================
+  // Settings for OpenTreeChain: staging directory ("" for none), TTreeCache
+  // size in bytes, and whether to prefetch asynchronously
+  //===========================================================================
+  void ConfigureTreeReading(TString stagingDir,
+                            Long64_t cacheSize = 32*1024*1024,
+                            bool asyncPrefetch = true);
+
+  //===========================================================================
+  // Print I/O statistics (bytes read by ROOT since the tree was opened,
+  // TTreeCache hit rate, wall time) for a tree returned by OpenTreeChain
+  // in debug mode; the opening time is forgotten once reported, so later
+  // calls only print the total bytes read and the cache hit rate
+  //===========================================================================
+  void PrintTreeIOStatistics(TTree* tree);
+
   //===========================================================================
   // Read one name (mode) for MC2011-March
   // if the path to the MC file: /afs/cern.ch/project/lbcern/vol0/adudziak/MCAddBDTG/Merged_Bd2DstPi_Dst2D-Pi0_MD_BsHypo_BDTG.root then
@@ -164,6 +196,28 @@ namespace GeneralUtils {
 		 TString &mode,
 		 bool        debug = false);
 
+  //===========================================================================
+  // Prepare tree for a single, selective pass over its entries:
+  // only the branches holding the leaves in varNames and those used by
+  // the selection cut are enabled (and added to a TTreeCache of cacheSize
+  // bytes), all others are switched off.
+  // Returns the compiled selection (NULL for an empty cut) which the caller
+  // owns; use PassTreeCut to evaluate it for a given entry.
+  //==========================================================================
+  TTreeFormula* PrepareTreeReading(TTree* tree,
+                                   std::vector <TString> &varNames,
+                                   TCut &cut,
+                                   Long64_t cacheSize = 32*1024*1024,
+                                   bool        debug = false);
+
+  //===========================================================================
+  // Load entry of tree prepared by PrepareTreeReading, and evaluate the
+  // selection on it (without reading any other branch); returns true if
+  // the entry passes (always if selection is NULL). Call tree->GetEntry
+  // afterwards to read the enabled branches of selected entries.
+  //==========================================================================
+  bool PassTreeCut(TTree* tree, TTreeFormula* selection, Long64_t entry);
+
   //===========================================================================
   // Save template to the pdf file
   //==========================================================================
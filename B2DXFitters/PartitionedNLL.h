@@ -0,0 +1,40 @@
+/**
+ * @file PartitionedNLL.h
+ *
+ * sum of partial NLLs evaluated concurrently in worker processes
+ *
+ * Each term is usually a RooRealMPFE wrapping the NLL of a group of
+ * categories of a simultaneous fit; RooRealMPFE keeps a worker process
+ * around for the lifetime of the object, and ships parameter changes to it.
+ * Summing such terms with a RooAddition would wait for each worker in turn;
+ * PartitionedNLL first dispatches the calculation to all workers whose
+ * inputs have changed, and only then collects and sums the results, so the
+ * partial NLLs are computed in parallel for each MIGRAD step. Terms which
+ * are not RooRealMPFEs (e.g. constraint terms) are evaluated in the calling
+ * process while the workers are busy.
+ */
+#ifndef PARTITIONEDNLL
+#define PARTITIONEDNLL
+
+#include "RooAbsReal.h"
+#include "RooListProxy.h"
+
+class PartitionedNLL : public RooAbsReal {
+public:
+  PartitionedNLL() {} ;
+  PartitionedNLL(const char *name, const char *title, const RooArgList& terms);
+  PartitionedNLL(const PartitionedNLL& other, const char* name=0) ;
+  virtual TObject* clone(const char* newname) const { return new PartitionedNLL(*this,newname); }
+  virtual ~PartitionedNLL();
+
+protected:
+
+  RooListProxy _terms;
+
+  Double_t evaluate() const;
+
+private:
+  ClassDef(PartitionedNLL, 1);
+};
+
+#endif
@@ -0,0 +1,124 @@
+/**
+ * @file RooBDecayEnvelopeGenContext.h
+ *
+ * fast generator context for RooBDecay based decay time pdfs with tagging,
+ * Gaussian resolution and an (unbinned) acceptance
+ */
+#ifndef ROO_BDECAY_ENVELOPE_GEN_CONTEXT
+#define ROO_BDECAY_ENVELOPE_GEN_CONTEXT
+
+#include <vector>
+
+#include "RooArgSet.h"
+#include "RooArgList.h"
+#include "RooAbsGenContext.h"
+
+class RooAbsPdf;
+class RooAbsReal;
+class RooAbsCategoryLValue;
+class RooRealVar;
+class RooDataSet;
+
+/** @brief generator context for RooBDecay based decay time pdfs
+ *
+ * RooFit's generic accept/reject generator for a decay time pdf of the form
+ * acceptance(t) x [resolution (x) RooBDecay(t, qf, qt; eta)] has to find the
+ * maximum of the full pdf and evaluates the (convolved) pdf for every trial.
+ * This context generates such a pdf directly:
+ *
+ * - the discrete observables (final state charge, tagging decisions) and the
+ *   true decay time are drawn together from the exponential envelope
+ *   exp(-(Gamma - |DeltaGamma|/2) t) (|f_cosh| + |f_sinh| + sqrt(f_cos^2 +
+ *   f_sin^2)), with the cosh/sinh/cos/sin coefficients evaluated for each
+ *   combination of discrete observables (they depend on the per-event
+ *   mistags), and accepted against the true (unsmeared) decay rate
+ * - the true decay time is then smeared with the resolution model (sum of
+ *   Gaussians with common bias and scale factor, widths either constant or
+ *   per-event decay time errors)
+ * - finally, the acceptance is applied as accept/reject weight on the
+ *   smeared decay time (with the maximum of the acceptance determined once)
+ *
+ * Per-event quantities (mistags, decay time error) must be supplied as
+ * prototype data.
+ */
+class RooBDecayEnvelopeGenContext : public RooAbsGenContext
+{
+    public:
+	/** @brief constructor
+	 *
+	 * @param model		full decay time pdf (used for naming)
+	 * @param vars		observables to generate (decay time, final
+	 * 			state charge, tagging decisions)
+	 * @param time		decay time observable
+	 * @param tau		lifetime
+	 * @param dgamma	width difference
+	 * @param dm		mixing frequency
+	 * @param fcosh		coefficient of cosh term
+	 * @param fsinh		coefficient of sinh term
+	 * @param fcos		coefficient of cos term
+	 * @param fsin		coefficient of sin term
+	 * @param sigmas	widths of Gaussian resolution components
+	 * 			(empty list for perfect resolution)
+	 * @param fractions	fractions of the first sigmas.size() - 1
+	 * 			resolution components
+	 * @param bias		resolution bias
+	 * @param scale		scale factor (applied to bias and widths, as in
+	 * 			RooGaussModel)
+	 * @param acceptance	acceptance (0 for none)
+	 * @param prototype	prototype data (per-event mistags, decay time
+	 * 			errors)
+	 * @param verbose	verbose flag
+	 */
+	RooBDecayEnvelopeGenContext(const RooAbsPdf& model,
+		const RooArgSet& vars, const RooRealVar& time,
+		const RooAbsReal& tau, const RooAbsReal& dgamma,
+		const RooAbsReal& dm,
+		const RooAbsReal& fcosh, const RooAbsReal& fsinh,
+		const RooAbsReal& fcos, const RooAbsReal& fsin,
+		const RooArgList& sigmas, const RooArgList& fractions,
+		const RooAbsReal& bias, const RooAbsReal& scale,
+		const RooAbsReal* acceptance = 0,
+		const RooDataSet* prototype = 0, Bool_t verbose = kFALSE);
+	virtual ~RooBDecayEnvelopeGenContext();
+
+	/// number of trials (true decay time, smeared decay time) so far
+	ULong64_t nTrials() const { return _nTrials; }
+
+	virtual void printMultiline(std::ostream& os,
+		Int_t content, Bool_t verbose=kFALSE, TString indent="") const;
+
+    protected:
+	virtual void initGenerator(const RooArgSet& theEvent);
+	virtual void generateEvent(RooArgSet& theEvent, Int_t remaining);
+
+    private:
+	/// find arg in event, fall back to its clone
+	RooAbsReal* attached(const RooArgSet& theEvent, const RooAbsArg& arg) const;
+
+	RooArgSet _inputs;		///< inputs (not owned)
+	RooArgSet* _cloneSet;		///< owned clones of inputs
+	RooArgList _sigmaList;		///< resolution widths (not owned)
+	RooArgList _fracList;		///< resolution fractions (not owned)
+	TString _timeName;		///< name of decay time observable
+	TString _tauName, _dgammaName, _dmName;
+	TString _coeffNames[4];
+	TString _biasName, _scaleName, _accName;
+	RooRealVar* _t;			///< decay time in event
+	RooAbsReal* _coeff[4];		///< cosh/sinh/cos/sin coefficients
+	RooAbsReal* _acc;		///< acceptance (or 0)
+	RooAbsReal* _bias;		///< resolution bias
+	RooAbsReal* _scale;		///< resolution scale factor
+	std::vector<RooAbsReal*> _sigmas;	///< resolution widths
+	std::vector<RooAbsReal*> _fracs;	///< resolution fractions
+	std::vector<RooAbsCategoryLValue*> _cats; ///< discrete observables
+	std::vector<std::vector<Int_t> > _states; ///< their combinations
+	std::vector<Double_t> _coeffVals;	///< coefficients per state
+	std::vector<Double_t> _envelope;	///< cumulative envelope weights
+	Double_t _gamma, _dgamma, _dm, _gammaMin;
+	Double_t _accMax;
+	ULong64_t _nTrials;
+
+	ClassDef(RooBDecayEnvelopeGenContext, 0);
+};
+
+#endif // ROO_BDECAY_ENVELOPE_GEN_CONTEXT
@@ -42,6 +42,9 @@ namespace SFitUtils {
   // Name of file is read from filesDirand signature sig
   // time_{up,down} - range for tVar
   // part means mode (DsPi, DsK and so on)
+  // The tree is read in a single pass over the needed branches; with
+  // chunkSize > 0 (and sWeightsCorr) at most chunkSize events are buffered
+  // at a time, at the price of a quick extra pass over the sWeight branches
   //===========================================================================
 
   RooWorkspace* ReadDataFromSWeights(TString& pathFile,
@@ -56,7 +59,8 @@ namespace SFitUtils {
                                      bool toys = false,
                                      bool applykfactor = false,
                                      bool sWeightsCorr = false,
-                                     bool        debug = false
+                                     bool        debug = false,
+                                     Long64_t chunkSize = 0
                                      );
   
   //===========================================================================
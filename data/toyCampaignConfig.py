@@ -0,0 +1,43 @@
+def getconfig() :
+
+    configdict = {}
+
+    ############################################################
+    #Toy campaign for scripts/runToyCampaign.py: generate with
+    #toyFactory.py, then fit the signal-only toy with
+    #runSFit_Bd.py, which writes the pull tree.
+    #In commands and file names, {seed} is replaced by the toy
+    #seed, {workdir} by the work directory, and {<key>} by the
+    #entry <key> of "Parameters".
+    ############################################################
+
+    configdict["Seeds"] = [0, 1000] #stop excluded
+    configdict["WorkDir"] = "/tmp/B2DXToys/SignalOnly/"
+
+    configdict["Parameters"] = {"scripts"  : "/path/to/B2DXFitters/scripts/",
+                                "genconfig": "/path/to/B2DXFitters/data/Bd2DPi_3fbCPV/Bd2DPi/Bd2DPiConfigForSignalToysGeneration.py",
+                                "fitconfig": "/path/to/B2DXFitters/data/Bd2DPi_3fbCPV/Bd2DPi/Bd2DPiConfigForSFitOnSignalToys.py",
+                                "nickname" : "SignalOnly"}
+
+    configdict["Stages"] = [
+        ["generate",
+         "python {scripts}toyFactory.py --configName {genconfig} --seed {seed} --outputdir {workdir} "
+         "--workfileOut GenToyWorkspace_{nickname}_{seed}.root --treefileOut GenToyTree_{nickname}_{seed}.root --saveTree"],
+        ["fit",
+         "python {scripts}runSFit_Bd.py --pereventmistag --toys --fileName {workdir}GenToyTree_{nickname}_{seed}.root "
+         "--save {workdir}TimeFitToysResult_{nickname}_{seed}.root --fileNamePull {workdir}PullTree_{nickname}_{seed}.root "
+         "--outputdir {workdir} --configName {fitconfig} --pol both --mode kpipi --year run1 --hypo Bd2DPi "
+         "--merge both --randomise --seed {seed}"]
+        ]
+
+    #Pull tree written by the last stage; its entry is stored in the
+    #job database as soon as the toy is done
+    configdict["PullFile"] = "{workdir}PullTree_{nickname}_{seed}.root"
+    configdict["PullTree"] = "PullTree"
+
+    #Files removed once a toy is done (the pulls are in the database)
+    configdict["CleanUp"] = ["{workdir}GenToyWorkspace_{nickname}_{seed}.root",
+                             "{workdir}GenToyTree_{nickname}_{seed}.root",
+                             "{workdir}PullTree_{nickname}_{seed}.root"]
+
+    return configdict
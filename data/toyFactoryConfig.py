@@ -237,6 +237,18 @@ def getconfig() :
                                                      "ScaleFactor": [1.0]}
                                                     }
         
+    ############################################################ 
+    #Proto data (per-event mistags, time errors) sampling:
+    #"RooFit" uses RooAbsPdf.generate, "InverseCDF" tabulates
+    #the templates once and draws by (much faster) inverse-CDF
+    #lookup; taggers sharing one 2D (OS/SS) mistag template are
+    #sampled jointly. "ProtoDataSamplerBins" gives the table
+    #cells per observable for 1D and 2D templates.
+    ############################################################
+
+    configdict["ProtoDataSampler"] = "RooFit"
+    #configdict["ProtoDataSamplerBins"] = [1000, 200]
+
     ############################################################ 
     #Production and detection asymmetries
     ############################################################
@@ -278,7 +290,8 @@ def getconfig() :
                                     "ModLf"                : [ModAbarf_d/ModAf_d],
                                     "ParameteriseIntegral" : True,
                                     "NBinsAcceptance"      : 0, #keep at zero if using spline acceptance!
-                                    "NBinsProperTimeErr"   : 100}
+                                    "NBinsProperTimeErr"   : 100,
+                                    "TimeGenerator"        : "RooFit"} #"Envelope" for the (much faster) dedicated generator
 
     for comp in configdict["Components"].iterkeys():
         if comp != "Signal":
@@ -0,0 +1,97 @@
+from ROOT import RooFit, RooRealVar, RooCategory, RooArgSet
+from B2DXFitters.WS import WS
+from B2DXFitters import acceptanceutils, resmodelutils, timepdfutils_Bd, cpobservables
+
+def getfitmodel(ws, myconfigfile, debug) :
+
+    ############################################################
+    #Fit model for the in-process generate-and-fit pipeline of
+    #scripts/toyFactory.py (--fitModel): decay time fit of the
+    #signal toy generated with data/toyFactoryConfig.py.
+    #Observables have the names used by toyFactory, so the
+    #generated data set is fitted as it is. Per-event time errors
+    #and mistags are conditional observables. The CP coefficients
+    #float, starting from (and pulled against) their generated
+    #values; everything else is fixed to the generated value.
+    ############################################################
+
+    obs = myconfigfile["Observables"]
+    time = WS(ws, RooRealVar("BeautyTime", obs["BeautyTime"]["Title"], *obs["BeautyTime"]["Range"]))
+    terr = WS(ws, RooRealVar("BeautyTimeErr", obs["BeautyTimeErr"]["Title"], *obs["BeautyTimeErr"]["Range"]))
+    qf = RooCategory("BacCharge", obs["BacCharge"]["Title"])
+    for label, index in obs["BacCharge"]["Categories"].iteritems():
+        qf.defineType(label, index)
+    qf = WS(ws, qf)
+
+    #Tagging: one decision, mistag and calibration per tagger
+    qt = []
+    mistag = []
+    mistagcalib = []
+    for tagger in ["OS", "SS"]:
+        cat = RooCategory("TagDec"+tagger, obs["TagDec"+tagger]["Title"])
+        for label, index in obs["TagDec"+tagger]["Categories"].iteritems():
+            cat.defineType(label, index)
+        qt.append(WS(ws, cat))
+        mistag.append(WS(ws, RooRealVar("Mistag"+tagger, obs["Mistag"+tagger]["Title"], *obs["Mistag"+tagger]["Range"])))
+        calib = myconfigfile["Taggers"]["Signal"][tagger]["Calibration"]
+        caliblist = []
+        for p in ["p0", "p1", "deltap0", "deltap1", "avgeta", "tageff", "tagasymm"]:
+            par = WS(ws, RooRealVar(p+"_"+tagger, p+"_"+tagger, calib[p][0]))
+            par.setConstant(True)
+            caliblist.append(par)
+        mistagcalib.append(caliblist)
+
+    #Acceptance and per-event resolution
+    resacc = myconfigfile["ResolutionAcceptance"]["Signal"]
+    acc, accnorm = acceptanceutils.buildSplineAcceptance(ws, time, "Acceptance",
+                                                         resacc["Acceptance"]["KnotPositions"],
+                                                         resacc["Acceptance"]["KnotCoefficients"],
+                                                         False, debug)
+    config = {"Context"                        : "FIT",
+              "AcceptanceFunction"             : resacc["Acceptance"]["Type"],
+              "DecayTimeResolutionModel"       : "GaussianWithPEDTE",
+              "DecayTimeResolutionBias"        : resacc["Resolution"]["Bias"][0],
+              "DecayTimeResolutionScaleFactor" : resacc["Resolution"]["ScaleFactor"][0],
+              "DecayTimeResolutionAvg"         : resacc["Resolution"]["Average"][0]}
+    resmodel, acc = resmodelutils.getResolutionModel(ws, config, time, terr, acc)
+
+    #Decay rate and CP parameters
+    acp = myconfigfile["ACP"]["Signal"]
+    Gamma = WS(ws, RooRealVar("Gamma", "Gamma", acp["Gamma"][0]))
+    DeltaGamma = WS(ws, RooRealVar("DeltaGamma", "DeltaGamma", acp["DeltaGamma"][0]))
+    DeltaM = WS(ws, RooRealVar("DeltaM", "DeltaM", acp["DeltaM"][0]))
+    for par in [Gamma, DeltaGamma, DeltaM]:
+        par.setConstant(True)
+    ACPobs = cpobservables.AsymmetryObservables(acp["ArgLf"][0], acp["ArgLbarfbar"][0], acp["ModLf"][0])
+    C = WS(ws, RooRealVar("C", "C", ACPobs.Cf(), -3.0, 3.0))
+    S = WS(ws, RooRealVar("S", "S", ACPobs.Sf(), -3.0, 3.0))
+    D = WS(ws, RooRealVar("D", "D", ACPobs.Df(), -3.0, 3.0))
+    Sbar = WS(ws, RooRealVar("Sbar", "Sbar", ACPobs.Sfbar(), -3.0, 3.0))
+    Dbar = WS(ws, RooRealVar("Dbar", "Dbar", ACPobs.Dfbar(), -3.0, 3.0))
+
+    aprod = WS(ws, RooRealVar("AProd", "AProd", myconfigfile["ProductionAsymmetry"]["Signal"][0]))
+    adet = WS(ws, RooRealVar("ADet", "ADet", myconfigfile["DetectionAsymmetry"]["Signal"][0]))
+    aprod.setConstant(True)
+    adet.setConstant(True)
+
+    pdfconfig = {"Context"              : "FIT",
+                 "Debug"                : True if debug else False,
+                 "ParameteriseIntegral" : acp["ParameteriseIntegral"],
+                 "UseProtoData"         : True,
+                 "NBinsAcceptance"      : acp["NBinsAcceptance"],
+                 "NBinsProperTimeErr"   : acp["NBinsProperTimeErr"]}
+    pdf = timepdfutils_Bd.buildBDecayTimePdf(pdfconfig, "time_signal", ws,
+                                             time, terr, qt, qf, mistag, mistagcalib,
+                                             Gamma, DeltaGamma, DeltaM,
+                                             C, D, Dbar, S, Sbar,
+                                             resmodel, acc,
+                                             None, None,
+                                             aprod, adet)
+
+    return {"PDF"        : pdf,
+            "FitOptions" : [RooFit.ConditionalObservables(RooArgSet(terr, mistag[0], mistag[1])),
+                            RooFit.Offset(True),
+                            RooFit.Minimizer("Minuit2", "migrad"),
+                            RooFit.Optimize(True),
+                            RooFit.Hesse(True),
+                            RooFit.Strategy(2)]}
@@ -19,6 +19,7 @@
 #include "B2DXFitters/FitMeTool.h"
 #include "B2DXFitters/CombBkgPTPdf.h"
 #include "B2DXFitters/SquaredSum.h"
+#include "B2DXFitters/PartitionedNLL.h"
 #include "B2DXFitters/Inverse.h"
 #include "B2DXFitters/MistagDistribution.h"
 #include "B2DXFitters/MistagCalibration.h"
@@ -76,6 +77,7 @@ template class std::pair<std::string,RooAbsData*>;
 #include "B2DXFitters/RooComplementCoef.h"
 #include "B2DXFitters/RooKResModel.h"
 #include "B2DXFitters/RooKConvGenContext.h"
+#include "B2DXFitters/RooBDecayEnvelopeGenContext.h"
 #include "B2DXFitters/RooSimultaneousResModel.h"
 #include "B2DXFitters/DLLTagCombiner.h"
 #include "B2DXFitters/TagDLLToTagDec.h"
@@ -0,0 +1,372 @@
+"""
+@file campaignutils.py
+
+@brief run toy campaigns (generate -> fit -> pull extraction) on a local
+       process pool, with the state of each toy kept in an SQLite database
+
+Each toy (seed) is one job: a list of shell commands (stages, e.g.
+toyFactory.py, then a fitter writing a pull tree) run one after the other.
+The database records the state of every seed, so an interrupted campaign
+can simply be restarted: completed seeds are skipped, failed ones are
+retried (up to a maximum number of attempts) and the tail of their log is
+kept in the database. Pull rows are read from each job's pull tree as soon
+as the job is done and stored in the database, so there is no final merging
+step; exportPulls writes them to a single pull tree when needed.
+"""
+
+import os, time, sqlite3
+
+# job states
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+class JobDatabase(object):
+    """
+    SQLite database holding the state of the jobs of a toy campaign
+
+    Only the orchestrating process writes to the database, so no locking
+    beyond what SQLite does anyway is needed.
+    """
+    def __init__(self, filename):
+        """
+        open (or create) database
+
+        filename    -- name of SQLite file
+        """
+        self.db = sqlite3.connect(filename)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            seed INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            stage TEXT,
+            started REAL,
+            finished REAL,
+            log TEXT)''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS pulls (
+            seed INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value REAL,
+            PRIMARY KEY (seed, name))''')
+        self.db.commit()
+
+    def addSeeds(self, seeds):
+        """ add seeds not yet known to the database as pending jobs """
+        self.db.executemany('INSERT OR IGNORE INTO jobs (seed, status) '
+                'VALUES (?, ?)', [ (int(s), PENDING) for s in seeds ])
+        self.db.commit()
+
+    def recover(self):
+        """
+        mark jobs left running by an interrupted campaign as failed, so they
+        are retried
+
+        returns the number of such jobs
+        """
+        n = self.db.execute('UPDATE jobs SET status = ?, log = ? WHERE '
+                'status = ?', (FAILED, 'interrupted', RUNNING)).rowcount
+        self.db.commit()
+        return n
+
+    def runnable(self, seeds, maxAttempts):
+        """
+        return seeds (among seeds) which still need to be run, in order:
+        pending ones, and failed ones with fewer than maxAttempts attempts
+        """
+        states = dict(self.db.execute('SELECT seed, status || ":" || '
+            'attempts FROM jobs').fetchall())
+        retVal = []
+        for s in seeds:
+            status, attempts = states[int(s)].split(':')
+            if PENDING == status or (FAILED == status and
+                    int(attempts) < maxAttempts):
+                retVal.append(int(s))
+        return retVal
+
+    def start(self, seed):
+        """ mark job as running """
+        self.db.execute('UPDATE jobs SET status = ?, attempts = attempts + 1, '
+                'stage = NULL, started = ?, finished = NULL WHERE seed = ?',
+                (RUNNING, time.time(), seed))
+        self.db.commit()
+
+    def setStage(self, seed, stage):
+        """ record stage a running job is in """
+        self.db.execute('UPDATE jobs SET stage = ? WHERE seed = ?',
+                (stage, seed))
+        self.db.commit()
+
+    def finish(self, seed, ok, log = None, pulls = None):
+        """
+        mark job as done (ok is True) or failed
+
+        seed    -- seed of job
+        ok      -- True if the job succeeded
+        log     -- log (tail) to keep in the database
+        pulls   -- dictionary name -> value of pull tree entries to store
+        """
+        self.db.execute('UPDATE jobs SET status = ?, finished = ?, log = ? '
+                'WHERE seed = ?', (DONE if ok else FAILED, time.time(), log,
+                    seed))
+        if None != pulls:
+            self.db.execute('DELETE FROM pulls WHERE seed = ?', (seed, ))
+            self.db.executemany('INSERT INTO pulls (seed, name, value) '
+                    'VALUES (?, ?, ?)', [ (seed, k, v) for k, v in
+                        sorted(pulls.items()) ])
+        self.db.commit()
+
+    def summary(self):
+        """ return dictionary status -> number of jobs """
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM jobs '
+            'GROUP BY status').fetchall())
+
+    def failures(self):
+        """ return list of (seed, attempts, stage, log) of failed jobs """
+        return self.db.execute('SELECT seed, attempts, stage, log FROM jobs '
+                'WHERE status = ? ORDER BY seed', (FAILED, )).fetchall()
+
+    def pullRows(self):
+        """
+        return (list of names, list of (seed, [ values ])) of all pull rows
+
+        values missing for a seed are None
+        """
+        names = [ r[0] for r in self.db.execute('SELECT DISTINCT name FROM '
+            'pulls ORDER BY name') ]
+        index = dict((n, i) for i, n in enumerate(names))
+        rows = []
+        for seed, name, value in self.db.execute('SELECT seed, name, value '
+                'FROM pulls ORDER BY seed'):
+            if 0 == len(rows) or rows[-1][0] != seed:
+                rows.append((seed, len(names) * [ None ]))
+            rows[-1][1][index[name]] = value
+        return names, rows
+
+def freeMemory():
+    """
+    return available memory in MB (from /proc/meminfo), or None if unknown
+    """
+    try:
+        for line in open('/proc/meminfo'):
+            if line.startswith('MemAvailable:'):
+                return int(line.split()[1]) / 1024.
+    except IOError:
+        pass
+    return None
+
+def readPullTree(filename, treename = 'PullTree'):
+    """
+    read the (first) entry of a pull tree as written by
+    FitResultGrabberUtils.CreatePullTree
+
+    returns dictionary branch name -> value
+    """
+    import ROOT
+    f = ROOT.TFile.Open(filename)
+    if None == f or f.IsZombie():
+        raise IOError('Unable to open %s' % filename)
+    t = f.Get(treename)
+    if None == t or t.GetEntries() < 1:
+        f.Close()
+        raise IOError('No entries in %s in %s' % (treename, filename))
+    t.GetEntry(0)
+    retVal = dict((l.GetName(), l.GetValue()) for l in t.GetListOfLeaves())
+    f.Close()
+    return retVal
+
+def exportPulls(db, filename, treename = 'PullTree'):
+    """
+    write all pull rows in the database into a single pull tree
+
+    db          -- JobDatabase
+    filename    -- output ROOT file
+    treename    -- name of tree
+
+    The tree has the same (float) branches as the per-toy pull trees, and an
+    additional branch "seed"; values missing for a toy are set to NaN.
+
+    returns number of entries written
+    """
+    import ROOT
+    from array import array
+    names, rows = db.pullRows()
+    f = ROOT.TFile.Open(filename, 'RECREATE')
+    t = ROOT.TTree(treename, treename)
+    seedbuf = array('i', [ 0 ])
+    t.Branch('seed', seedbuf, 'seed/I')
+    bufs = [ array('f', [ 0. ]) for n in names ]
+    for n, buf in zip(names, bufs):
+        t.Branch(n, buf, '%s/F' % n)
+    for seed, values in rows:
+        seedbuf[0] = seed
+        for buf, v in zip(bufs, values):
+            buf[0] = float('nan') if None == v else v
+        t.Fill()
+    t.Write()
+    f.Close()
+    return len(rows)
+
+def logTail(filename, nbytes = 8192):
+    """ return the last nbytes of a log file (empty string if missing) """
+    try:
+        f = open(filename)
+    except IOError:
+        return ''
+    f.seek(0, 2)
+    f.seek(max(0, f.tell() - nbytes))
+    retVal = f.read()
+    f.close()
+    return retVal
+
+class Campaign(object):
+    """
+    run the jobs of a toy campaign on a local process pool
+
+    The campaign is described by a dictionary:
+    - 'Seeds':      [ start, stop ] (stop excluded)
+    - 'WorkDir':    directory for outputs and logs
+    - 'Stages':     list of [ name, command ]; commands are shell commands
+                    (run in the order given, each only if the previous one
+                    succeeded), with '{seed}' and '{workdir}' (and any other
+                    key in 'Parameters') substituted (str.format, so
+                    literal braces, e.g. in shell ${var}, must be doubled)
+    - 'Parameters': dictionary of further substitutions (optional)
+    - 'PullFile':   pull tree file written by the last stage (optional,
+                    same substitutions); its entry is stored in the database
+    - 'PullTree':   name of pull tree (optional, default 'PullTree')
+    - 'CleanUp':    list of files to remove once a job is done (optional,
+                    same substitutions), e.g. the generated toy
+
+    Example:
+    @code
+    campaign = Campaign(config, JobDatabase('campaign.sqlite'))
+    campaign.run(nworkers = 8, maxAttempts = 3, minFreeMemory = 4000.)
+    @endcode
+    """
+    def __init__(self, config, db):
+        self.config = config
+        self.db = db
+        self.workdir = config['WorkDir']
+        self.seeds = range(*config['Seeds'])
+        if not os.path.isdir(self.workdir):
+            os.makedirs(self.workdir)
+        self.db.addSeeds(self.seeds)
+
+    def substitute(self, s, seed):
+        """ substitute '{seed}', '{workdir}' and parameters in s """
+        params = dict(self.config.get('Parameters', {}))
+        params.update({ 'seed': seed, 'workdir': self.workdir })
+        return s.format(**params)
+
+    def logFile(self, seed):
+        """ log file of job """
+        return os.path.join(self.workdir, 'log_%d.txt' % seed)
+
+    def launch(self, seed, stage):
+        """ start stage (index into 'Stages') of job, return Popen object """
+        import subprocess
+        name, command = self.config['Stages'][stage]
+        self.db.setStage(seed, name)
+        log = open(self.logFile(seed), 'a')
+        log.write('### stage %s: %s\n' % (name, self.substitute(command,
+            seed)))
+        log.flush()
+        retVal = subprocess.Popen(self.substitute(command, seed), shell = True,
+                cwd = self.workdir, stdout = log, stderr = subprocess.STDOUT)
+        log.close()
+        return retVal
+
+    def complete(self, seed):
+        """ job has run all stages: extract pulls, clean up, record it """
+        pulls = None
+        if 'PullFile' in self.config:
+            try:
+                pulls = readPullTree(self.substitute(self.config['PullFile'],
+                    seed), self.config.get('PullTree', 'PullTree'))
+            except IOError, e:
+                self.db.finish(seed, False, '%s\n%s' % (logTail(
+                    self.logFile(seed)), e))
+                return False
+        for f in self.config.get('CleanUp', []):
+            f = self.substitute(f, seed)
+            if os.path.exists(f): os.remove(f)
+        self.db.finish(seed, True, None, pulls)
+        return True
+
+    def run(self, nworkers = 1, maxAttempts = 3, minFreeMemory = None,
+            poll = 1.):
+        """
+        run all jobs which are not done yet
+
+        nworkers        -- maximum number of jobs running at the same time
+        maxAttempts     -- maximum number of attempts per job
+        minFreeMemory   -- do not start further jobs while less than this
+                           many MB of memory are available (at least one job
+                           is always kept running); None for no limit
+        poll            -- polling interval in seconds
+
+        returns the database summary (dictionary status -> number of jobs)
+        """
+        nrecovered = self.db.recover()
+        if nrecovered:
+            print 'Campaign: %d jobs of an interrupted run will be retried' % \
+                    nrecovered
+        queue = self.db.runnable(self.seeds, maxAttempts)
+        print 'Campaign: %d of %d seeds to run' % (len(queue),
+                len(self.seeds))
+        running = {} # seed -> (stage index, Popen)
+        try:
+            self.loop(queue, running, nworkers, maxAttempts, minFreeMemory,
+                    poll)
+        except KeyboardInterrupt:
+            # do not leave orphaned jobs behind
+            for seed in running:
+                running[seed][1].kill()
+                running[seed][1].wait()
+                self.db.finish(seed, False, '%s\ninterrupted' %
+                        logTail(self.logFile(seed)))
+            raise
+        return self.db.summary()
+
+    def loop(self, queue, running, nworkers, maxAttempts, minFreeMemory,
+            poll):
+        """ scheduling loop of run """
+        throttled = False
+        while len(queue) or len(running):
+            # start new jobs while there are free slots (and memory)
+            while len(queue) and len(running) < nworkers:
+                free = freeMemory()
+                if (None != minFreeMemory and None != free and
+                        free < minFreeMemory and len(running)):
+                    if not throttled:
+                        print ('Campaign: only %.0f MB of memory available, '
+                                'waiting for running jobs' % free)
+                    throttled = True
+                    break
+                throttled = False
+                seed = queue.pop(0)
+                if os.path.exists(self.logFile(seed)):
+                    os.remove(self.logFile(seed))
+                self.db.start(seed)
+                running[seed] = (0, self.launch(seed, 0))
+            time.sleep(poll)
+            # check on running jobs
+            for seed in sorted(running.keys()):
+                stage, proc = running[seed]
+                status = proc.poll()
+                if None == status: continue
+                del running[seed]
+                if 0 != status:
+                    self.db.finish(seed, False, '%s\n### stage %s failed '
+                            'with exit code %d' % (logTail(self.logFile(seed)),
+                                self.config['Stages'][stage][0], status))
+                    print 'Campaign: seed %d FAILED in stage %s' % (seed,
+                            self.config['Stages'][stage][0])
+                    if self.db.runnable([ seed ], maxAttempts):
+                        queue.append(seed)
+                elif stage + 1 < len(self.config['Stages']):
+                    running[seed] = (stage + 1, self.launch(seed, stage + 1))
+                elif self.complete(seed):
+                    print 'Campaign: seed %d done' % seed
+                else:
+                    print 'Campaign: seed %d FAILED reading pulls' % seed
+                    if self.db.runnable([ seed ], maxAttempts):
+                        queue.append(seed)
@@ -10,6 +10,451 @@
 import ROOT
 from B2DXFitters.WS import WS as WS
 
+# C++ helpers for columnar (bulk) access to data sets - compiled on first use
+__columnarHelpers = None
+
+def columnarHelpers():
+    """
+    return namespace with compiled C++ helpers for bulk data set access
+
+    The helpers copy data set columns into/from contiguous row-major buffers
+    of doubles (one row per event, one column per variable; categories are
+    represented by their index) without going through python for every
+    event. They are compiled with cling on first use; if that is not
+    possible (e.g. ROOT 5), None is returned, and callers are expected to
+    fall back to their per-event code path.
+    """
+    global __columnarHelpers
+    if None != __columnarHelpers: return __columnarHelpers
+    if not hasattr(ROOT.gInterpreter, 'Declare'): return None
+    ok = ROOT.gInterpreter.Declare("""
+    #include <vector>
+    #include "RooAbsData.h"
+    #include "RooDataSet.h"
+    #include "RooArgSet.h"
+    #include "RooArgList.h"
+    #include "RooAbsRealLValue.h"
+    #include "RooAbsCategoryLValue.h"
+    #include "TTree.h"
+    #include "TBranch.h"
+    #include "TObjArray.h"
+    namespace B2DXFittersColumnar {
+        // copy the columns named in cols for entries first to first + n - 1
+        // into out (n x ncols) and, if weights is non-zero, the event
+        // weights into weights
+        void extract(RooAbsData& data, const RooArgList& cols,
+                int first, int n, double* out, double* weights)
+        {
+            const RooArgSet* row = data.get();
+            const int ncols = cols.getSize();
+            std::vector<RooAbsReal*> reals(ncols, 0);
+            std::vector<RooAbsCategory*> cats(ncols, 0);
+            for (int j = 0; j < ncols; ++j) {
+                RooAbsArg* arg = row->find(cols.at(j)->GetName());
+                reals[j] = dynamic_cast<RooAbsReal*>(arg);
+                cats[j] = dynamic_cast<RooAbsCategory*>(arg);
+            }
+            for (int i = 0; i < n; ++i) {
+                data.get(first + i);
+                for (int j = 0; j < ncols; ++j, ++out) {
+                    if (reals[j]) *out = reals[j]->getVal();
+                    else if (cats[j]) *out = cats[j]->getIndex();
+                    else *out = 0.;
+                }
+                if (weights) weights[i] = data.weight();
+            }
+        }
+        // fill the rows of in (nrows x ncols) into t; the first ncols
+        // branches of t are filled in order, isint[j] says if branch j is an
+        // Int_t branch (otherwise, it must hold a Double_t)
+        void fillTree(TTree& t, const double* in, unsigned long nrows,
+                int ncols, const int* isint)
+        {
+            std::vector<Double_t> dbuf(ncols, 0.);
+            std::vector<Int_t> ibuf(ncols, 0);
+            TObjArray* branches = t.GetListOfBranches();
+            for (int j = 0; j < ncols; ++j) {
+                TBranch* b = static_cast<TBranch*>(branches->At(j));
+                if (isint[j]) b->SetAddress(&ibuf[j]);
+                else b->SetAddress(&dbuf[j]);
+            }
+            for (unsigned long i = 0; i < nrows; ++i) {
+                for (int j = 0; j < ncols; ++j, ++in) {
+                    if (isint[j]) ibuf[j] = Int_t(*in);
+                    else dbuf[j] = *in;
+                }
+                t.Fill();
+            }
+            t.ResetBranchAddresses();
+        }
+        // set the variables in cols to the rows of in (nrows x ncols), and
+        // add row (which must contain cols) to data for each of them;
+        // weights may be zero for unweighted data sets
+        void fill(RooDataSet& data, const RooArgSet& row,
+                const RooArgList& cols, const double* in,
+                unsigned long nrows, const double* weights)
+        {
+            const int ncols = cols.getSize();
+            std::vector<RooAbsRealLValue*> reals(ncols, 0);
+            std::vector<RooAbsCategoryLValue*> cats(ncols, 0);
+            for (int j = 0; j < ncols; ++j) {
+                reals[j] = dynamic_cast<RooAbsRealLValue*>(cols.at(j));
+                cats[j] = dynamic_cast<RooAbsCategoryLValue*>(cols.at(j));
+            }
+            for (unsigned long i = 0; i < nrows; ++i) {
+                for (int j = 0; j < ncols; ++j, ++in) {
+                    if (reals[j]) reals[j]->setVal(*in);
+                    else if (cats[j]) cats[j]->setIndex(int(*in));
+                }
+                if (weights) data.add(row, weights[i]);
+                else data.add(row);
+            }
+        }
+    }
+    """)
+    if not ok: return None
+    __columnarHelpers = ROOT.B2DXFittersColumnar
+    return __columnarHelpers
+
+def dataSetToArrays(dataset, variables = None, withWeight = False):
+    """
+    extract columns of a data set into numpy arrays in a single pass
+
+    dataset     -- RooAbsData to read from
+    variables   -- python list of variable names (or RooAbsArgs) to extract,
+                   default (None) is to extract all variables in the data set
+    withWeight  -- if True, the event weights are also returned
+
+    returns a dictionary mapping variable names to numpy arrays (dtype
+    float64, categories are returned as their index); if withWeight is True,
+    a tuple of that dictionary and an array of event weights is returned
+
+    Example:
+    @code
+    cols = dataSetToArrays(data, [ 'time', 'qt' ])
+    print cols['time'][cols['qt'] != 0].mean()
+    @endcode
+    """
+    import numpy
+    from ROOT import RooArgList
+    if None == variables:
+        variables = []
+        it = dataset.get().fwdIterator()
+        while True:
+            obj = it.next()
+            if None == obj: break
+            variables.append(obj.GetName())
+    names = [ (v if str == type(v) else v.GetName()) for v in variables ]
+    cols = RooArgList()
+    for n in names:
+        obj = dataset.get().find(n)
+        if None == obj:
+            raise NameError('Variable %s not found in data set %s' % (n,
+                dataset.GetName()))
+        cols.add(obj)
+    nentries = dataset.numEntries()
+    buf = numpy.zeros((nentries, len(names)), dtype = numpy.float64)
+    wbuf = (numpy.ones(nentries, dtype = numpy.float64) if withWeight else
+            None)
+    helpers = columnarHelpers()
+    if None != helpers and nentries > 0:
+        helpers.extract(dataset, cols, 0, nentries, buf,
+                wbuf if withWeight else ROOT.nullptr)
+    else:
+        objs = [ cols.at(j) for j in xrange(0, len(names)) ]
+        isreal = [ obj.InheritsFrom('RooAbsReal') for obj in objs ]
+        for i in xrange(0, nentries):
+            dataset.get(i)
+            for j in xrange(0, len(names)):
+                buf[i, j] = (objs[j].getVal() if isreal[j] else
+                        objs[j].getIndex())
+            if withWeight: wbuf[i] = dataset.weight()
+    retVal = dict((names[j], buf[:, j].copy()) for j in xrange(0, len(names)))
+    if withWeight: return retVal, wbuf
+    return retVal
+
+def fillDataSetFromArrays(dataset, row, columns, weights = None):
+    """
+    bulk-fill a RooDataSet from numpy arrays
+
+    dataset     -- RooDataSet to which events are added
+    row         -- RooArgSet with the variables to add for each event (it
+                   has to contain the variables named in columns, anything
+                   else is added with its current value)
+    columns     -- python list of (RooAbsArg, numpy array) tuples; the array
+                   holds the values (or category indices) to assign to the
+                   RooAbsArg for each event; all arrays must have the same
+                   length
+    weights     -- numpy array of event weights (or None for unit weights)
+
+    returns the number of events added
+    """
+    import numpy
+    from ROOT import RooArgList
+    if 0 == len(columns): return 0
+    nrows = len(columns[0][1])
+    for var, arr in columns:
+        if len(arr) != nrows:
+            raise ValueError('Column %s has wrong length' % var.GetName())
+    if 0 == nrows: return 0
+    buf = numpy.ascontiguousarray(numpy.column_stack(
+        [ arr for var, arr in columns ]), dtype = numpy.float64)
+    if weights is not None:
+        weights = numpy.ascontiguousarray(weights, dtype = numpy.float64)
+    helpers = columnarHelpers()
+    if None != helpers:
+        cols = RooArgList()
+        for var, arr in columns: cols.add(var)
+        helpers.fill(dataset, row, cols, buf, nrows,
+                weights if weights is not None else ROOT.nullptr)
+    else:
+        isreal = [ var.InheritsFrom('RooAbsRealLValue')
+                for var, arr in columns ]
+        for i in xrange(0, nrows):
+            for j in xrange(0, len(columns)):
+                if isreal[j]: columns[j][0].setVal(buf[i, j])
+                else: columns[j][0].setIndex(int(buf[i, j]))
+            if weights is not None: dataset.add(row, weights[i])
+            else: dataset.add(row)
+    return nrows
+
+def categorySortPermutation(indices, categories):
+    """
+    return stable permutation sorting events by category
+
+    indices     -- python list of numpy arrays of category indices (one per
+                   category, e.g. from dataSetToArrays)
+    categories  -- python list of RooAbsCategory, in the same order; the
+                   last category is the primary sort key, the first one the
+                   least significant
+
+    The order is the one obtained by splitting the data set by the first
+    category with RooAbsData.reduce and putting it back together with
+    append, then doing the same for the second category, and so on. Within
+    each category, events are ordered like the category's types (order of
+    definition); events with the same categories keep their relative order.
+    """
+    import numpy
+    keys = []
+    for idx, cat in zip(indices, categories):
+        rank = {}
+        it = cat.typeIterator()
+        while True:
+            obj = it.Next()
+            if None == obj: break
+            rank[obj.getVal()] = len(rank)
+        uniq, inv = numpy.unique(idx.astype(numpy.int64),
+                return_inverse = True)
+        keys.append(numpy.array([ rank.get(int(u), len(rank))
+            for u in uniq ], dtype = numpy.int64)[inv])
+    # numpy.lexsort is stable, and takes the primary key last
+    return numpy.lexsort(keys)
+
+def sortDataSetByCategories(dataset, categories, inPlace = False):
+    """
+    sort a data set by category in a single pass
+
+    dataset     -- RooDataSet to sort
+    categories  -- python list of RooAbsCategory (or names) to sort by, the
+                   last one being the primary sort key (see
+                   categorySortPermutation for the ordering)
+    inPlace     -- if True, dataset is emptied and refilled in sorted order
+                   (no second copy of the data set is kept in memory),
+                   otherwise a sorted copy is made
+
+    Fits with many categories (e.g. sample, qt, qf) are faster on sorted
+    data, since pdf caches depending on the categories are invalidated less
+    often. Event weights are kept, weight errors are not.
+
+    returns the sorted data set
+    """
+    names = [ (c if str == type(c) else c.GetName()) for c in categories ]
+    if 0 == len(names) or 0 == dataset.numEntries(): return dataset
+    cols, weights = dataSetToArrays(dataset, withWeight = True)
+    cats = [ dataset.get().find(n) for n in names ]
+    perm = categorySortPermutation([ cols[n] for n in names ], cats)
+    row = dataset.get().snapshot()
+    ROOT.SetOwnership(row, True)
+    if inPlace:
+        dataset.reset()
+        retVal = dataset
+    else:
+        retVal = dataset.emptyClone()
+        ROOT.SetOwnership(retVal, True)
+    columns = []
+    it = row.fwdIterator()
+    while True:
+        var = it.next()
+        if None == var: break
+        columns.append((var, cols.pop(var.GetName())[perm]))
+    fillDataSetFromArrays(retVal, row, columns,
+            weights[perm] if dataset.isWeighted() else None)
+    return retVal
+
+# version of the on-disk data set cache format - bump if the conversion in
+# readDataSet changes in a way that makes old cache entries invalid
+dataSetCacheVersion = 1
+
+def dataSetCacheKey(config, observables, rangeName = None):
+    """
+    compute the key under which readDataSet caches a converted data set
+
+    config      -- configuration dictionary (as for readDataSet)
+    observables -- RooArgSet containing the observables to be read
+    rangeName   -- range to clip to (as for readDataSet)
+
+    The key is a hex digest of a hash over the config keys relevant for the
+    conversion ('DataFileName', 'DataWorkSpaceName', 'DataSetNames',
+    'DataSetCuts', 'DataSetVarNameMapping'), the modification time and size
+    of the input file, and the ranges and binnings of the observables.
+    Returns None if the input file cannot be stat'ed (e.g. because it lives
+    on a remote server), in which case the data set is not cached.
+    """
+    import os, hashlib
+    def canonical(obj):
+        # turn dictionaries into sorted lists, so repr is reproducible
+        if dict == type(obj):
+            return [ (k, canonical(obj[k])) for k in sorted(obj.keys()) ]
+        if type(obj) in (list, tuple):
+            return [ canonical(o) for o in obj ]
+        return obj
+    try:
+        st = os.stat(config['DataFileName'])
+    except OSError:
+        return None
+    desc = [ dataSetCacheVersion, rangeName,
+            os.path.abspath(config['DataFileName']), st.st_mtime, st.st_size ]
+    for k in ('DataWorkSpaceName', 'DataSetNames', 'DataSetCuts',
+            'DataSetVarNameMapping'):
+        desc.append((k, canonical(config[k])))
+    it = observables.fwdIterator()
+    while True:
+        obj = it.next()
+        if None == obj: break
+        if obj.InheritsFrom('RooAbsRealLValue'):
+            b = obj.getBinning()
+            desc.append((obj.GetName(), obj.getMin(), obj.getMax(),
+                [ b.binLow(i) for i in xrange(0, b.numBins()) ],
+                b.highBound(),
+                (obj.getMin(rangeName), obj.getMax(rangeName)) if
+                None != rangeName and obj.hasRange(rangeName) else None))
+        elif obj.InheritsFrom('RooAbsCategory'):
+            types = []
+            tit = obj.typeIterator()
+            ROOT.SetOwnership(tit, True)
+            while True:
+                tobj = tit.Next()
+                if None == tobj: break
+                types.append((tobj.GetName(), tobj.getVal()))
+            desc.append((obj.GetName(), sorted(types)))
+        else:
+            desc.append((obj.GetName(), obj.ClassName()))
+    return hashlib.sha1(repr(desc)).hexdigest()
+
+def readCachedDataSet(cachedir, key, ws):
+    """
+    read a data set cached by readDataSet into workspace ws
+
+    cachedir    -- directory holding the cache
+    key         -- cache key (see dataSetCacheKey)
+    ws          -- workspace into which to import the data set
+
+    returns the data set inside ws, or None if not found in the cache
+    """
+    import os
+    from ROOT import TFile
+    fname = os.path.join(cachedir, 'dataset-%s.root' % key)
+    if not os.path.exists(fname): return None
+    f = TFile(fname, 'READ')
+    if None == f or f.IsZombie(): return None
+    data = f.Get('agglomeration')
+    if None == data or not data.InheritsFrom('RooDataSet'):
+        f.Close()
+        return None
+    ROOT.SetOwnership(data, True)
+    # touch the file so least recently used entries are evicted first
+    os.utime(fname, None)
+    data = WS(ws, data, [])
+    f.Close()
+    del f
+    return data
+
+def writeCachedDataSet(cachedir, key, data, maxsize = None):
+    """
+    write a data set converted by readDataSet into the cache
+
+    cachedir    -- directory holding the cache (created if needed)
+    key         -- cache key (see dataSetCacheKey)
+    data        -- data set to cache
+    maxsize     -- maximum total size of the cache in bytes (None for no
+                   limit); least recently used entries are removed until the
+                   cache is within its size limit
+
+    The data set is first written to a temporary file which is then renamed,
+    so concurrent jobs never see half-written cache entries.
+    """
+    import os, glob
+    from ROOT import TFile
+    if not os.path.isdir(cachedir):
+        try:
+            os.makedirs(cachedir)
+        except OSError:
+            if not os.path.isdir(cachedir): raise
+    fname = os.path.join(cachedir, 'dataset-%s.root' % key)
+    tmpname = '%s.%d.tmp' % (fname, os.getpid())
+    f = TFile(tmpname, 'RECREATE')
+    data.Write('agglomeration')
+    f.Close()
+    del f
+    os.rename(tmpname, fname)
+    if None == maxsize: return
+    # size-based eviction, least recently used entries first
+    entries = []
+    for n in glob.glob(os.path.join(cachedir, 'dataset-*.root')):
+        try:
+            st = os.stat(n)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, n))
+    entries.sort()
+    total = sum(e[1] for e in entries)
+    for mtime, size, n in entries:
+        if total <= maxsize: break
+        if n == fname: continue
+        try:
+            os.remove(n)
+            total -= size
+        except OSError:
+            pass
+
+def compareDataSets(data1, data2):
+    """
+    compare two data sets column by column
+
+    returns a list of strings describing the differences (empty if none)
+    """
+    import numpy
+    diffs = []
+    if data1.numEntries() != data2.numEntries():
+        return [ 'numEntries: %d vs %d' % (data1.numEntries(),
+            data2.numEntries()) ]
+    if data1.isWeighted() != data2.isWeighted():
+        return [ 'isWeighted: %s vs %s' % (data1.isWeighted(),
+            data2.isWeighted()) ]
+    cols1, w1 = dataSetToArrays(data1, withWeight = True)
+    cols2, w2 = dataSetToArrays(data2, withWeight = True)
+    if sorted(cols1.keys()) != sorted(cols2.keys()):
+        return [ 'variables: %s vs %s' % (sorted(cols1.keys()),
+            sorted(cols2.keys())) ]
+    for k in sorted(cols1.keys()):
+        if not numpy.array_equal(cols1[k], cols2[k]):
+            diffs.append('column %s differs in %d entries' % (k,
+                numpy.count_nonzero(cols1[k] != cols2[k])))
+    if not numpy.array_equal(w1, w2):
+        diffs.append('weights differ in %d entries' %
+                numpy.count_nonzero(w1 != w2))
+    return diffs
+
 # read a 1D template from a file (either PDF,data set, or plain 1D TH1)
 def readTemplate1D(
     fromfile,           # file to read from
@@ -182,6 +627,23 @@ def readDataSet(
                    -- mapping from variable names in set of observables to
                       what these variable names are called in the
                       tuple/workspace to be imported
+    'DataSetColumnar'
+                   -- optional, if True, convert the data with whole-column
+                      numpy array operations instead of looping over events
+                      in python; the resulting data set is identical, but
+                      the conversion is much faster for large samples
+    'DataSetCacheDir'
+                   -- optional, if set to a directory name, converted data
+                      sets are cached there, and subsequent calls with the
+                      same configuration, input file and observable ranges
+                      and binnings read the converted data set directly
+    'DataSetCacheMaxSize'
+                   -- optional, maximum size of the cache in bytes; least
+                      recently used entries are removed when it is exceeded
+    'DataSetCacheVerify'
+                   -- optional, if True, a cache hit is checked against a
+                      fresh conversion (which is returned and replaces the
+                      cache entry if they differ)
 
     "special" observable names:
     The routine treats some variable names special on import based on their
@@ -206,9 +668,12 @@ def readDataSet(
     names, an observable can be calculated from more than one tuple column.
     This is useful e.g. to convert a tuple that's stored the tagging decision
     as untagged/mixed/unmixed, or to sum up sweights for the different
-    samples. Most simple formulae should be supported, but constants in
-    scientific notation (1.0E+00) are not for now (until someone write a
-    better parser for this).
+    samples. Most simple formulae should be supported (see
+    B2DXFitters.formulautils for the details of the syntax: arithmetic,
+    comparisons, logical operators, the ternary ?: operator, a few functions,
+    and constants in scientific notation like 1.0E+00 are all understood).
+    In columnar mode (see 'DataSetColumnar'), formulae are evaluated on whole
+    columns with numpy instead of adding RooFormulaVar columns.
 
     Example:
     @code
@@ -259,19 +724,30 @@ def readDataSet(
         else:
             if xfl % 2: return xfl + 1
             else: return xfl
-    # another small helper routine
-    def tokenize(s, delims = '+-*/()?:'):
-        # FIXME: this goes wrong for numerical constants like 1.4e-3
-        # proposed solution: regexp for general floating point constants,
-        # replace occurences of matches with empty string
-        delims = [ c for c in delims ]
-        delims.insert(0, None)
-        for delim in delims:
-            tmp = s.split(delim)
-            tmp = list(set(( s + ' ' for s in tmp)))
-            s = ''.join(tmp)
-        tmp = list(set(s.split(None)))
-        return tmp
+    from B2DXFitters.formulautils import Formula
+    columnar = 'DataSetColumnar' in config and config['DataSetColumnar']
+    # see if we have the converted data set cached
+    cachedir, cachekey, cached = None, None, None
+    if 'DataSetCacheDir' in config and None != config['DataSetCacheDir']:
+        cachedir = config['DataSetCacheDir']
+        cachekey = dataSetCacheKey(config, observables, rangeName)
+        if None == cachekey:
+            print ('WARNING: Unable to stat %s, not caching converted data '
+                    'set') % config['DataFileName']
+            cachedir = None
+    verify = (None != cachedir and 'DataSetCacheVerify' in config and
+            config['DataSetCacheVerify'])
+    if None != cachedir:
+        if verify:
+            # read into scratch workspace, compare after conversion
+            cachews = RooWorkspace('cachews')
+            cached = readCachedDataSet(cachedir, cachekey, cachews)
+        else:
+            cached = readCachedDataSet(cachedir, cachekey, ws)
+            if None != cached:
+                print 'Data set read from cache (key %s)' % cachekey
+                if config['Debug']: cached.Print('v')
+                return cached
     # figure out which names from the mapping we need - look at the observables
     names = ()
     for n in config['DataSetVarNameMapping'].keys():
@@ -316,34 +792,33 @@ def readDataSet(
             obj = it.next()
             if None == obj: break
             name = config['DataSetVarNameMapping'][obj.GetName()]
-            vnames = tokenize(name)
-            if len(vnames) > 1 and not obj.InheritsFrom('RooAbsReal'):
+            formula = Formula(name)
+            if not formula.isVariable() and not obj.InheritsFrom('RooAbsReal'):
                 print 'Error: Formulae not supported for categories'
                 return None
             if obj.InheritsFrom('RooAbsReal'):
-                if 1 == len(vnames):
+                if formula.isVariable():
                     # simple case, just add variable
                     var = WS(fws, RooRealVar(name, name, -sys.float_info.max,
                         sys.float_info.max))
                     iset.addClone(var)
                 else:
                     # complicated case - add a bunch of observables, and
-                    # compute something in a RooFormulaVar
-                    from ROOT import RooFormulaVar
+                    # compute something from them
                     args = RooArgList()
-                    for n in vnames:
-                        try:
-                            # skip simple numerical factors
-                            float(n)
-                        except:
-                            var = iset.find(n)
-                            if None == var:
-                                var = WS(fws, RooRealVar(n, n, -sys.float_info.max,
-                                    sys.float_info.max))
-                                iset.addClone(var)
-                                args.add(iset.find(n))
-                    var = WS(fws, RooFormulaVar(name, name, name, args))
-                    addiset.addClone(var)
+                    for n in formula.variables():
+                        var = iset.find(n)
+                        if None == var:
+                            var = WS(fws, RooRealVar(n, n, -sys.float_info.max,
+                                sys.float_info.max))
+                            iset.addClone(var)
+                        args.add(iset.find(n))
+                    # in columnar mode, the formula is evaluated with numpy
+                    # during the conversion, otherwise use a RooFormulaVar
+                    if not columnar:
+                        from ROOT import RooFormulaVar
+                        var = WS(fws, RooFormulaVar(name, name, name, args))
+                        addiset.addClone(var)
             else:
                 for dsname in ((config['DataSetNames'], )
                         if type(config['DataSetNames']) == str else
@@ -477,18 +952,130 @@ def readDataSet(
         del sdata
         sys.stdout.write(', done - %d events\n' % ninwindow)
         return ninwindow
+    # columnar version of doIt: same conversion and fixups, but done on numpy
+    # arrays holding entire columns
+    def doItColumnar(config, rangeName, dsname, sname, names, dmap, dset,
+            ddata, fws):
+        import numpy
+        sdata = fws.obj(dsname)
+        if None == sdata: return 0
+        if None != config['DataSetCuts']:
+            # apply any user-supplied cuts
+            newsdata = sdata.reduce(config['DataSetCuts'])
+            ROOT.SetOwnership(newsdata, True)
+            del sdata
+            sdata = newsdata
+            del newsdata
+        sset = sdata.get()
+        smap = { }
+        formulae = { }
+        for k in names:
+            smap[k] = sset.find(config['DataSetVarNameMapping'][k])
+            if None != smap[k] or not dmap[k].InheritsFrom('RooAbsReal'):
+                continue
+            formula = Formula(config['DataSetVarNameMapping'][k])
+            if formula.isVariable(): continue
+            # computed from other columns, make sure they are present
+            formulae[k] = formula
+            smap[k] = [ sset.find(n) for n in formula.variables() ]
+            if None in smap[k]:
+                raise NameError('Some variables not found in source: %s' %
+                        str(formula))
+        if 'sample' in smap.keys() and None == smap['sample'] and None != sname:
+            smap.pop('sample')
+            dmap['sample'].setLabel(sname)
+        if None in smap.values():
+            raise NameError('Some variables not found in source: %s' % str(smap))
+        timeConvFactor = 1.
+        if None != sname:
+            sys.stdout.write('Dataset conversion and fixup (columnar): %s: ' %
+                    sname)
+        else:
+            sys.stdout.write('Dataset conversion and fixup (columnar): ')
+        # read all columns in one go
+        keys = list(smap.keys())
+        srcnames = set()
+        for k in keys:
+            if k in formulae: srcnames.update(formulae[k].variables())
+            else: srcnames.add(smap[k].GetName())
+        cols = dataSetToArrays(sdata, sorted(srcnames))
+        vals = { }
+        for k in keys:
+            if k in formulae:
+                vals[k] = formulae[k].evaluate(cols, sdata.numEntries())
+            else:
+                vals[k] = cols[smap[k].GetName()]
+        del cols
+        nentries = sdata.numEntries()
+        del sdata
+        # first fixup: apply time/timeerr conversion factor
+        if 'time' in dmap.keys():
+            vals['time'] = vals['time'] * timeConvFactor
+        if 'timeerr' in dmap.keys():
+            vals['timeerr'] = vals['timeerr'] * timeConvFactor
+        # second fixup: only sign of qf is important
+        if 'qf' in dmap.keys():
+            vals['qf'] = numpy.where(vals['qf'] > 0.5, 1.,
+                    numpy.where(vals['qf'] < -0.5, -1., 0.))
+        # third fixup: untagged events are forced to 0.5 mistag
+        if 'qt' in dmap.keys() and 'mistag' in dmap.keys():
+            vals['mistag'] = numpy.where(0 == vals['qt'], 0.5, vals['mistag'])
+        # apply cuts (written such that NaNs pass, like in doIt)
+        inrange = numpy.ones(nentries, dtype = bool)
+        for vname in dmap.keys():
+            if not dmap[vname].InheritsFrom('RooAbsReal'): continue
+            if None != rangeName and dmap[vname].hasRange(rangeName):
+                lo, hi = (dmap[vname].getMin(rangeName),
+                        dmap[vname].getMax(rangeName))
+            else:
+                lo, hi = dmap[vname].getMin(), dmap[vname].getMax()
+            ok = numpy.logical_not((lo > vals[vname]) | (vals[vname] >= hi))
+            # no need to cut on untagged events
+            if 'mistag' == vname and 'qt' in vals: ok |= (0 == vals['qt'])
+            inrange &= ok
+        # real-category conversions: round to nearest, ties to even
+        columns = [ ]
+        for vname in keys:
+            arr = vals[vname][inrange]
+            if dmap[vname].InheritsFrom('RooAbsCategoryLValue'):
+                arr = numpy.rint(arr)
+            columns.append((dmap[vname], arr))
+        ninwindow = fillDataSetFromArrays(ddata, dset, columns,
+                vals['weight'][inrange] if 'weight' in dmap else None)
+        sys.stdout.write('done - %d events\n' % ninwindow)
+        return ninwindow
+    # pick conversion routine
+    convert = doItColumnar if columnar else doIt
     ninwindow = 0
     if type(config['DataSetNames']) == str:
-        ninwindow += doIt(config, rangeName, config['DataSetNames'],
+        ninwindow += convert(config, rangeName, config['DataSetNames'],
                 None, names, dmap, dset, ddata, fws)
     else:
         for sname in config['DataSetNames'].keys():
-            ninwindow += doIt(config, rangeName, config['DataSetNames'][sname],
-                    sname, names, dmap, dset, ddata, fws)
+            ninwindow += convert(config, rangeName,
+                    config['DataSetNames'][sname], sname, names, dmap, dset,
+                    ddata, fws)
     # free workspace and close file
     del fws
     f.Close()
     del f
+    # update cache
+    if None != cachedir:
+        rewrite = True
+        if None != cached:
+            diffs = compareDataSets(cached, ddata)
+            if 0 == len(diffs):
+                print 'Cache verification passed (key %s)' % cachekey
+                rewrite = False
+            else:
+                print 'WARNING: Cache verification failed (key %s):' % cachekey
+                for d in diffs: print 'WARNING:     %s' % d
+            del cached
+            del cachews
+        if rewrite:
+            writeCachedDataSet(cachedir, cachekey, ddata,
+                    config['DataSetCacheMaxSize'] if 'DataSetCacheMaxSize' in
+                    config else None)
     # put the new dataset into our proper workspace
     ddata = WS(ws, ddata, [])
     # for debugging
@@ -505,14 +1092,34 @@ def readDataSet(
     # all done, return Data to the bridge
     return ddata
 
-def writeDataSet(dataset, filename, treename, bnamemap = {}):
+def writeDataSet(dataset, filename, treename, bnamemap = {},
+        compression = None, basketsize = None, chunksize = 100000):
     """
     writes a given data set into a given tree in a given file
 
-    dataset  -- RooDataSet to write to ntuple
-    filename -- ROOT file to write tuple to
-    treename -- name of TTree instance inside ROOT file
-    bnamemap -- branch name renaming map (default: empty, no renaming done)
+    dataset     -- RooDataSet to write to ntuple
+    filename    -- ROOT file to write tuple to
+    treename    -- name of TTree instance inside ROOT file
+    bnamemap    -- branch name renaming map (default: empty, no renaming
+                   done)
+    compression -- ROOT compression settings for the output file (e.g. 101
+                   for zlib level 1, 404 for lz4 level 4), None for ROOT's
+                   default
+    basketsize  -- basket size in bytes for all branches (None for ROOT's
+                   default); larger baskets mean fewer, larger writes, which
+                   helps when writing to network file systems like EOS
+    chunksize   -- number of events which are converted and written in one
+                   go
+
+    Real observables are written as Double_t branches, categories as Int_t
+    branches holding the category index. For weighted data sets, the event
+    weights are written to a branch named after the weight variable (or
+    'weight' if that cannot be determined); it can be renamed in bnamemap as
+    well.
+
+    The data set is converted in chunks of contiguous arrays which are then
+    filled into the tuple by compiled code; if that is not available (e.g.
+    ROOT 5), a slower per-event loop is used.
 
     example:
     @code
@@ -528,13 +1135,15 @@ def writeDataSet(dataset, filename, treename, bnamemap = {}):
         })
     @endcode
     """
-    from ROOT import TFile, TTree
+    from ROOT import TFile, TTree, RooArgList
     import array
     f = TFile(filename, 'RECREATE')
+    if None != compression: f.SetCompressionSettings(compression)
     t = TTree(treename, treename)
     obs = dataset.get()
     # create branches
     branches = { }
+    names, isint = [], []
     it = obs.fwdIterator()
     while True:
         obj = it.next()
@@ -545,19 +1154,284 @@ def writeDataSet(dataset, filename, treename, bnamemap = {}):
                 obj.InheritsFrom('RooAbsReal') else array.array('i', [0]))
         t.Branch(bname, branches[obj.GetName()], bname+('/D' if
             obj.InheritsFrom('RooAbsReal') else '/I'))
-    # fill tuple
-    for i in xrange(0, dataset.numEntries()):
-        dataset.get(i)
-        it = obs.fwdIterator()
-        while True:
-            obj = it.next()
-            if None == obj: break
-            branches[obj.GetName()][0] = (obj.getVal() if
-                    obj.InheritsFrom('RooAbsReal') else obj.getIndex())
-        t.Fill()
+        names.append(obj.GetName())
+        isint.append(not obj.InheritsFrom('RooAbsReal'))
+    weighted = dataset.isWeighted()
+    if weighted:
+        wname = 'weight'
+        if hasattr(dataset, 'weightVar') and None != dataset.weightVar():
+            wname = dataset.weightVar().GetName()
+        # some ROOT versions list the weight among the observables
+        weighted = wname not in names
+    if weighted:
+        bname = bnamemap[wname] if wname in bnamemap else wname
+        wbuf = array.array('d', [0.])
+        t.Branch(bname, wbuf, bname + '/D')
+    if None != basketsize: t.SetBasketSize('*', basketsize)
+    helpers = columnarHelpers()
+    if None != helpers:
+        import numpy
+        # bulk conversion, chunk by chunk
+        cols = RooArgList()
+        for n in names: cols.add(obs.find(n))
+        ncols = len(names) + (1 if weighted else 0)
+        isint = numpy.array(isint + ([ False ] if weighted else []),
+                dtype = numpy.int32)
+        nentries = dataset.numEntries()
+        for first in xrange(0, nentries, chunksize):
+            n = min(chunksize, nentries - first)
+            buf = numpy.zeros((n, len(names)), dtype = numpy.float64)
+            if weighted:
+                wts = numpy.zeros(n, dtype = numpy.float64)
+                helpers.extract(dataset, cols, first, n, buf, wts)
+                # weight goes into the last column
+                buf = numpy.ascontiguousarray(numpy.column_stack((buf, wts)))
+            else:
+                helpers.extract(dataset, cols, first, n, buf, ROOT.nullptr)
+            helpers.fillTree(t, buf, n, ncols, isint)
+    else:
+        # fill tuple
+        for i in xrange(0, dataset.numEntries()):
+            dataset.get(i)
+            it = obs.fwdIterator()
+            while True:
+                obj = it.next()
+                if None == obj: break
+                branches[obj.GetName()][0] = (obj.getVal() if
+                        obj.InheritsFrom('RooAbsReal') else obj.getIndex())
+            if weighted: wbuf[0] = dataset.weight()
+            t.Fill()
     t.Write()
     del t
     f.Close()
     del f
 
+# magic number and version of the columnar toy file format
+columnarFileMagic = 'B2DXCOL1'
+columnarFileAlign = 64
 
+def writeColumnarFile(dataset, filename):
+    """
+    write a data set to a memory-mappable columnar file
+
+    dataset     -- RooDataSet to write (typically a toy, including the
+                   'sample' category)
+    filename    -- name of the file to write
+
+    The file starts with the magic string 'B2DXCOL1', followed by the length
+    of a JSON header (8 bytes, little endian) and the header itself. The
+    header describes the schema: number of entries and, for each column,
+    its name, type ('real' with range, title and unit, or 'category' with a
+    label to index map), and offset of its data in the file. The data for
+    each column is a contiguous little endian float64 (real) or int32
+    (category index) array, aligned to 64 bytes. Event weights of weighted
+    data sets are stored as an additional real column; its name is given in
+    the header's 'weight' entry.
+
+    The file is written to a temporary name and renamed at the end, so
+    readers never see a partially written file.
+    """
+    obs = dataset.get()
+    names, columns = [], []
+    it = obs.fwdIterator()
+    while True:
+        obj = it.next()
+        if None == obj: break
+        names.append(obj.GetName())
+        if obj.InheritsFrom('RooAbsReal'):
+            columns.append({ 'name': obj.GetName(), 'type': 'real',
+                'dtype': '<f8', 'title': obj.GetTitle(),
+                'unit': obj.getUnit() if hasattr(obj, 'getUnit') else '',
+                'min': (obj.getMin() if obj.InheritsFrom('RooAbsRealLValue')
+                    else None),
+                'max': (obj.getMax() if obj.InheritsFrom('RooAbsRealLValue')
+                    else None) })
+        else:
+            types = { }
+            tit = obj.typeIterator()
+            while True:
+                t = tit.Next()
+                if None == t: break
+                types[t.GetName()] = t.getVal()
+            columns.append({ 'name': obj.GetName(), 'type': 'category',
+                'dtype': '<i4', 'title': obj.GetTitle(), 'types': types })
+    weight = None
+    if dataset.isWeighted():
+        weight = 'weight'
+        if hasattr(dataset, 'weightVar') and None != dataset.weightVar():
+            weight = dataset.weightVar().GetName()
+        if weight in names: weight = None
+    if None != weight:
+        arrays, wts = dataSetToArrays(dataset, names, withWeight = True)
+        arrays[weight] = wts
+        columns.append({ 'name': weight, 'type': 'real', 'dtype': '<f8',
+            'title': weight, 'unit': '', 'min': None, 'max': None })
+    else:
+        arrays = dataSetToArrays(dataset, names)
+    writeColumnArrays(filename, columns, arrays, dataset.numEntries(),
+            dataset.GetName(), dataset.GetTitle(), weight)
+
+def writeColumnArrays(filename, columns, arrays, nentries, name = '',
+        title = '', weight = None, extra = None):
+    """
+    write numpy arrays to a memory-mappable columnar file
+
+    filename    -- name of the file to write
+    columns     -- list of column descriptions (dictionaries with at least
+                   'name', 'type' and 'dtype' entries, see writeColumnarFile)
+    arrays      -- dictionary mapping column names to arrays
+    nentries    -- number of entries (length of each array)
+    name        -- name stored in the header
+    title       -- title stored in the header
+    weight      -- name of the weight column (or None)
+    extra       -- optional dictionary (JSON serialisable) stored in the
+                   header's 'extra' entry
+
+    The file format is described in writeColumnarFile; files can be read
+    with readColumnarFile.
+    """
+    import os, json, struct
+    import numpy
+    # lay out the file: header first, then aligned columns; the header size
+    # depends on the offsets, so iterate until it is stable
+    hdrlen = 0
+    while True:
+        offset = len(columnarFileMagic) + 8 + hdrlen
+        for col in columns:
+            offset = -(-offset // columnarFileAlign) * columnarFileAlign
+            col['offset'] = offset
+            offset += nentries * numpy.dtype(col['dtype']).itemsize
+        hdr = { 'version': 1, 'entries': nentries, 'name': name,
+                'title': title, 'weight': weight, 'columns': columns }
+        if None != extra: hdr['extra'] = extra
+        header = json.dumps(hdr, sort_keys = True)
+        if len(header) <= hdrlen: break
+        hdrlen = len(header) + 256
+    header = header.ljust(hdrlen)
+    tmpname = '%s.tmp%d' % (filename, os.getpid())
+    f = open(tmpname, 'wb')
+    try:
+        f.write(columnarFileMagic)
+        f.write(struct.pack('<Q', hdrlen))
+        f.write(header)
+        for col in columns:
+            f.write('\0' * (col['offset'] - f.tell()))
+            f.write(numpy.ascontiguousarray(arrays[col['name']],
+                dtype = col['dtype']).tostring())
+        f.close()
+        os.rename(tmpname, filename)
+    except:
+        f.close()
+        if os.path.exists(tmpname): os.unlink(tmpname)
+        raise
+
+def readColumnarFile(filename):
+    """
+    attach to a columnar file written by writeColumnarFile
+
+    filename    -- name of the file
+
+    returns a tuple (header, columns): header is the dictionary describing
+    the schema (see writeColumnarFile), columns maps column names to
+    read-only numpy arrays backed by the memory-mapped file (no data is
+    copied, and processes reading the same file share the page cache)
+
+    Example:
+    @code
+    hdr, cols = readColumnarFile('toy_1234.col')
+    print hdr['entries'], cols['BeautyTime'][cols['sample'] == 0].mean()
+    @endcode
+    """
+    import json, struct
+    import numpy
+    f = open(filename, 'rb')
+    try:
+        magic = f.read(len(columnarFileMagic))
+        if magic != columnarFileMagic:
+            raise IOError('%s is not a columnar data file' % filename)
+        hdrlen, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(hdrlen))
+    finally:
+        f.close()
+    nentries = header['entries']
+    columns = { }
+    if 0 == nentries:
+        for col in header['columns']:
+            columns[col['name']] = numpy.zeros(0, dtype = col['dtype'])
+        return header, columns
+    mm = numpy.memmap(filename, dtype = numpy.uint8, mode = 'r')
+    for col in header['columns']:
+        dt = numpy.dtype(col['dtype'])
+        columns[col['name']] = numpy.frombuffer(mm, dtype = dt,
+                count = nentries, offset = col['offset'])
+    return header, columns
+
+def columnarFileToDataSet(filename, observables = None, name = None,
+        ws = None):
+    """
+    read a columnar file written by writeColumnarFile into a RooDataSet
+
+    filename    -- name of the file
+    observables -- RooArgSet (or list) of observables to read; default (None)
+                   is to create them from the schema stored in the file
+    name        -- name of the data set (default: name stored in the file)
+    ws          -- if given, the data set is imported into this workspace,
+                   and the imported copy is returned
+
+    Observables not present in the file raise a NameError. Category indices
+    are taken over as they are, so observables passed in must define the
+    same labels and indices as the ones the file was written with.
+
+    returns the RooDataSet
+    """
+    from ROOT import (RooArgSet, RooRealVar, RooCategory, RooDataSet,
+            RooFit)
+    header, columns = readColumnarFile(filename)
+    if None == observables:
+        observables = RooArgSet()
+        for col in header['columns']:
+            if col['name'] == header['weight']: continue
+            cname, ctitle = str(col['name']), str(col['title'])
+            if 'real' == col['type']:
+                if None != col['min'] and None != col['max']:
+                    v = RooRealVar(cname, ctitle, col['min'], col['max'],
+                            str(col['unit']))
+                else:
+                    v = RooRealVar(cname, ctitle, 0., str(col['unit']))
+            else:
+                v = RooCategory(cname, ctitle)
+                for label, idx in sorted(col['types'].items(),
+                        key = lambda x: x[1]):
+                    v.defineType(str(label), idx)
+            ROOT.SetOwnership(v, False)
+            observables.add(v)
+    elif not isinstance(observables, RooArgSet):
+        tmp = RooArgSet()
+        for v in observables: tmp.add(v)
+        observables = tmp
+    cols = []
+    it = observables.fwdIterator()
+    while True:
+        obj = it.next()
+        if None == obj: break
+        if obj.GetName() not in columns:
+            raise NameError('Observable %s not in columnar file %s' % (
+                obj.GetName(), filename))
+        cols.append((obj, columns[obj.GetName()]))
+    if None == name: name = str(header['name'])
+    weights = None
+    if None != header['weight']:
+        wvar = RooRealVar(str(header['weight']), str(header['weight']), 1.)
+        ROOT.SetOwnership(wvar, False)
+        row = RooArgSet(observables)
+        row.add(wvar)
+        data = RooDataSet(name, str(header['title']), row,
+                RooFit.WeightVar(wvar))
+        weights = columns[header['weight']]
+    else:
+        data = RooDataSet(name, str(header['title']), observables)
+    fillDataSetFromArrays(data, data.get(), [ (data.get().find(v.GetName()),
+        arr) for v, arr in cols ], weights)
+    if None != ws:
+        return WS(ws, data, [])
+    return data
@@ -108,14 +108,25 @@ def get_dataset(varargset, ftree, cut, *cutVars):
     Return a dataset from the ntuple `ftree'. Apply a selection cut
     using the `cutVar' variable and the selection `cut'.
 
+    `ftree' can also be the name of a columnar file written by
+    datasetio.writeColumnarFile (e.g. by toyFactory --outputFormat
+    columnar); the columns are then memory mapped instead of read
+    through a TTree.
+
     """
 
     varargsetclone = varargset.clone('varargsetclone')
     for cvar in cutVars:
         varargsetclone.add(cvar) # Add selVar to apply cut
 
-    tmpdataset = RooDataSet('dataset', 'Dataset', varargsetclone,
-                            RooFit.Import(ftree), RooFit.Cut(cut))
+    if isinstance(ftree, str):
+        from B2DXFitters.datasetio import columnarFileToDataSet
+        tmpdataset = columnarFileToDataSet(ftree, varargsetclone, 'dataset')
+        if cut:
+            tmpdataset = tmpdataset.reduce(cut)
+    else:
+        tmpdataset = RooDataSet('dataset', 'Dataset', varargsetclone,
+                                RooFit.Import(ftree), RooFit.Cut(cut))
     dataset = tmpdataset.reduce(varargset)
     del tmpdataset
     return dataset
@@ -0,0 +1,265 @@
+"""
+@file formulautils.py
+
+@brief parse simple (TFormula-like) formulae and evaluate them on numpy arrays
+
+The formulae understood here are the ones typically found in the
+DataSetVarNameMapping entries of config dictionaries (see
+datasetio.readDataSet), e.g. sums of sWeight branches, or conversions of
+tagging decisions. The grammar is C-like:
+
+@code
+expr    := or [ '?' expr ':' expr ]
+or      := and { '||' and }
+and     := eq { '&&' eq }
+eq      := rel { ( '==' | '!=' ) rel }
+rel     := sum { ( '<' | '<=' | '>' | '>=' ) sum }
+sum     := prod { ( '+' | '-' ) prod }
+prod    := unary { ( '*' | '/' | '%' ) unary }
+unary   := ( '-' | '+' | '!' ) unary | power
+power   := atom [ ( '^' | '**' ) unary ]
+atom    := number | name | name '(' [ expr { ',' expr } ] ')' | '(' expr ')'
+@endcode
+
+Numbers may be given in scientific notation (1.4e-3, 1E+00), names are
+C-like identifiers (TMath::Abs and the like are also accepted). Comparisons
+and logical operators evaluate to 0 or 1.
+
+Example:
+@code
+from B2DXFitters.formulautils import Formula
+f = Formula('nSig_phipi_Evts_sw + nSig_kkpi_Evts_sw')
+print f.variables()
+# columns is a dictionary mapping variable names to numpy arrays
+w = f.evaluate(columns)
+@endcode
+"""
+
+import re
+
+# token regular expressions - order matters (numbers before names, two
+# character operators before one character ones)
+_tokenre = re.compile(r'''
+    \s*(?:
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?) |
+    (?P<name>[A-Za-z_][A-Za-z0-9_]*(?:::[A-Za-z_][A-Za-z0-9_]*)*) |
+    (?P<op>\*\*|&&|\|\||==|!=|<=|>=|[-+*/%^()<>!?:,])
+    )''', re.VERBOSE)
+
+def tokenize(s):
+    """
+    split string s into a list of (type, value) tokens
+
+    type is one of 'number', 'name' or 'op'; a SyntaxError is raised for
+    characters which cannot start a valid token
+    """
+    tokens = []
+    pos = 0
+    s = s.rstrip()
+    while pos < len(s):
+        m = _tokenre.match(s, pos)
+        if None == m or m.end() == pos:
+            raise SyntaxError('Unable to tokenize formula "%s" at position '
+                    '%d' % (s, pos))
+        for ttype in ('number', 'name', 'op'):
+            if None != m.group(ttype):
+                tokens.append((ttype, m.group(ttype)))
+                break
+        pos = m.end()
+    return tokens
+
+# functions known to the evaluator - name: (number of arguments, numpy name)
+_functions = {
+        'abs': (1, 'fabs'), 'fabs': (1, 'fabs'), 'TMath::Abs': (1, 'fabs'),
+        'sqrt': (1, 'sqrt'), 'TMath::Sqrt': (1, 'sqrt'),
+        'exp': (1, 'exp'), 'TMath::Exp': (1, 'exp'),
+        'log': (1, 'log'), 'TMath::Log': (1, 'log'),
+        'log10': (1, 'log10'), 'TMath::Log10': (1, 'log10'),
+        'sin': (1, 'sin'), 'cos': (1, 'cos'), 'tan': (1, 'tan'),
+        'asin': (1, 'arcsin'), 'acos': (1, 'arccos'), 'atan': (1, 'arctan'),
+        'atan2': (2, 'arctan2'), 'TMath::ATan2': (2, 'arctan2'),
+        'pow': (2, 'power'), 'TMath::Power': (2, 'power'),
+        'min': (2, 'minimum'), 'TMath::Min': (2, 'minimum'),
+        'max': (2, 'maximum'), 'TMath::Max': (2, 'maximum'),
+        'floor': (1, 'floor'), 'ceil': (1, 'ceil'),
+        'TMath::Pi': (0, None), 'pi': (-1, None),
+        }
+
+class Formula(object):
+    """
+    parsed formula which can be evaluated on columns of numbers
+
+    The parse tree is built from tuples: ('num', value), ('var', name),
+    ('call', fname, args), ('unop', op, arg), ('binop', op, lhs, rhs) and
+    ('cond', test, iftrue, iffalse).
+    """
+
+    def __init__(self, s):
+        self.__str = s
+        self.__tokens = tokenize(s)
+        self.__pos = 0
+        self.__tree = self.__expr()
+        if self.__pos != len(self.__tokens):
+            raise SyntaxError('Trailing garbage in formula "%s": %s' % (s,
+                ' '.join(v for t, v in self.__tokens[self.__pos:])))
+        del self.__tokens
+
+    def __str__(self):
+        return self.__str
+
+    def tree(self):
+        """return the parse tree"""
+        return self.__tree
+
+    def isVariable(self):
+        """return True if the formula consists of just a variable name"""
+        return 'var' == self.__tree[0]
+
+    def variables(self):
+        """return sorted list of variable names used in the formula"""
+        names = set()
+        def walk(node):
+            if 'var' == node[0]: names.add(node[1])
+            elif 'call' == node[0]:
+                for arg in node[2]: walk(arg)
+            elif 'cond' == node[0]:
+                for arg in node[1:]: walk(arg)
+            elif node[0] in ('unop', 'binop'):
+                for arg in node[2:]: walk(arg)
+        walk(self.__tree)
+        return sorted(names)
+
+    def evaluate(self, columns, length = None):
+        """
+        evaluate formula on numpy arrays
+
+        columns --  dictionary mapping variable names to numpy arrays (or
+                    anything numpy can broadcast, e.g. plain numbers)
+        length --   optional, length of result; if given, constant results
+                    are broadcast to an array of that length
+
+        returns numpy array of float64 values
+        """
+        import numpy
+        def ev(node):
+            what = node[0]
+            if 'num' == what: return node[1]
+            elif 'var' == what:
+                if node[1] not in columns:
+                    raise NameError('Variable %s used in formula "%s" not '
+                            'available' % (node[1], self.__str))
+                return numpy.asarray(columns[node[1]], dtype = numpy.float64)
+            elif 'call' == what:
+                if node[1] not in _functions:
+                    raise NameError('Unknown function %s in formula "%s"' % (
+                        node[1], self.__str))
+                nargs, npname = _functions[node[1]]
+                if None == npname: return numpy.pi
+                return numpy.__dict__[npname](*[ ev(a) for a in node[2] ])
+            elif 'unop' == what:
+                arg = ev(node[2])
+                if '-' == node[1]: return -arg
+                elif '+' == node[1]: return arg
+                else: return numpy.where(arg == 0, 1., 0.)
+            elif 'cond' == what:
+                return numpy.where(ev(node[1]) != 0, ev(node[2]), ev(node[3]))
+            op, lhs, rhs = node[1], ev(node[2]), ev(node[3])
+            if '+' == op: return lhs + rhs
+            elif '-' == op: return lhs - rhs
+            elif '*' == op: return lhs * rhs
+            elif '/' == op: return numpy.true_divide(lhs, rhs)
+            elif '%' == op: return numpy.fmod(lhs, rhs)
+            elif op in ('^', '**'): return numpy.power(lhs, rhs)
+            elif '&&' == op:
+                return numpy.where((lhs != 0) & (rhs != 0), 1., 0.)
+            elif '||' == op:
+                return numpy.where((lhs != 0) | (rhs != 0), 1., 0.)
+            elif '==' == op: return numpy.where(lhs == rhs, 1., 0.)
+            elif '!=' == op: return numpy.where(lhs != rhs, 1., 0.)
+            elif '<' == op: return numpy.where(lhs < rhs, 1., 0.)
+            elif '<=' == op: return numpy.where(lhs <= rhs, 1., 0.)
+            elif '>' == op: return numpy.where(lhs > rhs, 1., 0.)
+            elif '>=' == op: return numpy.where(lhs >= rhs, 1., 0.)
+            raise SyntaxError('Unknown operator %s' % op)
+        retVal = numpy.asarray(ev(self.__tree), dtype = numpy.float64)
+        if None != length and retVal.shape != (length,):
+            retVal = numpy.zeros(length, dtype = numpy.float64) + retVal
+        return retVal
+
+    # recursive descent parser
+    def __peek(self):
+        if self.__pos < len(self.__tokens): return self.__tokens[self.__pos]
+        return (None, None)
+
+    def __accept(self, *ops):
+        t, v = self.__peek()
+        if 'op' == t and v in ops:
+            self.__pos += 1
+            return v
+        return None
+
+    def __expect(self, op):
+        if None == self.__accept(op):
+            raise SyntaxError('Expected "%s" in formula "%s" (got "%s")' % (
+                op, self.__str, self.__peek()[1]))
+
+    def __binary(self, sub, *ops):
+        node = sub()
+        while True:
+            op = self.__accept(*ops)
+            if None == op: return node
+            node = ('binop', op, node, sub())
+
+    def __expr(self):
+        node = self.__or()
+        if None != self.__accept('?'):
+            iftrue = self.__expr()
+            self.__expect(':')
+            node = ('cond', node, iftrue, self.__expr())
+        return node
+
+    def __or(self): return self.__binary(self.__and, '||')
+    def __and(self): return self.__binary(self.__eq, '&&')
+    def __eq(self): return self.__binary(self.__rel, '==', '!=')
+    def __rel(self): return self.__binary(self.__sum, '<', '<=', '>', '>=')
+    def __sum(self): return self.__binary(self.__prod, '+', '-')
+    def __prod(self): return self.__binary(self.__unary, '*', '/', '%')
+
+    def __unary(self):
+        op = self.__accept('-', '+', '!')
+        if None != op: return ('unop', op, self.__unary())
+        return self.__power()
+
+    def __power(self):
+        node = self.__atom()
+        op = self.__accept('^', '**')
+        if None != op: node = ('binop', op, node, self.__unary())
+        return node
+
+    def __atom(self):
+        t, v = self.__peek()
+        if 'number' == t:
+            self.__pos += 1
+            return ('num', float(v))
+        elif 'name' == t:
+            self.__pos += 1
+            if v in _functions and -1 == _functions[v][0]:
+                return ('call', v, [])
+            if None == self.__accept('('): return ('var', v)
+            args = []
+            if None == self.__accept(')'):
+                args.append(self.__expr())
+                while None != self.__accept(','): args.append(self.__expr())
+                self.__expect(')')
+            # unknown functions are only an error once the formula is
+            # evaluated (TFormula may know more of them than we do)
+            if v in _functions and len(args) != max(_functions[v][0], 0):
+                raise SyntaxError('Function %s takes %d arguments' % (v,
+                    _functions[v][0]))
+            return ('call', v, args)
+        elif None != self.__accept('('):
+            node = self.__expr()
+            self.__expect(')')
+            return node
+        raise SyntaxError('Unexpected token "%s" in formula "%s"' % (v,
+            self.__str))
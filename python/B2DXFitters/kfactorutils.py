@@ -0,0 +1,123 @@
+"""
+@file kfactorutils.py
+
+@brief smear generated decay times with k-factors (partially reconstructed
+       backgrounds) and the decay time resolution
+
+Partially reconstructed modes get their decay time scaled by 1/k, with the
+k-factor drawn from a histogram that depends on the mode and on the B mass
+bin; afterwards, all decay times are smeared with the (per-event) decay time
+resolution. This module does both for a whole data set at once: events are
+grouped by TRUEID and mass bin, all k-factors of a group are drawn from a
+precomputed inverse-CDF table, and decay times are rescaled as numpy arrays.
+"""
+
+import ROOT
+from B2DXFitters.samplingutils import InverseCDFSampler
+from B2DXFitters.datasetio import dataSetToArrays, fillDataSetFromArrays
+
+class KFactorSmearing(object):
+    """
+    smear decay times with k-factors and decay time resolution
+
+    Example:
+    @code
+    smearing = KFactorSmearing(myconfigfile, kFactorHistos)
+    gendata = smearing.smear(gendata, 'lab0_LifetimeFit_ctau',
+        'lab0_LifetimeFit_ctauErr', 'lab0_TRUEID', 'lab0_MassFitConsD_M',
+        trm_mean.getVal(), trm_scale.getVal(), myconfigfile['timeRange'],
+        randomState())
+    @endcode
+    """
+    def __init__(self, myconfigfile, kFactorHistos):
+        """
+        tabulate the k-factor distributions
+
+        myconfigfile    -- configuration dictionary; uses
+                           'DecayModeParameters' (TRUEID and KFACTOR flag per
+                           mode), 'massRange' and 'kFactorBinning'
+        kFactorHistos   -- dictionary mode -> mass range ("low_high") -> TH1
+                           of k-factors, for all modes with KFACTOR set
+        """
+        self.lo, self.hi = myconfigfile['massRange'][0:2]
+        self.binning = myconfigfile['kFactorBinning']
+        self.nbins = len(range(self.lo, self.hi, self.binning))
+        # (TRUEID, [ sampler for each mass bin ]) for modes with k-factors
+        self.modes = []
+        for decaymode in myconfigfile['DecayModeParameters']:
+            par = myconfigfile['DecayModeParameters'][decaymode]
+            if not par['KFACTOR']: continue
+            samplers = []
+            for historange in range(self.lo, self.hi, self.binning):
+                samplers.append(InverseCDFSampler.fromHistogram(
+                    kFactorHistos[decaymode]['%d_%d' % (historange,
+                        historange + self.binning)]))
+            self.modes.append((int(par['TRUEID']), samplers))
+
+    def kFactors(self, trueid, mass, rnd):
+        """
+        draw k-factors
+
+        trueid  -- numpy array of TRUEIDs
+        mass    -- numpy array of B masses
+        rnd     -- numpy.random.RandomState to use
+
+        returns numpy array of k-factors
+
+        TRUEIDs are rounded to the nearest integer; events of modes without
+        KFACTOR, or with a TRUEID not in 'DecayModeParameters', get k = 1.
+        Masses outside 'massRange' use the first (below) or last (above)
+        mass bin.
+        """
+        import numpy
+        k = numpy.ones(len(trueid))
+        trueid = numpy.round(trueid).astype(int)
+        massbin = numpy.clip(numpy.floor((mass - self.lo) / self.binning),
+                0, self.nbins - 1).astype(int)
+        for mode, samplers in self.modes:
+            inmode = (trueid == mode)
+            if not inmode.any(): continue
+            for b, sampler in enumerate(samplers):
+                sel = numpy.flatnonzero(inmode & (massbin == b))
+                if 0 == len(sel): continue
+                k[sel] = sampler.sample(len(sel), rnd)[0]
+        return k
+
+    def smear(self, data, timeName, timeErrName, trueIDName, massName,
+            mean, scale, timeRange, rnd):
+        """
+        smear the decay times of a data set
+
+        data        -- RooDataSet to smear (not modified)
+        timeName    -- name of decay time variable
+        timeErrName -- name of per-event decay time error variable
+        trueIDName  -- name of TRUEID variable
+        massName    -- name of B mass variable
+        mean        -- resolution bias
+        scale       -- resolution scale factor (applied to the per-event
+                       decay time error)
+        timeRange   -- (min, max) of decay time; events smeared outside are
+                       dropped
+        rnd         -- numpy.random.RandomState to use
+
+        returns a new RooDataSet (same variables and storage as data) with
+        the smeared events
+        """
+        import numpy
+        cols = dataSetToArrays(data)
+        t = cols[timeName] / self.kFactors(cols[trueIDName], cols[massName],
+                rnd)
+        t += rnd.normal(mean, scale * cols[timeErrName])
+        keep = (t >= timeRange[0]) & (t <= timeRange[1])
+        cols[timeName] = t
+        retVal = data.emptyClone()
+        row = data.get().snapshot()
+        ROOT.SetOwnership(row, True)
+        columns = []
+        it = row.fwdIterator()
+        while True:
+            var = it.next()
+            if None == var: break
+            columns.append((var, cols[var.GetName()][keep]))
+        fillDataSetFromArrays(retVal, row, columns)
+        return retVal
@@ -0,0 +1,209 @@
+"""
+@file multistart.py
+
+@brief fit from several randomised starting points, keep the best minimum
+
+MIGRAD can end up in a local minimum (or fail) depending on where it starts,
+which for CP fits on data usually means trying a few starting points by
+hand. multiStartFit does this systematically: it draws independent starting
+points for the parameters listed in the configuration's 'randomiseParams'
+entry (same format as for utils.randomiseParameters), runs one fit per
+starting point in a pool of worker processes, keeps the fit with the lowest
+NLL, and reports how the minima found are spread.
+
+Starting point i is drawn from its own random substream (see rngutils), so
+the starting points do not depend on the number of workers, and a single
+start can be reproduced on its own.
+"""
+
+import ROOT
+
+# pdf, data, ... shared with the workers (inherited through fork)
+_fitContext = {}
+
+def drawStartingPoints(config, params, nstarts, seed, includeNominal = True):
+    """
+    draw starting points for a multi-start fit
+
+    config          -- configuration dictionary with entry
+                       config['randomiseParams'] = { 'parName' :
+                       { 'min': min, 'max': max } }; starting values are
+                       drawn uniformly between min and max
+    params          -- RooArgSet of the fit parameters (constant parameters
+                       are never randomised)
+    nstarts         -- number of starting points
+    seed            -- seed (starting point i uses the substream (seed,
+                       'multistart', i))
+    includeNominal  -- if True, the first starting point is the current
+                       parameter values
+
+    returns list of dictionaries parameter name -> starting value
+    """
+    from B2DXFitters.rngutils import substream
+    names = []
+    for name in sorted(config['randomiseParams'].iterkeys()):
+        par = params.find(name)
+        if None == par or par.isConstant(): continue
+        names.append(name)
+    retVal = []
+    for i in xrange(0, nstarts):
+        if 0 == i and includeNominal:
+            retVal.append(dict((n, params.find(n).getVal()) for n in names))
+            continue
+        rnd = substream(seed, 'multistart', i)
+        retVal.append(dict((n, rnd.Uniform(config['randomiseParams'][n]['min'],
+            config['randomiseParams'][n]['max'])) for n in names))
+    return retVal
+
+def _fitOneStart(task):
+    """ fit from one starting point, save RooFitResult to file """
+    istart, start, fileName = task
+    pdf = _fitContext['pdf']
+    params = _fitContext['params']
+    params.assignValueOnly(_fitContext['nominal'])
+    for name, val in start.iteritems():
+        params.find(name).setVal(val)
+    opts = ROOT.RooLinkedList()
+    for o in [ ROOT.RooFit.Save(True) ] + _fitContext['fitOpts']:
+        opts.Add(o)
+    result = pdf.fitTo(_fitContext['data'], opts)
+    ROOT.SetOwnership(result, True)
+    f = ROOT.TFile.Open(fileName, 'RECREATE')
+    f.WriteTObject(result, 'fitresult')
+    f.Close()
+    final = result.floatParsFinal()
+    return { 'start': istart, 'status': result.status(),
+            'covQual': result.covQual(), 'minNll': result.minNll(),
+            'edm': result.edm(),
+            'values': dict((final[j].GetName(), final[j].getVal())
+                for j in xrange(0, final.getSize())) }
+
+def multiStartFit(pdf, data, config, nstarts, seed, fitOpts = [],
+        nworkers = 1, includeNominal = True, tolerance = 0.01,
+        fileName = None, debug = False):
+    """
+    fit pdf to data from nstarts starting points, keep the best fit
+
+    pdf             -- pdf to fit
+    data            -- data set to fit
+    config          -- configuration dictionary (see drawStartingPoints)
+    nstarts         -- number of starting points
+    seed            -- seed for the starting points
+    fitOpts         -- python list of RooCmdArgs for fitTo (RooFit.Save is
+                       added); with nworkers > 1, options like NumCPU
+                       multiply the number of processes
+    nworkers        -- number of fits to run in parallel
+    includeNominal  -- if True, the first fit starts from the current values
+    tolerance       -- fits whose NLL is within tolerance of the best one are
+                       counted as having found the same minimum
+    fileName        -- if given, a tree "MultiStartTree" with one entry per
+                       fit (start, status, covQual, minNll, deltaNll, edm
+                       and fitted values <par>_fit) is saved to this file
+    debug           -- print debug information
+
+    The best fit is the converged (status 0) fit with the lowest NLL (the
+    lowest NLL of all fits, if none converged). The parameters of pdf are
+    set to its result.
+
+    returns tuple (RooFitResult of best fit, summary), where summary is a
+    dictionary with entries 'best' (index of best fit), 'fits' (list of
+    per-fit dictionaries with 'start', 'status', 'covQual', 'minNll',
+    'deltaNll', 'edm', 'values'), 'nConverged', 'nAtMinimum' (converged fits
+    within tolerance of the best NLL) and 'spread' (parameter name -> RMS
+    of the fitted values of converged fits)
+    """
+    import os, tempfile, shutil
+    from B2DXFitters.parallelutils import runInPool
+    params = pdf.getParameters(data)
+    ROOT.SetOwnership(params, True)
+    nominal = params.snapshot()
+    ROOT.SetOwnership(nominal, True)
+    starts = drawStartingPoints(config, params, nstarts, seed,
+            includeNominal)
+    if debug:
+        for i, start in enumerate(starts):
+            print 'multiStartFit: start %d: %s' % (i, str(start))
+    _fitContext.update({ 'pdf': pdf, 'data': data, 'params': params,
+        'nominal': nominal, 'fitOpts': list(fitOpts) })
+    tmpdir = tempfile.mkdtemp(prefix = 'multiStartFit_')
+    try:
+        tasks = [ (i, start, os.path.join(tmpdir, 'fit_%04d.root' % i))
+                for i, start in enumerate(starts) ]
+        fits = runInPool(_fitOneStart, tasks, nworkers,
+                [ 'start %d' % i for i in xrange(0, len(tasks)) ])
+        converged = [ f for f in fits if 0 == f['status'] ]
+        if 0 == len(converged):
+            print 'multiStartFit: WARNING: none of %d fits converged' % len(
+                    fits)
+        best = min(converged if len(converged) else fits,
+                key = lambda f: f['minNll'])['start']
+        f = ROOT.TFile.Open(tasks[best][2])
+        result = f.Get('fitresult')
+        ROOT.SetOwnership(result, True)
+        f.Close()
+    finally:
+        _fitContext.clear()
+        shutil.rmtree(tmpdir, True)
+    params.assignValueOnly(result.floatParsFinal())
+    final = result.floatParsFinal()
+    for j in xrange(0, final.getSize()):
+        params.find(final[j].GetName()).setError(final[j].getError())
+
+    bestNll = fits[best]['minNll']
+    for f in fits:
+        f['deltaNll'] = f['minNll'] - bestNll
+    spread = {}
+    for name in sorted(fits[best]['values'].iterkeys()):
+        vals = [ f['values'][name] for f in converged ]
+        if len(vals):
+            mean = sum(vals) / len(vals)
+            spread[name] = (sum((v - mean) ** 2 for v in vals) /
+                    len(vals)) ** 0.5
+    summary = { 'best': best, 'fits': fits, 'nConverged': len(converged),
+            'nAtMinimum': len([ f for f in converged
+                if f['deltaNll'] < tolerance ]),
+            'spread': spread }
+    printMultiStartSummary(summary)
+    if None != fileName: writeMultiStartTree(summary, fileName)
+    return result, summary
+
+def printMultiStartSummary(summary):
+    """ print table of the fits of a multi-start fit (see multiStartFit) """
+    print 72 * '#'
+    print 'Multi-start fit: %d fits, %d converged, %d at the best minimum' % (
+            len(summary['fits']), summary['nConverged'],
+            summary['nAtMinimum'])
+    print '%6s %7s %8s %16s %12s %10s' % ('start', 'status', 'covQual',
+            'minNll', 'deltaNll', 'edm')
+    for f in summary['fits']:
+        print '%6d %7d %8d %16.4f %12.4f %10.2e%s' % (f['start'], f['status'],
+                f['covQual'], f['minNll'], f['deltaNll'], f['edm'],
+                '  <== best' if f['start'] == summary['best'] else '')
+    print 'RMS of fitted values over converged fits:'
+    for name in sorted(summary['spread'].iterkeys()):
+        print '    %-40s %12.6f' % (name, summary['spread'][name])
+    print 72 * '#'
+
+def writeMultiStartTree(summary, fileName):
+    """
+    save the fits of a multi-start fit (see multiStartFit) as tree
+    "MultiStartTree" (one entry per fit) to file fileName
+    """
+    from array import array
+    names = sorted(summary['fits'][summary['best']]['values'].iterkeys())
+    f = ROOT.TFile.Open(fileName, 'RECREATE')
+    t = ROOT.TTree('MultiStartTree', 'MultiStartTree')
+    bufs = {}
+    for b in [ 'start', 'status', 'covQual', 'minNll', 'deltaNll', 'edm' ] + [
+            n + '_fit' for n in names ]:
+        bufs[b] = array('d', [ 0. ])
+        t.Branch(b, bufs[b], b + '/D')
+    for fit in summary['fits']:
+        for b in [ 'start', 'status', 'covQual', 'minNll', 'deltaNll',
+                'edm' ]:
+            bufs[b][0] = fit[b]
+        for n in names:
+            bufs[n + '_fit'][0] = fit['values'].get(n, 0.)
+        t.Fill()
+    t.Write()
+    f.Close()
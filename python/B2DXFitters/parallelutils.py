@@ -0,0 +1,127 @@
+"""
+@file parallelutils.py
+
+@brief run independent jobs in a pool of worker processes
+
+The helpers in here are deliberately simple: ROOT objects do not survive
+pickling, so jobs are described by plain python objects (strings, numbers,
+tuples), workers exchange bulky results through ROOT files, and results are
+always handed back in the order in which the jobs were submitted, so the
+output does not depend on the number of workers or on scheduling.
+
+Worker processes are forked from the parent, so anything the parent has set
+up before calling runInPool (libraries, configuration, module level globals)
+is available in the workers as well.
+"""
+
+def __timedCall(args):
+    """ call func(task), return (result, wall time, error message) """
+    import time, traceback
+    func, task = args
+    start = time.time()
+    try:
+        result = func(task)
+        return (result, time.time() - start, None)
+    except Exception:
+        return (None, time.time() - start, traceback.format_exc())
+
+def runInPool(func, tasks, nworkers = 1, labels = None, report = True):
+    """
+    run func(task) for each task in tasks in a pool of worker processes
+
+    func    -- function to call; must be defined at the top level of a
+               module (so it can be found by the worker processes)
+    tasks   -- list of arguments, one per call to func; these must be
+               picklable (plain python types)
+    nworkers-- number of worker processes; with nworkers <= 1, everything is
+               run in the calling process
+    labels  -- optional list of strings (one per task) used in the timing
+               report
+    report  -- if True, print a timing report once all tasks are done
+
+    returns list of results (in the order of tasks); raises RuntimeError if
+    any of the tasks failed (after all tasks have been run)
+    """
+    import time
+    start = time.time()
+    tasks = list(tasks)
+    if None == labels: labels = [ str(t) for t in tasks ]
+    if nworkers <= 1 or len(tasks) <= 1:
+        results = [ __timedCall((func, t)) for t in tasks ]
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(nworkers, len(tasks)),
+                maxtasksperchild = 1)
+        try:
+            results = pool.map(__timedCall, [ (func, t) for t in tasks ],
+                    chunksize = 1)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    walltime = time.time() - start
+    if report:
+        print 72 * '#'
+        print 'Timing report (%d tasks, %d workers)' % (len(tasks),
+                max(1, min(nworkers, len(tasks))))
+        for label, (result, t, err) in zip(labels, results):
+            print '%10.1f s  %s%s' % (t, label, ('' if None == err else
+                '  FAILED'))
+        print '%10.1f s  total CPU (sum over tasks)' % sum(r[1] for r in
+                results)
+        print '%10.1f s  wall time' % walltime
+        print 72 * '#'
+    failed = [ (label, r[2]) for label, r in zip(labels, results)
+            if None != r[2] ]
+    if len(failed):
+        for label, err in failed:
+            print 'ERROR: task %s failed:' % label
+            print err
+        raise RuntimeError('%d of %d tasks failed' % (len(failed),
+            len(tasks)))
+    return [ r[0] for r in results ]
+
+def mergeWorkspaceFile(workspace, filename, wsname = 'workspace',
+        debug = False):
+    """
+    import data sets and pdfs from a workspace saved in a file
+
+    workspace   -- workspace to import into
+    filename    -- name of ROOT file with workspace to read
+    wsname      -- name of workspace inside the file
+    debug       -- print what is being merged
+
+    Objects which already exist in workspace (by name) are not imported
+    again; shared nodes (observables, ...) are recycled.
+
+    returns the number of imported data sets and pdfs
+    """
+    import ROOT
+    from ROOT import TFile, RooFit
+    f = TFile.Open(filename)
+    if None == f or f.IsZombie():
+        raise IOError('Unable to open %s' % filename)
+    w = f.Get(wsname)
+    if None == w or not w.InheritsFrom('RooWorkspace'):
+        raise IOError('No workspace %s in %s' % (wsname, filename))
+    nimported = 0
+    for d in w.allData():
+        if None != workspace.data(d.GetName()): continue
+        if debug: print 'Merging data set %s from %s' % (d.GetName(), filename)
+        workspace.__getattribute__('import')(d)
+        nimported += 1
+    it = w.allPdfs().fwdIterator()
+    while True:
+        pdf = it.next()
+        if None == pdf: break
+        if None != workspace.pdf(pdf.GetName()): continue
+        if debug: print 'Merging pdf %s from %s' % (pdf.GetName(), filename)
+        workspace.__getattribute__('import')(pdf,
+                RooFit.RecycleConflictNodes(), RooFit.Silence())
+        nimported += 1
+    del w
+    f.Close()
+    del f
+    return nimported
@@ -0,0 +1,297 @@
+"""
+@file pdfcache.py
+
+@brief on-disk cache of built (generator) pdfs, keyed by configuration hash
+
+Building the generator pdfs from a configuration (and reading the template
+workspaces it refers to) takes a long time for big models, and it is the same
+for every toy job of a campaign. PdfCache stores the workspace with the built
+pdfs once, together with the python structure (dictionaries, lists, ...)
+that refers to the objects in it, so later jobs with the same configuration
+load it instead of building it again.
+
+The cache key is a hash of
+- the configuration dictionary (in a canonical form, so dictionary ordering
+  does not matter),
+- the contents of all files the configuration refers to (any string in the
+  configuration which is the name of an existing file, e.g. template
+  workspaces),
+- the source code of the building script and modules (passed by the caller),
+- the ROOT version and a format version of this module.
+Changing any of these gives a new key, i.e. a new cache entry; stale entries
+are simply never used again. Changes to the compiled B2DXFitters library are
+not detected: clear the cache directory (or switch caching off) after
+changing pdf classes.
+
+Example:
+@code
+cache = PdfCache()
+key = cache.key(myconfigfile, 'GEN', [ __file__ ])
+pdf = cache.load(key)
+if None == pdf:
+    pdf = getMasterPDF(myconfigfile, 'GEN')
+    cache.store(key, pdf['ws'], pdf)
+@endcode
+"""
+
+import ROOT
+
+# bump whenever the format of cache entries changes
+CACHE_VERSION = 1
+
+def defaultCacheDir():
+    """
+    return the default cache directory: $B2DXFITTERS_PDFCACHE if set, or
+    ~/.cache/B2DXFitters/pdfcache
+    """
+    import os
+    return os.environ.get('B2DXFITTERS_PDFCACHE', os.path.join(
+        os.path.expanduser('~'), '.cache', 'B2DXFitters', 'pdfcache'))
+
+def openPdfCache(directory = None, debug = False):
+    """
+    return a PdfCache for scripts, where caching is opt-in
+
+    directory   -- cache directory (default: $B2DXFITTERS_PDFCACHE)
+    debug       -- print debug information
+
+    returns None if neither directory nor $B2DXFITTERS_PDFCACHE is given, so
+    (batch) jobs only write cache entries where they are asked to
+    """
+    import os
+    if None == directory:
+        directory = os.environ.get('B2DXFITTERS_PDFCACHE')
+    if None == directory or '' == directory:
+        return None
+    return PdfCache(directory, debug)
+
+def _canonical(obj):
+    """ string representation of obj which does not depend on dict order """
+    if isinstance(obj, dict):
+        return '{%s}' % ','.join(sorted('%s:%s' % (_canonical(k),
+            _canonical(v)) for k, v in obj.iteritems()))
+    if isinstance(obj, (list, tuple)):
+        return '[%s]' % ','.join(_canonical(o) for o in obj)
+    return repr(obj)
+
+def _referencedFiles(obj, files):
+    """ collect names of existing files among the strings in obj """
+    import os
+    if isinstance(obj, dict):
+        for k in sorted(obj.keys()):
+            _referencedFiles(obj[k], files)
+    elif isinstance(obj, (list, tuple)):
+        for o in obj:
+            _referencedFiles(o, files)
+    elif isinstance(obj, str):
+        fname = os.path.expandvars(obj)
+        if fname not in files and os.path.isfile(fname):
+            files.append(fname)
+    return files
+
+def _fileChecksum(fname):
+    """ sha1 of the contents of file fname """
+    import hashlib
+    h = hashlib.sha1()
+    f = open(fname, 'rb')
+    try:
+        while True:
+            block = f.read(1 << 20)
+            if not block: break
+            h.update(block)
+    finally:
+        f.close()
+    return h.hexdigest()
+
+class _Ref(object):
+    """ reference to an object in the cached workspace """
+    def __init__(self, kind, name, cls = None):
+        self.kind, self.name, self.cls = kind, name, cls
+
+class PdfCache(object):
+    """
+    on-disk cache of workspaces with built pdfs (see module documentation)
+    """
+    def __init__(self, directory = None, debug = False):
+        """
+        directory   -- cache directory (default: see defaultCacheDir)
+        debug       -- print debug information
+        """
+        self.directory = directory if None != directory else defaultCacheDir()
+        self.debug = debug
+
+    def key(self, config, name, sources = [], ignore = []):
+        """
+        return the cache key of the pdf built from config
+
+        config  -- configuration dictionary
+        name    -- what is built from config (e.g. 'GEN'), so that different
+                   things built from the same configuration do not clash
+        sources -- source files of the code building the pdf
+        ignore  -- (top level) configuration entries which do not influence
+                   the pdf (e.g. input/output file names)
+        """
+        import hashlib, os
+        config = dict((k, v) for k, v in config.iteritems() if k not in ignore)
+        h = hashlib.sha1()
+        h.update('%d:%s:%s:' % (CACHE_VERSION, ROOT.gROOT.GetVersion(), name))
+        h.update(_canonical(config))
+        for fname in _referencedFiles(config, []):
+            h.update(':%s=%s' % (fname, _fileChecksum(fname)))
+        for fname in sources:
+            # hash python sources rather than their byte-compiled versions
+            if fname.endswith('.pyc') and os.path.isfile(fname[:-1]):
+                fname = fname[:-1]
+            h.update(':%s' % _fileChecksum(fname))
+        return h.hexdigest()
+
+    def fileName(self, key):
+        """ return name of the cache file for key """
+        import os
+        return os.path.join(self.directory, 'pdfcache_%s.root' % key)
+
+    def load(self, key):
+        """
+        load cached object for key
+
+        returns the object passed to store (with all references to objects
+        in the cached workspace restored), or None if there is no (usable)
+        cache entry for key
+        """
+        import os, pickle
+        fname = self.fileName(key)
+        if not os.path.isfile(fname): return None
+        f = ROOT.TFile.Open(fname, 'READ')
+        if None == f or f.IsZombie():
+            print 'PdfCache: WARNING: unable to open %s, ignoring it' % fname
+            return None
+        ws = f.Get('pdfcache')
+        skeleton = f.Get('skeleton')
+        if None == ws or None == skeleton:
+            print 'PdfCache: WARNING: %s is incomplete, ignoring it' % fname
+            f.Close()
+            return None
+        ROOT.SetOwnership(ws, True)
+        skeleton = str(skeleton.GetString())
+        f.Close()
+        try:
+            retVal = self._decode(pickle.loads(skeleton), ws)
+        except (KeyError, pickle.UnpicklingError), e:
+            print 'PdfCache: WARNING: %s is unusable (%s), ignoring it' % (
+                    fname, str(e))
+            return None
+        print 'PdfCache: loaded %s' % fname
+        if self.debug: ws.Print('v')
+        return retVal
+
+    def store(self, key, ws, obj):
+        """
+        store workspace ws and the object obj referring to it under key
+
+        ws      -- RooWorkspace containing the built pdfs
+        obj     -- python object (dictionaries, lists and tuples of strings,
+                   numbers, None, RooFit objects and collections of them, and
+                   ws itself) to restore with load
+
+        returns True if the entry was stored; objects which cannot be
+        restored (e.g. arbitrary python objects) leave the cache untouched
+
+        RooFit objects in obj which are not yet in ws are imported into ws,
+        but only once the entry has been written; until then, they go into a
+        scratch copy of ws, so a failed store leaves ws as it was
+        """
+        import os, errno, pickle, tempfile
+        from B2DXFitters.WS import WS
+        scratch = ROOT.RooWorkspace(ws)
+        ROOT.SetOwnership(scratch, True)
+        imported = []
+        try:
+            skeleton = pickle.dumps(self._encode(obj, scratch, imported), 0)
+        except (TypeError, pickle.PicklingError), e:
+            print 'PdfCache: WARNING: not caching (%s)' % str(e)
+            return False
+        try:
+            os.makedirs(self.directory)
+        except OSError, e:
+            if errno.EEXIST != e.errno: raise
+        # write to a temporary file, and move it into place, so concurrent
+        # jobs never see incomplete cache entries
+        fd, tmpname = tempfile.mkstemp(prefix = '.pdfcache_', suffix = '.root',
+                dir = self.directory)
+        os.close(fd)
+        try:
+            f = ROOT.TFile.Open(tmpname, 'RECREATE')
+            f.WriteTObject(scratch, 'pdfcache')
+            f.WriteTObject(ROOT.TObjString(skeleton), 'skeleton')
+            f.Close()
+            os.rename(tmpname, self.fileName(key))
+        finally:
+            if os.path.exists(tmpname): os.remove(tmpname)
+        for o in imported: WS(ws, o)
+        print 'PdfCache: stored %s' % self.fileName(key)
+        return True
+
+    def _encode(self, obj, ws, imported):
+        """
+        replace RooFit objects in obj by references into ws
+
+        RooFit objects not yet in ws are imported, and appended to imported
+        """
+        if isinstance(obj, dict):
+            return dict((k, self._encode(v, ws, imported))
+                    for k, v in obj.iteritems())
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self._encode(o, ws, imported) for o in obj)
+        if None == obj or isinstance(obj, (bool, int, long, float,
+                basestring)):
+            return obj
+        if not hasattr(obj, 'InheritsFrom'):
+            raise TypeError('cannot cache object of type %s' % type(obj))
+        if obj.InheritsFrom('RooWorkspace'):
+            if obj.GetName() != ws.GetName():
+                raise TypeError('cannot cache workspace %s' % obj.GetName())
+            return _Ref('ws', None)
+        if obj.InheritsFrom('RooAbsData'):
+            return _Ref('data', self._swallow(ws, obj, imported))
+        if obj.InheritsFrom('RooAbsArg'):
+            return _Ref('obj', self._swallow(ws, obj, imported))
+        if obj.InheritsFrom('RooAbsCollection'):
+            names = []
+            it = obj.fwdIterator()
+            while True:
+                o = it.next()
+                if None == o: break
+                names.append(self._swallow(ws, o, imported))
+            return _Ref('args', names, 'RooArgList'
+                    if obj.InheritsFrom('RooArgList') else 'RooArgSet')
+        raise TypeError('cannot cache object of class %s' % obj.ClassName())
+
+    def _swallow(self, ws, obj, imported):
+        """ import obj into ws unless it is there, return its name in ws """
+        from B2DXFitters.WS import WS
+        if None == ws.obj(obj.GetName()): imported.append(obj)
+        return WS(ws, obj).GetName()
+
+    def _decode(self, obj, ws):
+        """ inverse of _encode """
+        if isinstance(obj, dict):
+            return dict((k, self._decode(v, ws)) for k, v in obj.iteritems())
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self._decode(o, ws) for o in obj)
+        if not isinstance(obj, _Ref):
+            return obj
+        if 'ws' == obj.kind:
+            return ws
+        if 'args' == obj.kind:
+            retVal = getattr(ROOT, obj.cls)()
+            for name in obj.name:
+                retVal.add(self._lookup(ws, 'obj', name))
+            return retVal
+        return self._lookup(ws, obj.kind, obj.name)
+
+    def _lookup(self, ws, kind, name):
+        """ look up object in workspace, raise KeyError if not found """
+        retVal = ws.data(name) if 'data' == kind else ws.obj(name)
+        if None == retVal:
+            raise KeyError('%s not in cached workspace' % name)
+        return retVal
@@ -0,0 +1,293 @@
+"""
+@file profilescan.py
+
+@brief parallel profile likelihood scans in one or two parameters
+
+profileScan fixes one or two parameters (gamma, delta, ..., or any of the
+CP observables C, S, D, ...) at the points of a grid and refits all other
+floating parameters at each point. Grid points are fitted in a pool of
+worker processes (see parallelutils), and each fit starts from the fitted
+values and errors of its already converged neighbour:
+
+- the grid line through the grid point closest to the global minimum is
+  fitted in two chains, one running away from the minimum in either
+  direction; each chain is fitted point by point in one worker, every point
+  starting from the result of the previous converged one
+- for two parameters, each grid row is then fitted in the same way, in two
+  chains running away from the point of the row on the first line; the rows
+  are fitted in parallel
+- optionally, the grid is refined near the minimum: around each point with
+  a NLL within refineBelow of the minimum, new points are added at half the
+  current spacing, each starting from the closest converged point
+
+The profile is returned as a dictionary of numpy arrays (one entry per
+point), and can be saved as a columnar file (see
+datasetio.writeColumnArrays, datasetio.readColumnarFile).
+
+Example:
+@code
+from B2DXFitters.profilescan import profileScan, makeGrid
+profile = profileScan(pdf, data, [ 'lambda', 'delta' ],
+        [ makeGrid(0., 1., 21), makeGrid(0., 6.28, 41) ],
+        [ RooFit.Offset(True) ], nworkers = 8, refine = 2,
+        fileName = 'profile.col')
+@endcode
+"""
+
+import ROOT
+
+# pdf, data, ... shared with the workers (inherited through fork)
+_scanContext = {}
+
+def makeGrid(lo, hi, n):
+    """ return list of n equidistant points from lo to hi (inclusive) """
+    if n <= 1: return [ 0.5 * (lo + hi) ]
+    return [ lo + (hi - lo) * i / float(n - 1) for i in xrange(0, n) ]
+
+def _chains(line, seed):
+    """
+    split a line of grid points into the two chains running away from seed
+
+    line    -- list of points
+    seed    -- index of the point on line closest to the minimum
+
+    returns list of (one or two) lists of points (the seed point starts the
+    first chain); the chains are not cut any further, so every point of a
+    chain starts from its converged neighbour
+    """
+    up, down = line[seed:], line[seed - 1::-1] if seed > 0 else []
+    return [ half for half in (up, down) if len(half) ]
+
+def _fitChain(task):
+    """ fit the points of a chain, each starting from the last converged """
+    points, start = task
+    pdf, data = _scanContext['pdf'], _scanContext['data']
+    params, scanPars = _scanContext['params'], _scanContext['scanPars']
+    opts = ROOT.RooLinkedList()
+    for o in [ ROOT.RooFit.Save(True) ] + _scanContext['fitOpts']:
+        opts.Add(o)
+    retVal = []
+    for point in points:
+        params.assignValueOnly(_scanContext['nominal'])
+        for name, (val, err) in start.iteritems():
+            p = params.find(name)
+            p.setVal(val)
+            if err > 0.: p.setError(err)
+        for name, val in zip(scanPars, point):
+            params.find(name).setVal(val)
+        result = pdf.fitTo(data, opts)
+        ROOT.SetOwnership(result, True)
+        final = result.floatParsFinal()
+        fitted = dict((final[j].GetName(), (final[j].getVal(),
+            final[j].getError())) for j in xrange(0, final.getSize()))
+        retVal.append({ 'point': point, 'status': result.status(),
+            'covQual': result.covQual(), 'minNll': result.minNll(),
+            'edm': result.edm(), 'values': fitted })
+        if 0 == result.status(): start = fitted
+        del result
+    return retVal
+
+def _runChains(chains, nworkers, level):
+    """ fit chains (list of (points, start)) in parallel, return fits """
+    labels = [ 'level %d, chain %d (%d points)' % (level, i, len(c[0]))
+            for i, c in enumerate(chains) ]
+    from B2DXFitters.parallelutils import runInPool
+    retVal = []
+    for fits in runInPool(_fitChain, chains, nworkers, labels):
+        for f in fits: f['level'] = level
+        retVal += fits
+    return retVal
+
+def _closestConverged(point, fits, scale):
+    """ return fitted values of the converged fit closest to point """
+    best, bestDist = None, None
+    for f in fits:
+        if 0 != f['status']: continue
+        dist = sum(((a - b) / s) ** 2 for a, b, s in
+                zip(point, f['point'], scale))
+        if None == bestDist or dist < bestDist:
+            best, bestDist = f, dist
+    return None if None == best else best['values']
+
+def profileScan(pdf, data, scanPars, grids, fitOpts = [], nworkers = 1,
+        refine = 0, refineBelow = 2., fileName = None, debug = False):
+    """
+    profile likelihood scan of pdf on data in one or two parameters
+
+    pdf         -- pdf to fit
+    data        -- data set to fit
+    scanPars    -- list of names of the (one or two) parameters to scan
+    grids       -- list of lists of grid values, one per scanned parameter
+                   (see makeGrid)
+    fitOpts     -- python list of RooCmdArgs for fitTo (RooFit.Save is
+                   added); with nworkers > 1, options like NumCPU multiply
+                   the number of processes
+    nworkers    -- number of fits to run in parallel (the first line is
+                   fitted in two chains, so only two-parameter scans and
+                   refinement steps keep more than two workers busy)
+    refine      -- number of grid refinement steps near the minimum
+    refineBelow -- points with a NLL less than this above the minimum are
+                   refined around
+    fileName    -- if given, the profile is saved to this columnar file
+    debug       -- print debug information
+
+    The scan starts with a fit with all parameters floating (from the
+    current values) to find the global minimum. The parameters of pdf are
+    set back to the result of this fit at the end.
+
+    returns dictionary of numpy arrays, one entry per point (the global fit
+    first, then the grid points sorted by the values of the scanned
+    parameters): one column per scanned parameter, 'minNll',
+    'deltaNll' (relative to the lowest NLL found), 'status', 'covQual',
+    'edm', 'level' (refinement step which added the point, -1 for the
+    global fit) and, for each other floating parameter, '<name>_fit' and
+    '<name>_err'
+    """
+    import numpy
+    if len(scanPars) not in (1, 2) or len(grids) != len(scanPars):
+        raise ValueError('profileScan: need one grid for each of one or '
+                'two parameters')
+    params = pdf.getParameters(data)
+    ROOT.SetOwnership(params, True)
+    scanVars = []
+    for name in scanPars:
+        p = params.find(name)
+        if None == p or not p.InheritsFrom('RooRealVar'):
+            raise NameError('profileScan: no parameter %s' % name)
+        scanVars.append(p)
+    grids = [ sorted(g) for g in grids ]
+
+    # global minimum
+    opts = ROOT.RooLinkedList()
+    for o in [ ROOT.RooFit.Save(True) ] + list(fitOpts):
+        opts.Add(o)
+    result = pdf.fitTo(data, opts)
+    ROOT.SetOwnership(result, True)
+    if 0 != result.status():
+        print 'profileScan: WARNING: global fit status %d' % result.status()
+    final = result.floatParsFinal()
+    bestFit = dict((final[j].GetName(), (final[j].getVal(),
+        final[j].getError())) for j in xrange(0, final.getSize()))
+    globalFit = { 'point': tuple(v.getVal() for v in scanVars),
+            'status': result.status(), 'covQual': result.covQual(),
+            'minNll': result.minNll(), 'edm': result.edm(),
+            'values': bestFit, 'level': -1 }
+    best = params.snapshot()
+    ROOT.SetOwnership(best, True)
+    wasConstant = [ v.isConstant() for v in scanVars ]
+    for v in scanVars: v.setConstant(True)
+    nominal = params.snapshot()
+    ROOT.SetOwnership(nominal, True)
+    start = dict((k, v) for k, v in bestFit.iteritems()
+            if k not in scanPars)
+    seed = [ min(xrange(0, len(g)), key = lambda i: abs(g[i] - v.getVal()))
+            for g, v in zip(grids, scanVars) ]
+    scale = [ max(1e-300, g[-1] - g[0]) for g in grids ]
+
+    _scanContext.update({ 'pdf': pdf, 'data': data, 'params': params,
+        'nominal': nominal, 'scanPars': list(scanPars),
+        'fitOpts': list(fitOpts) })
+    try:
+        # first line: through the grid point closest to the minimum, along
+        # the last scanned parameter
+        if 1 == len(grids):
+            line = [ (x, ) for x in grids[0] ]
+        else:
+            line = [ (grids[0][seed[0]], y) for y in grids[1] ]
+        fits = _runChains([ (c, start) for c in _chains(line, seed[-1]) ],
+                nworkers, 0)
+        # for two parameters: the grid rows, in two chains each, starting
+        # from the point of the row on the first line
+        if 2 == len(grids):
+            chains = []
+            for y in grids[1]:
+                row = [ (x, y) for x in grids[0] ]
+                rowStart = (_closestConverged(row[seed[0]], fits, scale) or
+                        start)
+                for half in (row[seed[0] + 1:],
+                        row[seed[0] - 1::-1] if seed[0] > 0 else []):
+                    if len(half): chains.append((half, rowStart))
+            fits += _runChains(chains, nworkers, 0)
+        # adaptive refinement near the minimum
+        spacing = [ min([ b - a for a, b in zip(g[:-1], g[1:]) if b > a ] or
+            [ 0. ]) for g in grids ]
+        for level in xrange(1, refine + 1):
+            spacing = [ 0.5 * s for s in spacing ]
+            nlls = [ f['minNll'] for f in fits + [ globalFit ]
+                    if 0 == f['status'] ]
+            if 0 == len(nlls): break
+            minNll = min(nlls)
+            have = set(tuple(round((x - g[0]) / s, 6) if s > 0. else 0.
+                for x, g, s in zip(f['point'], grids, spacing))
+                for f in fits)
+            new = []
+            for f in fits:
+                if 0 != f['status'] or f['minNll'] - minNll >= refineBelow:
+                    continue
+                steps = [ (-1, 0, 1) if s > 0. else (0, ) for s in spacing ]
+                for d in ([ (a, ) for a in steps[0] ] if 1 == len(grids)
+                        else [ (a, b) for a in steps[0] for b in steps[1] ]):
+                    p = tuple(x + a * s for x, a, s in
+                            zip(f['point'], d, spacing))
+                    if any(x < g[0] - 0.5 * s or x > g[-1] + 0.5 * s
+                            for x, g, s in zip(p, grids, spacing)):
+                        continue
+                    key = tuple(round((x - g[0]) / s, 6) if s > 0. else 0.
+                            for x, g, s in zip(p, grids, spacing))
+                    if key in have: continue
+                    have.add(key)
+                    new.append(p)
+            if debug:
+                print 'profileScan: refinement %d: %d new points' % (level,
+                        len(new))
+            if 0 == len(new): break
+            fits += _runChains([ ([ p ], _closestConverged(p, fits, scale)
+                or start) for p in sorted(new) ], nworkers, level)
+    finally:
+        _scanContext.clear()
+        params.assignValueOnly(best)
+        for v, c in zip(scanVars, wasConstant): v.setConstant(c)
+        for k, (val, err) in bestFit.iteritems(): params.find(k).setError(err)
+
+    fits.sort(key = lambda f: f['point'])
+    fits.insert(0, globalFit)
+    names = sorted(k for k in bestFit.iterkeys() if k not in scanPars)
+    n = len(fits)
+    profile = {}
+    for i, name in enumerate(scanPars):
+        profile[name] = numpy.array([ f['point'][i] for f in fits ])
+    for col in ('minNll', 'edm'):
+        profile[col] = numpy.array([ f[col] for f in fits ])
+    for col in ('status', 'covQual', 'level'):
+        profile[col] = numpy.array([ f[col] for f in fits ],
+                dtype = numpy.int32)
+    ok = profile['status'] == 0
+    profile['deltaNll'] = profile['minNll'] - (profile['minNll'][ok].min()
+            if ok.any() else profile['minNll'].min())
+    for name in names:
+        profile[name + '_fit'] = numpy.array([ f['values'].get(name,
+            (numpy.nan, 0.))[0] for f in fits ])
+        profile[name + '_err'] = numpy.array([ f['values'].get(name,
+            (numpy.nan, 0.))[1] for f in fits ])
+    print 'profileScan: %d points fitted, %d converged' % (n - 1,
+            int(ok[1:].sum()))
+    if None != fileName: writeProfile(profile, scanPars, fileName)
+    return profile
+
+def writeProfile(profile, scanPars, fileName):
+    """
+    save a profile (see profileScan) as columnar file (see
+    datasetio.writeColumnArrays); the names of the scanned parameters are
+    stored in the header's 'extra' entry
+    """
+    from B2DXFitters.datasetio import writeColumnArrays
+    columns = []
+    for name in list(scanPars) + sorted(k for k in profile.iterkeys()
+            if k not in scanPars):
+        integer = profile[name].dtype.kind in 'iu'
+        columns.append({ 'name': name, 'title': name, 'unit': '',
+            'type': 'real', 'dtype': '<i4' if integer else '<f8',
+            'min': None, 'max': None })
+    writeColumnArrays(fileName, columns, profile,
+            len(profile['minNll']), 'profile', 'profile likelihood scan',
+            extra = { 'scanPars': list(scanPars) })
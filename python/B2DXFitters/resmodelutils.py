@@ -165,3 +165,65 @@ def getResolutionModel(
         raise TypeError('Unknown type of resolution model')
     return trm, tacc
 
+
+def getResolutionParameters(
+        ws,             # workspace
+        config,         # config dictionary
+        timeerr         # time error observable (if applicable)
+        ):
+    """
+    obtain the parameters of the resolution model made by getResolutionModel
+
+    ws      -- workspace with the resolution model
+    config  -- config dictionary with settings (as for getResolutionModel)
+    timeerr -- time error observable (or None, if average time error is used)
+
+    returns tuple (sigmas, fractions, bias, scalefactor): list of widths of
+    the Gaussian components (the time error observable for per event decay
+    time errors), list of fractions of all but the last component, common
+    bias and scale factor; these are the objects used by the resolution model
+    (looked up/created via WS), e.g. to set up a dedicated generator
+
+    All forms of config['DecayTimeResolutionModel'] accepted by
+    getResolutionModel are accepted here. If a list/tuple gives as many
+    fractions as widths, the resolution model normalises them by their sum,
+    and the fractions returned are the corresponding normalised ones.
+    """
+    from ROOT import RooRealVar, RooFormulaVar, RooArgList
+    bias = WS(ws, RooRealVar('timeerr_bias',
+        'timeerr_bias', config['DecayTimeResolutionBias']))
+    sf = WS(ws, RooRealVar('timeerr_scalefactor',
+        'timeerr_scalefactor',
+        config['DecayTimeResolutionScaleFactor'], .5, 2.))
+    model = config['DecayTimeResolutionModel']
+    if type(model) == str:
+        if model != 'GaussianWithPEDTE':
+            raise TypeError('Unknown type of resolution model: %s' % model)
+        return [ timeerr ], [ ], bias, sf
+    if type(model) == dict:
+        sigmas = model['sigmas']
+        fractions = model['fractions']
+        if len(fractions) + 1 != len(sigmas):
+            raise TypeError('Unknown type of resolution model')
+    elif type(model) == list or type(model) == tuple:
+        if 2 != len(model) or len(model[0]) < 1 or (
+                len(model[1]) != len(model[0]) and
+                len(model[1]) + 1 != len(model[0])):
+            raise TypeError('Unknown type of resolution model')
+        sigmas, fractions = model[0], model[1]
+    else:
+        raise TypeError('Unknown type of resolution model')
+    sigmavars = [ WS(ws, RooRealVar('resmodel%02d_sigma' % i,
+        'resmodel%02d_sigma' % i, s, 'ps')) for i, s in enumerate(sigmas) ]
+    fracvars = [ WS(ws, RooRealVar('resmodel%02d_frac' % i,
+        'resmodel%02d_frac' % i, f, 'ps')) for i, f in enumerate(fractions) ]
+    if len(fracvars) == len(sigmavars):
+        # one coefficient per component: normalise by their sum, and drop the
+        # last one, as the generator expects
+        coeffs = RooArgList()
+        for f in fracvars: coeffs.add(f)
+        total = '+'.join('@%d' % i for i in xrange(0, len(fracvars)))
+        fracvars = [ WS(ws, RooFormulaVar('resmodel%02d_fracnorm' % i,
+            'resmodel%02d_fracnorm' % i, '@%d/(%s)' % (i, total), coeffs))
+            for i in xrange(0, len(fracvars) - 1) ]
+    return sigmavars, fracvars, bias, sf
@@ -0,0 +1,58 @@
+"""
+@file rngutils.py
+
+@brief reproducible random number substreams for toy generation
+
+Instead of seeding one global generator and relying on the order in which
+things are drawn from it, each piece of work (e.g. the yield of one
+hypothesys/year/mode/component cell, or the generation of its events) gets
+its own substream, whose seed is a pure function of the toy seed and a key
+identifying the piece of work (a "counter" such as (hypo, year, mode, comp,
+stage)). Substreams therefore do not depend on the order in which the work
+is done, on which process does it, or on what else is generated in the same
+job, so toys can be generated in parallel, in part, or resumed, and still be
+reproduced exactly.
+"""
+
+def substreamSeed(seed, *keys):
+    """
+    return seed of the substream of seed identified by keys
+
+    seed    -- toy (master) seed
+    keys    -- anything with a well defined str() (strings, numbers), e.g.
+               hypo, year, mode, component, stage
+
+    returns a non-zero 32 bit seed, suitable for TRandom3 and RooRandom
+    """
+    import hashlib
+    key = repr((int(seed), ) + tuple(str(k) for k in keys))
+    return int(hashlib.sha1(key).hexdigest()[:8], 16) or 1
+
+def substream(seed, *keys):
+    """
+    return a new TRandom3 generating the substream of seed identified by keys
+
+    seed    -- toy (master) seed
+    keys    -- substream keys (see substreamSeed)
+    """
+    from ROOT import TRandom3
+    return TRandom3(substreamSeed(seed, *keys))
+
+def seedGlobalGenerators(seed, *keys):
+    """
+    seed gRandom and RooRandom with the substream of seed identified by keys
+
+    seed    -- toy (master) seed
+    keys    -- substream keys (see substreamSeed); without keys, the global
+               generators are seeded with seed itself
+
+    This is what to call before RooAbsPdf::generate and friends, which only
+    use the global generators.
+
+    returns the seed used
+    """
+    import ROOT
+    s = substreamSeed(seed, *keys) if len(keys) else int(seed)
+    ROOT.gRandom.SetSeed(s)
+    ROOT.RooRandom.randomGenerator().SetSeed(s)
+    return s
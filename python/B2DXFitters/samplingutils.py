@@ -0,0 +1,147 @@
+"""
+@file samplingutils.py
+
+@brief fast sampling of per-event observables (mistags, decay time errors)
+       from template pdfs
+
+Generating per-event observables with RooAbsPdf.generate goes through
+RooFit's generator machinery for every single event. For template pdfs
+(RooHistPdf, RooKeysPdf, ...) of one or two observables, it is much faster to
+tabulate the cumulative distribution once, and to draw any number of values
+by inverse-CDF lookup with numpy.
+"""
+
+import ROOT
+
+class InverseCDFSampler(object):
+    """
+    draw values of one or two observables from a pdf by inverse-CDF lookup
+
+    The pdf is tabulated once (at the centres of a regular grid over the
+    range of the observables), and the density is taken to be constant
+    within each grid cell. With two observables (e.g. correlated OS and SS
+    mistag), the table is two-dimensional, so correlations are preserved.
+
+    Example:
+    @code
+    sampler = InverseCDFSampler(mistagpdf, [ mistag ])
+    values, = sampler.sample(100000, numpy.random.RandomState(42))
+    @endcode
+    """
+    def __init__(self, pdf, observables, nbins = None):
+        """
+        tabulate the cumulative distribution of pdf
+
+        pdf         -- pdf to sample from
+        observables -- list of one or two RooRealVar observables of pdf
+        nbins       -- number of grid cells per observable (int or list);
+                       default is 1000 in 1D, and 200 x 200 in 2D
+        """
+        import numpy
+        from ROOT import RooFit
+        self.observables = list(observables)
+        ndim = len(self.observables)
+        if ndim not in (1, 2):
+            raise ValueError('InverseCDFSampler: need one or two '
+                    'observables, got %d' % ndim)
+        if None == nbins: nbins = 1000 if 1 == ndim else 200
+        if int == type(nbins): nbins = ndim * [ nbins ]
+        self.edges = [ numpy.linspace(o.getMin(), o.getMax(), n + 1)
+                for o, n in zip(self.observables, nbins) ]
+        hname = '%s_InverseCDFTable' % pdf.GetName()
+        x = self.observables[0]
+        if 1 == ndim:
+            h = pdf.createHistogram(hname, x, RooFit.Binning(nbins[0],
+                x.getMin(), x.getMax()))
+        else:
+            y = self.observables[1]
+            h = pdf.createHistogram(hname, x, RooFit.Binning(nbins[0],
+                x.getMin(), x.getMax()), RooFit.YVar(y,
+                    RooFit.Binning(nbins[1], y.getMin(), y.getMax())))
+        ROOT.SetOwnership(h, True)
+        if 1 == ndim:
+            table = numpy.array([ h.GetBinContent(i + 1)
+                for i in xrange(nbins[0]) ])
+        else:
+            table = numpy.array([ [ h.GetBinContent(i + 1, j + 1)
+                for j in xrange(nbins[1]) ] for i in xrange(nbins[0]) ])
+        del h
+        self._setTable(nbins, table, pdf.GetName())
+
+    @classmethod
+    def fromHistogram(cls, h, observable = None):
+        """
+        build a sampler for the distribution given by a 1D histogram
+
+        h           -- TH1 (possibly with variable bin widths); bin contents
+                       are the probabilities of the bins, as in TH1::GetRandom
+        observable  -- observable the values are for (optional, only used to
+                       label the sampler)
+
+        Values are distributed uniformly within each bin, as with
+        TH1::GetRandom, so sampling is equivalent to calling GetRandom for
+        each value (but much faster).
+        """
+        import numpy
+        retVal = cls.__new__(cls)
+        retVal.observables = [ observable ]
+        nbins = h.GetNbinsX()
+        ax = h.GetXaxis()
+        retVal.edges = [ numpy.array([ ax.GetBinLowEdge(i + 1)
+            for i in xrange(nbins + 1) ]) ]
+        retVal._setTable([ nbins ], numpy.array([ h.GetBinContent(i + 1)
+            for i in xrange(nbins) ]), h.GetName())
+        return retVal
+
+    def _setTable(self, nbins, table, name):
+        """ set up cumulative table from cell contents """
+        import numpy
+        table = numpy.clip(table, 0., None).ravel()
+        total = table.sum()
+        if not total > 0.:
+            raise ValueError('InverseCDFSampler: %s vanishes everywhere' %
+                    name)
+        self.nbins = nbins
+        self.prob = table / total
+        self.cdf = numpy.cumsum(self.prob)
+        self.cdf[-1] = 1.
+
+    def sample(self, n, rnd):
+        """
+        draw n values of the observables
+
+        n   -- number of values to draw
+        rnd -- numpy.random.RandomState to use
+
+        returns list of numpy arrays (one per observable)
+        """
+        import numpy
+        u = rnd.uniform(0., 1., n)
+        cell = numpy.minimum(numpy.searchsorted(self.cdf, u, side = 'right'),
+                len(self.cdf) - 1)
+        if 1 == len(self.observables):
+            # invert the (piecewise linear) cumulative distribution within
+            # the cell, so no further random numbers are needed
+            lo = self.cdf[cell] - self.prob[cell]
+            frac = numpy.where(self.prob[cell] > 0.,
+                    (u - lo) / numpy.maximum(self.prob[cell], 1e-300), 0.5)
+            edges = self.edges[0]
+            return [ edges[cell] + numpy.clip(frac, 0., 1.) *
+                    (edges[cell + 1] - edges[cell]) ]
+        ix, iy = numpy.divmod(cell, self.nbins[1])
+        retVal = []
+        for edges, idx in zip(self.edges, (ix, iy)):
+            retVal.append(edges[idx] + rnd.uniform(0., 1., n) *
+                    (edges[idx + 1] - edges[idx]))
+        return retVal
+
+def randomState():
+    """
+    return a numpy.random.RandomState seeded from RooFit's random generator
+
+    This way, values drawn with numpy are reproducible whenever RooFit's
+    generator is seeded reproducibly (e.g. with rngutils.seedGlobalGenerators).
+    """
+    import numpy
+    return numpy.random.RandomState(int(
+        ROOT.RooRandom.randomGenerator().Integer(2147483647)))
@@ -389,3 +389,64 @@ def buildBDecayTimePdf(
     # return the copy of retVal which is inside the workspace
     return WS(ws, retVal)
 
+
+# set up a fast generator for a pdf made by buildBDecayTimePdf
+def buildBDecayEnvelopeGenContext(
+    name,                               # name prefix used in buildBDecayTimePdf
+    ws,                                 # workspace with the pdf
+    pdf,                                # pdf returned by buildBDecayTimePdf
+    genvars,                            # observables to generate
+    time,                               # decay time observable
+    Gamma, DeltaGamma, DeltaM,          # decay parameters
+    resolution = None,                  # resolution parameters
+    acceptance = None,                  # acceptance function
+    prototype = None,                   # per event mistags/decay time errors
+    ):
+    """
+    set up a fast generator for a pdf made by buildBDecayTimePdf
+
+    name        -- name prefix passed to buildBDecayTimePdf
+    ws          -- workspace into which buildBDecayTimePdf imported the pdf
+    pdf         -- pdf returned by buildBDecayTimePdf
+    genvars     -- observables to generate (decay time, final state charge,
+                   tagging decisions)
+    time        -- decay time observable
+    Gamma       -- width of decay (1/lifetime)
+    DeltaGamma  -- width difference
+    DeltaM      -- mass difference
+    resolution  -- None for perfect resolution, or tuple (sigmas, fractions,
+                   bias, scalefactor) describing a (sum of) Gaussian
+                   resolution model(s), as returned by
+                   resmodelutils.getResolutionParameters
+    acceptance  -- acceptance function (None for flat efficiency)
+    prototype   -- prototype data set with per event mistag(s) and decay time
+                   error (if the pdf depends on them)
+
+    returns a RooBDecayEnvelopeGenContext; use its generate(nevents) method
+    instead of pdf.generate(genvars, RooFit.ProtoData(prototype), ...)
+
+    The generator draws tagging decisions, final state charge and the true
+    decay time from an exponential envelope of the decay rate, smears the
+    decay time with the resolution model and applies the acceptance as
+    accept/reject weight, which is much faster than RooFit's generic
+    accept/reject generator for the full pdf. See the documentation of
+    RooBDecayEnvelopeGenContext for details.
+    """
+    from ROOT import RooArgList, RooConstVar, RooBDecayEnvelopeGenContext
+    tau = ws.function('%sTau' % Gamma.GetName())
+    coeffs = [ ws.function('%s_%s' % (name, c))
+            for c in ('cosh', 'sinh', 'cos', 'sin') ]
+    if None == tau or None in coeffs:
+        raise ValueError('No decay time pdf %s in workspace %s' % (name,
+            ws.GetName()))
+    sigmas, fractions = RooArgList(), RooArgList()
+    if None == resolution:
+        bias = WS(ws, RooConstVar('zero', 'zero', 0.))
+        scale = WS(ws, RooConstVar('one', 'one', 1.))
+    else:
+        for s in resolution[0]: sigmas.add(s)
+        for f in resolution[1]: fractions.add(f)
+        bias, scale = resolution[2], resolution[3]
+    return RooBDecayEnvelopeGenContext(pdf, genvars, time, tau, DeltaGamma,
+            DeltaM, coeffs[0], coeffs[1], coeffs[2], coeffs[3], sigmas,
+            fractions, bias, scale, acceptance, prototype)
@@ -0,0 +1,116 @@
+"""
+@file toypipeline.py
+
+@brief generate-and-fit toy pipeline without file round-trip
+
+Usually, toys are generated by one job (toyFactory.py writes
+GenToyWorkspace_*.root), and fitted by another job which reopens the file,
+reimports the data and rebuilds the fit model. ToyFitter instead keeps the
+fit model alive in the generating process: it is built once, each generated
+toy is handed to it in memory, and only the fit result and the pull row are
+written out.
+
+The fit model is described by a python file (in the same spirit as the
+configuration files) defining
+
+@code
+def getfitmodel(workspace, myconfigfile, debug):
+    ...
+    return { 'PDF': pdf,                # pdf to fit (inside workspace)
+             'FitOptions': [ ... ],     # optional RooCmdArgs for fitTo
+             'GenValues': { ... } }     # optional generated values for the
+                                        # pull tree (default: initial values)
+@endcode
+"""
+
+import ROOT
+
+def loadFitModel(fileName):
+    """
+    return the getfitmodel function defined in the python file fileName
+    """
+    import os, sys, imp
+    fileName = os.path.abspath(fileName)
+    name = os.path.splitext(os.path.basename(fileName))[0]
+    if os.path.dirname(fileName) not in sys.path:
+        sys.path.append(os.path.dirname(fileName))
+    module = imp.load_source(name, fileName)
+    if not hasattr(module, 'getfitmodel'):
+        raise AttributeError('%s does not define getfitmodel' % fileName)
+    return module.getfitmodel
+
+class ToyFitter(object):
+    """
+    fit generated toys in memory with a fit model that is built only once
+
+    Example:
+    @code
+    fitter = ToyFitter(loadFitModel('myFitModel.py'), myconfigfile)
+    for seed in seeds:
+        data = ... # generate toy
+        fitter.fitAndSave(data, 'FitResult_%d.root' % seed,
+                'PullTree_%d.root' % seed)
+    @endcode
+    """
+    def __init__(self, getfitmodel, myconfigfile, debug = False):
+        """
+        build the fit model
+
+        getfitmodel     -- function building the fit model (see module
+                           documentation)
+        myconfigfile    -- configuration dictionary passed to getfitmodel
+        debug           -- print debug information
+        """
+        from ROOT import RooWorkspace
+        self.debug = debug
+        self.workspace = RooWorkspace('fitWorkspace', 'fitWorkspace')
+        model = getfitmodel(self.workspace, myconfigfile, debug)
+        self.pdf = model['PDF']
+        self.fitOptions = list(model.get('FitOptions', []))
+        self.genValues = model.get('GenValues', None)
+        # all parameters are reset to their initial values before each fit,
+        # so toys fitted in the same process do not depend on each other
+        self.params = self.pdf.getParameters(ROOT.RooArgSet())
+        ROOT.SetOwnership(self.params, True)
+        self.initial = self.params.snapshot()
+        ROOT.SetOwnership(self.initial, True)
+
+    def fit(self, data):
+        """
+        fit a toy data set (used as is, no copy is made)
+
+        returns the RooFitResult
+        """
+        from ROOT import RooFit, RooLinkedList
+        self.params.assignValueOnly(self.initial)
+        it = self.initial.fwdIterator()
+        while True:
+            p = it.next()
+            if None == p: break
+            if p.InheritsFrom('RooRealVar'):
+                self.params.find(p.GetName()).setError(p.getError())
+        opts = RooLinkedList()
+        for o in [ RooFit.Save(True) ] + self.fitOptions:
+            opts.Add(o)
+        if not self.debug:
+            opts.Add(RooFit.PrintLevel(-1))
+        result = self.pdf.fitTo(data, opts)
+        ROOT.SetOwnership(result, True)
+        return result
+
+    def fitAndSave(self, data, fitResultFile, pullFile):
+        """
+        fit a toy data set, and write the fit result (RooFitResult, as
+        "fitresult") and the pull tree (see
+        FitResultGrabberUtils.CreatePullTree) to the given files
+
+        returns the RooFitResult
+        """
+        from B2DXFitters.FitResultGrabberUtils import CreatePullTree
+        result = self.fit(data)
+        result.Print('v')
+        f = ROOT.TFile.Open(fitResultFile, 'RECREATE')
+        f.WriteTObject(result, 'fitresult')
+        f.Close()
+        CreatePullTree(pullFile, result, self.genValues)
+        return result
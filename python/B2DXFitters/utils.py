@@ -64,7 +64,7 @@ def setConstantIfSoConfigured(config, obj, recache = None):
         # ignore everything else
         pass
 
-def randomiseParameters(config, obj, seed, debug, dict = {}):
+def randomiseParameters(config, obj, seed, debug, dict = None, rnd = None):
     """
     re-assign values to parameters taking them
     from a uniform distribution having boundaries equal to
@@ -92,25 +92,33 @@ def randomiseParameters(config, obj, seed, debug, dict = {}):
     seed -- the seed used for the random generation
     debug -- if true, print out some information
     dict -- the returned dictionary with parameter name and initial value
+    rnd -- random generator to use (normally not given: a TRandom3 seeded
+           with seed is created on the first call, and used for all
+           parameters, so their values are drawn independently)
+
+    To fit from several randomised starting points, see
+    multistart.multiStartFit.
     """
 
     from ROOT import RooAbsArg, RooRealVar, RooConstVar, RooArgSet, TRandom3
 
+    if None == dict:
+        dict = {}
+    if None == rnd:
+        rnd = TRandom3(seed)
     if obj.InheritsFrom(RooRealVar.Class()):
         if obj.isConstant():
             pass
-        r = TRandom3()
-        r.SetSeed(seed)
         for var in config['randomiseParams'].iterkeys():
             if var == obj.GetName() and var not in dict.keys():
                 dict[obj.GetName()] = {}
                 dict[obj.GetName()] = obj.getVal()
-                val = r.Uniform(config['randomiseParams'][var]['min'], config['randomiseParams'][var]['max'])
+                val = rnd.Uniform(config['randomiseParams'][var]['min'], config['randomiseParams'][var]['max'])
                 if debug:
                     print "B2DXFitters.utils.randomiseParameters(..) => Parameter "+obj.GetName()
                     print "...Initial guess "+str(obj.getVal())
                     print "...New guess "+str(val)
-                    obj.setVal( val )
+                obj.setVal( val )
                 break
     elif obj.InheritsFrom(RooConstVar.Class()):
         # ignore RooConstVar instances - these are constant anyway
@@ -128,10 +136,11 @@ def randomiseParameters(config, obj, seed, debug, dict = {}):
                 break
             else:
                 # randomise desired RooRealVar-derived objects
-                randomiseParameters(config, o, seed, debug, dict)
+                randomiseParameters(config, o, seed, debug, dict, rnd)
     else:
         # ignore everything else
         pass
+    return dict
 
 
 def printPDFTermsOnDataSet(dataset, terms = []):
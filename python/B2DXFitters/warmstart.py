@@ -0,0 +1,201 @@
+"""
+@file warmstart.py
+
+@brief persistent store of converged fit results to warm-start repeat fits
+
+Fits are often rerun with small changes (systematic variations, different
+Gaussian constraints, a parameter more or less floating) on the same data.
+WarmStartStore keeps the converged parameter values, errors and covariance
+matrix of each fit in an SQLite file, keyed by a fingerprint of the model
+(the names of its floating parameters) and of the data set (a hash of its
+contents). A new fit starts from the stored result of the same model on the
+same data if there is one, or else from the closest stored one (most
+floating parameters in common, same data preferred), so MIGRAD starts close
+to the minimum.
+
+RooFit's fitTo has no way to hand an initial covariance matrix to MINUIT;
+MINUIT's initial error matrix is built from the parameter errors, so the
+stored errors (the diagonal of the stored covariance matrix) are used as
+initial errors. The full covariance matrix is kept in the store (see
+WarmStartStore.lookup) for callers driving MINUIT directly.
+
+Example:
+@code
+store = WarmStartStore('warmstart.sqlite')
+store.warmStart(pdf, data)
+result = pdf.fitTo(data, RooFit.Save(True))
+store.record(pdf, data, result)
+@endcode
+"""
+
+import sqlite3, json
+
+def floatingParameters(pdf, data):
+    """ return sorted list of names of floating parameters of pdf """
+    import ROOT
+    params = pdf.getParameters(data)
+    ROOT.SetOwnership(params, True)
+    retVal = []
+    it = params.fwdIterator()
+    while True:
+        p = it.next()
+        if None == p: break
+        if p.InheritsFrom('RooRealVar') and not p.isConstant():
+            retVal.append(p.GetName())
+    return sorted(retVal)
+
+def modelFingerprint(names):
+    """ fingerprint of a model given the names of its floating parameters """
+    import hashlib
+    return hashlib.sha1('\n'.join(sorted(names))).hexdigest()
+
+def dataSetFingerprint(data):
+    """
+    fingerprint of the contents of a data set (variable names, values and
+    weights of all events, in order), computed in a single pass
+    """
+    import hashlib, numpy
+    from B2DXFitters.datasetio import dataSetToArrays
+    cols, weights = dataSetToArrays(data, withWeight = True)
+    h = hashlib.sha1('%d:' % data.numEntries())
+    for name in sorted(cols.iterkeys()):
+        h.update(name)
+        h.update(numpy.ascontiguousarray(cols[name]).tostring())
+    h.update(numpy.ascontiguousarray(weights).tostring())
+    return h.hexdigest()
+
+class WarmStartStore(object):
+    """
+    SQLite store of converged fit results (see module documentation)
+    """
+    def __init__(self, filename, debug = False):
+        """
+        open (or create) store
+
+        filename    -- name of SQLite file
+        debug       -- print debug information
+        """
+        self.debug = debug
+        self.db = sqlite3.connect(filename, timeout = 60.)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS fits (
+            model TEXT NOT NULL,
+            data TEXT NOT NULL,
+            names TEXT NOT NULL,
+            vals TEXT NOT NULL,
+            errs TEXT NOT NULL,
+            cov TEXT,
+            minNll REAL,
+            created REAL,
+            PRIMARY KEY (model, data))''')
+        self.db.commit()
+        # data set fingerprints are expensive: cache them per data set (the
+        # cache holds a reference, so the address cannot be reused)
+        self.dataKeys = {}
+
+    def dataKey(self, data):
+        """ return (cached) fingerprint of data """
+        import ROOT
+        addr = ROOT.AddressOf(data)[0]
+        cached = self.dataKeys.get(addr)
+        if None == cached or cached[1] != data.numEntries():
+            cached = (data, data.numEntries(), dataSetFingerprint(data))
+            self.dataKeys[addr] = cached
+        return cached[2]
+
+    def lookup(self, names, dataKey, minOverlap = 0.5):
+        """
+        find the stored result closest to a model on a data set
+
+        names       -- names of the floating parameters of the model
+        dataKey     -- data set fingerprint
+        minOverlap  -- minimum fraction of floating parameters the model and
+                       the stored result must have in common (number in
+                       common divided by number in either of them)
+
+        returns None, or a dictionary with entries 'names', 'values',
+        'errors' (lists, in the same order), 'covariance' (list of lists, or
+        None), 'minNll', 'exact' (same model and data) and 'overlap'
+        """
+        names = set(names)
+        best, bestRank = None, None
+        for row in self.db.execute('SELECT model, data, names, vals, errs, '
+                'cov, minNll, created FROM fits'):
+            stored = json.loads(row[2])
+            overlap = (float(len(names & set(stored))) /
+                    max(1, len(names | set(stored))))
+            if overlap < minOverlap: continue
+            rank = (row[1] == dataKey, overlap, row[7])
+            if None == bestRank or rank > bestRank:
+                best, bestRank = row, rank
+        if None == best: return None
+        return { 'names': [ str(n) for n in json.loads(best[2]) ],
+                'values': json.loads(best[3]),
+                'errors': json.loads(best[4]),
+                'covariance': None if None == best[5] else json.loads(best[5]),
+                'minNll': best[6],
+                'exact': best[0] == modelFingerprint(names) and
+                best[1] == dataKey, 'overlap': bestRank[1] }
+
+    def warmStart(self, pdf, data, minOverlap = 0.5):
+        """
+        set the floating parameters of pdf to the closest stored result for
+        fitting data (see lookup); parameters not in the stored result keep
+        their values
+
+        returns the stored result used (see lookup), or None
+        """
+        import ROOT
+        names = floatingParameters(pdf, data)
+        entry = self.lookup(names, self.dataKey(data), minOverlap)
+        if None == entry:
+            print 'WarmStartStore: no stored result, starting from scratch'
+            return None
+        params = pdf.getParameters(data)
+        ROOT.SetOwnership(params, True)
+        n = 0
+        for name, val, err in zip(entry['names'], entry['values'],
+                entry['errors']):
+            p = params.find(name)
+            if None == p or not p.InheritsFrom('RooRealVar') or p.isConstant():
+                continue
+            p.setVal(val)
+            if err > 0.: p.setError(err)
+            n += 1
+            if self.debug:
+                print 'WarmStartStore: %s = %g +/- %g' % (name, val, err)
+        print ('WarmStartStore: warm start of %d of %d floating parameters '
+                'from %s stored result (overlap %.2f)') % (n, len(names),
+                        'matching' if entry['exact'] else 'closest',
+                        entry['overlap'])
+        return entry
+
+    def record(self, pdf, data, result, requireConverged = True):
+        """
+        store the result of fitting pdf to data
+
+        result              -- RooFitResult
+        requireConverged    -- only store results with status 0
+
+        returns True if stored
+        """
+        import time
+        if requireConverged and 0 != result.status():
+            print 'WarmStartStore: fit did not converge, not stored'
+            return False
+        final = result.floatParsFinal()
+        names = [ final[i].GetName() for i in xrange(0, final.getSize()) ]
+        vals = [ final[i].getVal() for i in xrange(0, final.getSize()) ]
+        errs = [ final[i].getError() for i in xrange(0, final.getSize()) ]
+        cov = None
+        if result.covQual() >= 0 and final.getSize() > 0:
+            m = result.covarianceMatrix()
+            cov = [ [ m(i, j) for j in xrange(0, len(names)) ]
+                    for i in xrange(0, len(names)) ]
+        self.db.execute('INSERT OR REPLACE INTO fits (model, data, names, '
+                'vals, errs, cov, minNll, created) VALUES (?, ?, ?, ?, ?, ?, '
+                '?, ?)', (modelFingerprint(floatingParameters(pdf, data)),
+                    self.dataKey(data), json.dumps(names), json.dumps(vals),
+                    json.dumps(errs), None if None == cov else json.dumps(cov),
+                    result.minNll(), time.time()))
+        self.db.commit()
+        return True
@@ -16,20 +16,21 @@ export pyscriptpath=$7
 source /afs/cern.ch/lhcb/software/releases/LBSCRIPTS/prod/InstallArea/scripts/LbLogin.sh
 source `which SetupProject.sh` Urania v5r0
 
-while (( $seed < $stop )); do
-    
-    cd $pyscriptpath
+cd $pyscriptpath
+
+#Generate all toys in one job (PDFs are built only once)
+python ${pyscriptpath}toyFactory.py --configName $config --seeds ${seed}:${stop} --workfileOut GenToyWorkspace_${nickname}_%d.root --treefileOut GenToyTree_${nickname}_%d.root  --debug --outputdir $output >& ${output}log_${nickname}_${seed}_${stop}.txt
 
-    python ${pyscriptpath}toyFactory.py --configName $config --seed $seed --workfileOut GenToyWorkspace_${nickname}_${seed}.root --treefileOut GenToyTree_${nickname}_${seed}.root  --debug --outputdir $output >& ${output}log_${nickname}_${seed}.txt
+xrdcp -f ${output}log_${nickname}_${seed}_${stop}.txt root://eoslhcb.cern.ch/${eosoutput}log_${nickname}_${seed}_${stop}.txt
 
+while (( $seed < $stop )); do
+    
     xrdcp -f ${output}GenToyWorkspace_${nickname}_${seed}.root root://eoslhcb.cern.ch/${eosoutput}GenToyWorkspace_${nickname}_${seed}.root
     rm -f ${output}GenToyWorkspace_${nickname}_${seed}.root
 
     xrdcp -f ${output}GenToyTree_${nickname}_${seed}.root root://eoslhcb.cern.ch/${eosoutput}GenToyTree_${nickname}_${seed}.root
     rm -f ${output}GenToyTree_${nickname}_${seed}.root
 
-    xrdcp -f ${output}log_${nickname}_${seed}.txt root://eoslhcb.cern.ch/${eosoutput}log_${nickname}_${seed}.txt
-
     seed=$(($seed + 1))
 
 done
@@ -123,6 +123,7 @@ import os, sys, gc
 
 import array
 from array import array
+import numpy
 
 gROOT.SetBatch()
 
@@ -491,6 +492,218 @@ def ComputeNewDMass(branchDict, massDict, CharmChildrenUpdates, nBCand, configfi
                                                                                                                                                          - totPY*totPY
                                                                                                                                                          - totPZ*totPZ)
             
+#------------------------------------------------------------------------------
+# Columnar engine: the daughter momenta of a chunk of entries are read into
+# numpy arrays of shape (entries, candidates), the new masses are computed for
+# all candidates at once, and the updated branches are filled in bulk (only
+# the updated branches are filled; all others are copied by CloneTree)
+#------------------------------------------------------------------------------
+__columnarHelpers = None
+
+def ColumnarHelpers():
+    global __columnarHelpers
+    if None != __columnarHelpers: return __columnarHelpers
+    if not hasattr(gInterpreter, 'Declare'): return None
+    ok = gInterpreter.Declare("""
+    #include <string>
+    #include <vector>
+    #include "TTree.h"
+    #include "TLeaf.h"
+    namespace ChangeMassHypoColumnar {
+        // read leaves names[] of entries first to first + n - 1 into out
+        // (n x names.size() x maxcand), and the number of candidates per
+        // entry (from leaf index, 1 if index is empty) into ncand; returns
+        // the number of entries read
+        Long64_t read(TTree& tree, const std::vector<std::string>& names,
+                const char* index, Long64_t first, Long64_t n, int maxcand,
+                double* out, int* ncand)
+        {
+            const int nl = names.size();
+            std::vector<TLeaf*> leaves(nl, 0);
+            for (int l = 0; l < nl; ++l) {
+                leaves[l] = tree.GetLeaf(names[l].c_str());
+                if (!leaves[l]) return -1;
+            }
+            TLeaf* count = (index && *index) ? tree.GetLeaf(index) : 0;
+            for (Long64_t i = 0; i < n; ++i) {
+                if (tree.GetEntry(first + i) <= 0) return i;
+                int nc = count ? int(count->GetValue(0)) : 1;
+                if (nc > maxcand) nc = maxcand;
+                ncand[i] = nc;
+                double* row = out + i * nl * maxcand;
+                for (int l = 0; l < nl; ++l)
+                    for (int c = 0; c < nc; ++c)
+                        row[l * maxcand + c] = leaves[l]->GetValue(c);
+            }
+            return n;
+        }
+        // fill branches names[] (Float_t or Double_t leaves) with n entries
+        // from in (n x names.size() x maxcand), setting the count leaf
+        // index (if not empty) from ncand; returns the number of entries
+        // filled
+        Long64_t fill(TTree& tree, const std::vector<std::string>& names,
+                const char* index, Long64_t n, int maxcand, const double* in,
+                const int* ncand)
+        {
+            const int nb = names.size();
+            std::vector<TBranch*> branches(nb, 0);
+            std::vector<void*> buffers(nb, 0);
+            std::vector<bool> isfloat(nb, false);
+            for (int b = 0; b < nb; ++b) {
+                TLeaf* leaf = tree.GetLeaf(names[b].c_str());
+                if (!leaf) return -1;
+                const std::string type(leaf->GetTypeName());
+                if (type != "Float_t" && type != "Double_t") return -1;
+                isfloat[b] = ("Float_t" == type);
+                branches[b] = leaf->GetBranch();
+                buffers[b] = leaf->GetValuePointer();
+                if (!buffers[b]) return -1;
+            }
+            TLeaf* count = (index && *index) ? tree.GetLeaf(index) : 0;
+            Int_t* nptr = count ? (Int_t*) count->GetValuePointer() : 0;
+            for (Long64_t i = 0; i < n; ++i) {
+                if (nptr) *nptr = ncand[i];
+                const double* row = in + i * nb * maxcand;
+                for (int b = 0; b < nb; ++b) {
+                    const double* v = row + b * maxcand;
+                    if (isfloat[b]) {
+                        Float_t* buf = (Float_t*) buffers[b];
+                        for (int c = 0; c < ncand[i]; ++c) buf[c] = v[c];
+                    } else {
+                        Double_t* buf = (Double_t*) buffers[b];
+                        for (int c = 0; c < ncand[i]; ++c) buf[c] = v[c];
+                    }
+                    branches[b]->Fill();
+                }
+            }
+            return n;
+        }
+    }
+    """)
+    if not ok: return None
+    __columnarHelpers = ROOT.ChangeMassHypoColumnar
+    return __columnarHelpers
+
+#------------------------------------------------------------------------------
+def ColumnarNewMasses(momenta, massDict, CharmChildrenUpdates, configfile, constraintCharmMass):
+
+    #Compute new Beauty (and, if needed, Charm) masses for all candidates in
+    #a chunk at once; momenta maps particle name to (PX, PY, PZ) arrays
+
+    def energy(px, py, pz, mass):
+        return numpy.sqrt(px*px + py*py + pz*pz + mass*mass)
+
+    def invmass(E, px, py, pz):
+        return numpy.sqrt(E*E - px*px - py*py - pz*pz)
+
+    pedix = configfile["MassPedix"]+configfile["Pedix"]
+    shape = momenta.values()[0][0].shape
+    newMasses = {}
+
+    totPX = numpy.zeros(shape)
+    totPY = numpy.zeros(shape)
+    totPZ = numpy.zeros(shape)
+    totE = numpy.zeros(shape)
+    for bchild in configfile["BeautyChildrenPrefix"].iterkeys():
+        bname = configfile["BeautyChildrenPrefix"][bchild]["Name"]
+        if 'Bachelor' in bchild:
+            PX, PY, PZ = momenta[bname]
+            totE += energy(PX, PY, PZ, massDict[bname])
+        else:
+            PX = numpy.zeros(shape)
+            PY = numpy.zeros(shape)
+            PZ = numpy.zeros(shape)
+            E = numpy.zeros(shape)
+            for cchild in configfile[bchild+"ChildrenPrefix"].iterkeys():
+                cname = configfile[bchild+"ChildrenPrefix"][cchild]["Name"]
+                cPX, cPY, cPZ = momenta[cname]
+                PX += cPX
+                PY += cPY
+                PZ += cPZ
+                E += energy(cPX, cPY, cPZ, massDict[cname])
+            if bchild in CharmChildrenUpdates:
+                newMasses[bname+pedix] = invmass(E, PX, PY, PZ)
+            if constraintCharmMass:
+                totE += energy(PX, PY, PZ, massDict[bname])
+            else:
+                totE += E
+        totPX += PX
+        totPY += PY
+        totPZ += PZ
+    newMasses[configfile["BeautyPrefix"]["Name"]+pedix] = invmass(totE, totPX, totPY, totPZ)
+
+    return newMasses
+
+#------------------------------------------------------------------------------
+def FillColumnar(helpers, inputTree, outputTree, massDict, CharmChildrenUpdates,
+                 entries, maxBcand, chunkSize, configfile, constraintCharmMass, debug):
+
+    pedix = configfile["MassPedix"]+configfile["Pedix"]
+
+    if 'Index' in configfile["BeautyPrefix"].keys():
+        index = configfile["BeautyPrefix"]["Index"]
+        width = maxBcand
+    else:
+        index = ''
+        width = 1
+
+    #Particles whose momenta enter the new masses
+    particles = []
+    for bchild in configfile["BeautyChildrenPrefix"].iterkeys():
+        if 'Bachelor' in bchild:
+            particles.append(configfile["BeautyChildrenPrefix"][bchild]["Name"])
+        else:
+            for cchild in configfile[bchild+"ChildrenPrefix"].iterkeys():
+                particles.append(configfile[bchild+"ChildrenPrefix"][cchild]["Name"])
+    inNames = ROOT.std.vector('string')()
+    for name in particles:
+        for comp in ['_PX', '_PY', '_PZ']:
+            inNames.push_back(name+comp+configfile["Pedix"])
+
+    #Branches to be filled
+    outList = [configfile["BeautyPrefix"]["Name"]+pedix]
+    for bchild in CharmChildrenUpdates.iterkeys():
+        outList.append(configfile["BeautyChildrenPrefix"][bchild]["Name"]+pedix)
+    outNames = ROOT.std.vector('string')()
+    for name in outList:
+        outNames.push_back(name)
+
+    #Only read what is needed
+    inputTree.SetBranchStatus("*", 0)
+    for name in list(inNames) + ([index] if index != '' else []):
+        inputTree.SetBranchStatus(name, 1)
+
+    print "Looping over "+str(entries)+" entries in chunks of "+str(chunkSize)
+    first = 0
+    while first < entries:
+        n = min(chunkSize, entries - first)
+        if debug:
+            print "Processing entries "+str(first)+" to "+str(first+n-1)
+        buf = numpy.zeros((n, inNames.size(), width), dtype = numpy.float64)
+        ncand = numpy.zeros(n, dtype = numpy.int32)
+        nread = helpers.read(inputTree, inNames, index, first, n, width, buf, ncand)
+        if nread != n:
+            print "ERROR: unable to read entries "+str(first)+" to "+str(first+n-1)+" of input tree"
+            exit(-1)
+
+        momenta = {}
+        for i, name in enumerate(particles):
+            momenta[name] = (buf[:, 3*i, :], buf[:, 3*i+1, :], buf[:, 3*i+2, :])
+        olderr = numpy.seterr(invalid = 'ignore')
+        newMasses = ColumnarNewMasses(momenta, massDict, CharmChildrenUpdates, configfile, constraintCharmMass)
+        numpy.seterr(**olderr)
+        del momenta, buf
+
+        out = numpy.ascontiguousarray(numpy.concatenate([newMasses[name][:, numpy.newaxis, :]
+                                                         for name in outList], axis = 1))
+        nfilled = helpers.fill(outputTree, outNames, index, n, width, out, ncand)
+        if nfilled != n:
+            print "ERROR: unable to fill updated branches (only Float_t and Double_t are supported)"
+            exit(-1)
+        first += n
+
+    inputTree.SetBranchStatus("*", 1)
+
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
@@ -503,7 +716,9 @@ def ChangeMassHypo(debug,
                    outputtree,
                    maxBcand,
                    maxTreeEntries,
-                   constraintCharmMass):
+                   constraintCharmMass,
+                   chunkSize = 100000,
+                   perEvent = False):
 
     myconfigfilegrabber = __import__(configName,fromlist=['getconfig']).getconfig
     myconfigfile = myconfigfilegrabber()
@@ -654,9 +869,26 @@ def ChangeMassHypo(debug,
     print "========================================="
     print ""
         
+    helpers = None
+    if not perEvent:
+        helpers = ColumnarHelpers()
+        if None == helpers:
+            print "WARNING: unable to compile columnar helpers, falling back to per-event loop"
+
+    if None != helpers:
+        if constraintCharmMass:
+            print "Computing new Beauty mass constraining Charm(s) mass to its(their) PDG value(s)"
+        else:
+            print "Computing new Beauty mass"
+        if CharmChildrenUpdates != {}:
+            print "Updating Charm(s) invariant mass as well"
+        print ""
+        FillColumnar(helpers, inputTree, outputTree, massDict, CharmChildrenUpdates,
+                     entries, nBcand, int(chunkSize), myconfigfile, constraintCharmMass, debug)
+
     #Start loop over tree entries. The different cases are splitted. This is ugly, but it avoids
     #too many "if...else..." inside the loop itself which can slow down the process
-    if constraintCharmMass and CharmChildrenUpdates == {}:
+    elif constraintCharmMass and CharmChildrenUpdates == {}:
         print "Computing new Beauty mass constraining Charm(s) mass to its(their) PDG value(s)"
         print "No need to update Charm(s) invariant mass"
         print ""
@@ -821,6 +1053,17 @@ parser.add_option( '--constraintCharmMass',
                    default = False,
                    help = 'constraint Charm(s) mass(es) to its(their) PDG value(s)'
                    )
+parser.add_option( '--chunkSize',
+                   dest = 'chunkSize',
+                   default = '100000',
+                   help = 'number of entries processed at once by the columnar engine'
+                   )
+parser.add_option( '--perEvent',
+                   action = 'store_true',
+                   dest = 'perEvent',
+                   default = False,
+                   help = 'use the (slow) per-event loop instead of the columnar engine'
+                   )
 
 # -----------------------------------------------------------------------------
 if __name__ == '__main__' :
@@ -852,6 +1095,8 @@ if __name__ == '__main__' :
                    options.outputtree,
                    options.maxBcand,
                    options.maxTreeEntries,
-                   options.constraintCharmMass)
+                   options.constraintCharmMass,
+                   options.chunkSize,
+                   options.perEvent)
     
 # -----------------------------------------------------------------------------
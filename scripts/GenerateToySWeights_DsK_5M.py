@@ -119,6 +119,8 @@ import copy
 gROOT.SetBatch()
 
 from B2DXFitters import taggingutils, cpobservables
+from B2DXFitters.kfactorutils import KFactorSmearing
+from B2DXFitters.samplingutils import randomState
 RooAbsData.setDefaultStorageType(RooAbsData.Tree)
 RooAbsReal.defaultIntegratorConfig().setEpsAbs(1e-9)
 RooAbsReal.defaultIntegratorConfig().setEpsRel(1e-9)
@@ -278,6 +280,10 @@ def runBsDsKGenerator(  debug, single, configName, rangeDown, rangeUp,
             thishistrange = str(historange)+"_"+str(historange+myconfigfile["kFactorBinning"])
             kFactorHistos[decaymode][thishistrange] = copy.deepcopy(kFactorHistosFile.Get("kFactor_"+decaymode+"_"+thishistrange))
     kFactorHistosFile.Close()
+    kFactorSmearing = None
+    if genwithkfactors :
+        # Tabulate the kFactor distributions once for all toys
+        kFactorSmearing = KFactorSmearing(myconfigfile, kFactorHistos)
     # Define the observables we care about
     mVar         = 'lab0_MassFitConsD_M'
     mdVar        = 'lab2_MM'
@@ -1600,39 +1606,18 @@ def runBsDsKGenerator(  debug, single, configName, rangeDown, rangeUp,
                                             RooFit.Extended(),
                                             RooFit.NumEvents(evNum))
             if genwithkfactors :
-                # In this case, we need to clone the dataset
-                # and fill it with the smeared quantities
-                # Iterate over gendata and smear event-by-event
-                gendata_clone = gendata.emptyClone()
-                for thisentry in range(0,gendata.numEntries()) :
-                    thisArgSet          = gendata.get(thisentry)
-                    originallifetime    = thisArgSet.getRealValue("lab0_LifetimeFit_ctau")
-                    thistrueid          = str(int(round(thisArgSet.getRealValue("lab0_TRUEID"))))
-                    # Find if the mode needs a smearing or not
-                    for decaymode in myconfigfile["DecayModeParameters"] :
-                        if thistrueid == myconfigfile["DecayModeParameters"][decaymode]["TRUEID"] : break
-                    # First smear by the kFactors
-                    kfactor             = 1.
-                    if myconfigfile["DecayModeParameters"][decaymode]["KFACTOR"] :
-                        # Get the right mass bin
-                        thismass        = thisArgSet.getRealValue("lab0_MassFitConsD_M")
-                        for historange in kFactorHistos[decaymode] :
-                            if thismass > int(historange.split("_")[0]) and\
-                               thismass < int(historange.split("_")[1]) :
-                                break
-                        kfactor         = kFactorHistos[decaymode][historange].GetRandom()
-                    newlifetime         = originallifetime/kfactor
-                    # Now smear by the resolution
-                    smearing            = RooRandom.randomGenerator().Gaus(trm_mean.getVal(),\
-                                                                           trm_scale.getVal()*\
-                                                                           thisArgSet.getRealValue("lab0_LifetimeFit_ctauErr"))
-                    newlifetime         += smearing
-                    if (newlifetime < myconfigfile["timeRange"][0]) or (newlifetime > myconfigfile["timeRange"][1]) :
-                        --thisentry
-                        continue
-                    thisArgSet.setRealValue("lab0_LifetimeFit_ctau",newlifetime)
-                    gendata_clone.add(thisArgSet)
-                gendata = gendata_clone
+                # Smear by the kFactors (drawn for all events of a mode and
+                # mass bin at once) and by the resolution; this gives a new
+                # dataset without the events smeared out of the time range
+                gendata = kFactorSmearing.smear(gendata,
+                                                "lab0_LifetimeFit_ctau",
+                                                "lab0_LifetimeFit_ctauErr",
+                                                "lab0_TRUEID",
+                                                "lab0_MassFitConsD_M",
+                                                trm_mean.getVal(),
+                                                trm_scale.getVal(),
+                                                myconfigfile["timeRange"],
+                                                randomState())
             if debug : gendata.Print("v")
             gendata.SetName("dataSetBsDsK_both_"+str(nameDs[j]))
             tree = gendata.store().tree()
@@ -429,13 +429,75 @@ def matchMCName(MCNames,MCPIDUpName):
 
     return MCName
 
+# -----------------------------------------------------------------------------
+# Parallel ingestion of samples
+#
+# Each (year, polarity, D mode, hypothesis) sample is independent, so the
+# MassFitUtils.Obtain* calls can run in separate processes. Every worker
+# fills a fresh workspace and saves it to a temporary file; the files are
+# then merged into the output workspace in the order in which the samples
+# were listed, so the result does not depend on the number of workers.
+# -----------------------------------------------------------------------------
+# settings shared with the worker processes (inherited through fork)
+ingestContext = { }
+
+def obtainSample(kind, args, workspace):
+    ctx = ingestContext
+    dataTS, decay = ctx["dataTS"], ctx["decay"]
+    MDSettings, plotSettings = ctx["MDSettings"], ctx["plotSettings"]
+    debug, rookeypdf = ctx["debug"], ctx["rookeypdf"]
+    if kind == "Data":
+        return MassFitUtils.ObtainData(dataTS, TString(args[0]), MDSettings, decay,
+                                       plotSettings, workspace, debug)
+    elif kind == "MissForBsDsK":
+        return MassFitUtils.ObtainMissForBsDsK(dataTS, TString(args[0]), MDSettings,
+                                               TString(args[1]), workspace, plotSettings, rookeypdf, debug)
+    elif kind == "MissForBsDsPi":
+        return MassFitUtils.ObtainMissForBsDsPi(dataTS, TString(args[0]), TString("nonres"),
+                                                MDSettings, TString(args[1]), workspace, plotSettings, rookeypdf, debug)
+    elif kind == "SpecBack":
+        return MassFitUtils.ObtainSpecBack(dataTS, TString(args[0]), MDSettings, decay,
+                                           workspace, True, args[1], plotSettings, debug)
+    elif kind == "Signal":
+        return MassFitUtils.ObtainSignal(dataTS, TString(args[0]), MDSettings, decay, False, False,
+                                         workspace, False, 1.0, 1.0, plotSettings, debug)
+    raise ValueError("Unknown sample kind %s" % kind)
+
+def ingestOneSample(task):
+    kind, args, fileName = task
+    work = RooWorkspace("workspace","workspace")
+    work = obtainSample(kind, args, work)
+    GeneralUtils.SaveWorkspace(work, TString(fileName), ingestContext["debug"])
+    return fileName
+
+def ingestSamples(kind, argsList, workspace, nWorkers):
+    if nWorkers <= 1:
+        for args in argsList:
+            print args[0]
+            workspace = obtainSample(kind, args, workspace)
+        return workspace
+    import tempfile, shutil
+    from B2DXFitters.parallelutils import runInPool, mergeWorkspaceFile
+    tmpdir = tempfile.mkdtemp(prefix = "prepareWorkspace_")
+    try:
+        tasks = [ (kind, args, os.path.join(tmpdir, "sample_%04d.root" % i))
+                  for i, args in enumerate(argsList) ]
+        labels = [ "%s %s" % (kind, args[0]) for args in argsList ]
+        fileNames = runInPool(ingestOneSample, tasks, nWorkers, labels)
+        for fileName in fileNames:
+            mergeWorkspaceFile(workspace, fileName, "workspace", ingestContext["debug"])
+    finally:
+        shutil.rmtree(tmpdir, True)
+    return workspace
+
 # -----------------------------------------------------------------------------
 # Configuration settings
 # -----------------------------------------------------------------------------
 #------------------------------------------------------------------------------
 def prepareWorkspace( debug,
                       save, configName,
-                      Data, DataBkg, DataBkgPID, MC, MCPID, Signal, SignalPID, Comb, CombPID, rookeypdf, initial, workName ) : 
+                      Data, DataBkg, DataBkgPID, MC, MCPID, Signal, SignalPID, Comb, CombPID, rookeypdf, initial, workName,
+                      nWorkers = 1 ) : 
     
     # Get the configuration file
     myconfigfilegrabber = __import__(configName,fromlist=['getconfig']).getconfig
@@ -486,11 +548,12 @@ def prepareWorkspace( debug,
     dataTS  = TString(myconfigfile["dataName"])
     decay = TString(myconfigfile["Decay"])
 
+    ingestContext.update({ "dataTS": dataTS, "decay": decay, "MDSettings": MDSettings,
+                           "plotSettings": plotSettings, "debug": debug, "rookeypdf": rookeypdf })
+
     if Data:     
         dataNames = getDataNames ( myconfigfile ) 
-        for i in range(0,dataNames.__len__()):
-            print dataNames[i]
-            workspace = MassFitUtils.ObtainData(dataTS, dataNames[i],  MDSettings, decay, plotSettings, workspace, debug)
+        workspace = ingestSamples("Data", [ (n.Data(),) for n in dataNames ], workspace, nWorkers)
         
         
     GeneralUtils.SaveWorkspace(workspace,saveNameTS, debug)
@@ -503,13 +566,11 @@ def prepareWorkspace( debug,
     if DataBkg:
         dataBkgNames, decayBkg = getDataBkgNames( myconfigfile )
         if myconfigfile["Decay"] == "Bs2DsK":
-            for i in range(0,dataBkgNames.__len__()):
-                workspace = MassFitUtils.ObtainMissForBsDsK(TString(myconfigfile["dataName"]), dataBkgNames[i], MDSettings, 
-                                                            decayBkg, workspace, plotSettings, rookeypdf, debug)
+            workspace = ingestSamples("MissForBsDsK", [ (n.Data(), decayBkg.Data()) for n in dataBkgNames ],
+                                      workspace, nWorkers)
         elif myconfigfile["Decay"] == "Bs2DsPi":
-            for i in range(0,dataBkgNames.__len__()):
-                workspace = MassFitUtils.ObtainMissForBsDsPi(dataTS, dataBkgNames[i], TString("nonres"),
-                                                             MDSettings, decayBkg, workspace, plotSettings, rookeypdf, debug)
+            workspace = ingestSamples("MissForBsDsPi", [ (n.Data(), decayBkg.Data()) for n in dataBkgNames ],
+                                      workspace, nWorkers)
                 
                 
     GeneralUtils.SaveWorkspace(workspace,saveNameTS, debug)
@@ -531,12 +592,12 @@ def prepareWorkspace( debug,
     if MC:
         MCNames = getMCNames( myconfigfile )
         
+        MCArgs = [ ]
         for i in range(0,MCNames.__len__()):
-            print MCNames[i]
             year = GeneralUtils.CheckDataYear(MCNames[i],debug)
             pol = GeneralUtils.CheckPolarity(MCNames[i],debug)
-            workspace = MassFitUtils.ObtainSpecBack(TString(myconfigfile["dataName"]), TString(MCNames[i]),
-                                                    MDSettings, decay, workspace, True, MDSettings.GetLum(year,pol), plotSettings, debug)
+            MCArgs.append((MCNames[i].Data(), MDSettings.GetLum(year,pol)))
+        workspace = ingestSamples("SpecBack", MCArgs, workspace, nWorkers)
  
         GeneralUtils.SaveWorkspace(workspace,saveNameTS, debug)
         workspace.Print()
@@ -589,12 +650,7 @@ def prepareWorkspace( debug,
     if Signal:
         signalNames = getSignalNames(myconfigfile)
         
-        for i in range(0,signalNames.__len__()):
-            print signalNames[i]
-            year = GeneralUtils.CheckDataYear(signalNames[i])
-            workspace = MassFitUtils.ObtainSignal(TString(myconfigfile["dataName"]), signalNames[i],
-                                                  MDSettings, decay, False, False, workspace, False,
-                                                  1.0, 1.0, plotSettings, debug)
+        workspace = ingestSamples("Signal", [ (n.Data(),) for n in signalNames ], workspace, nWorkers)
 
         workspace.Print()
         GeneralUtils.SaveWorkspace(workspace,saveNameTS, debug)
@@ -765,6 +821,13 @@ parser.add_option( '--noRooKeysPdf','--nRKP',
                    help= 'don not obtain RooKeysPdf for samples'
                    )
 
+parser.add_option( '-j', '--nWorkers',
+                   dest = 'nWorkers',
+                   type = 'int',
+                   default = 1,
+                   help= 'number of worker processes used to obtain data, MC and signal samples in parallel'
+                   )
+
 
 # -----------------------------------------------------------------------------
 
@@ -794,6 +857,6 @@ if __name__ == '__main__' :
                        options.MC, options.MCPID,
                        options.Signal, options.SignalPID,
                        options.Comb, options.CombPID, options.rookeypdf,
-                       options.initial, options.workName)
+                       options.initial, options.workName, options.nWorkers)
     
 # -----------------------------------------------------------------------------
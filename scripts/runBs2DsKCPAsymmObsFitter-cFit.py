@@ -330,6 +330,10 @@ defaultConfig = {
     'Minimizer':                [ 'Minuit', 'migrad' ],
     'NumCPU':                   1,
     'ParameteriseIntegral':     True,
+    # warm-start store (SQLite file name): start from the closest stored
+    # converged fit, and store the result (see B2DXFitters.warmstart); not
+    # used for blinded fits to data (the store holds the unblinded values)
+    'WarmStartFile':            None,
     'Debug':                    False,
 
     # list of constant parameters
@@ -439,6 +443,12 @@ defaultConfig = {
             'qt':       'lab0_BsTaggingTool_TAGDECISION_OS',
             'weight':   'nSig_both_nonres_Evts_sw+nSig_both_phipi_Evts_sw+nSig_both_kstk_Evts_sw+nSig_both_kpipi_Evts_sw+nSig_both_pipipi_Evts_sw'
             },
+    # convert data set with numpy column operations instead of event loop
+    'DataSetColumnar': False,
+    # cache converted data sets in this directory (None: no caching)
+    'DataSetCacheDir': None,
+    'DataSetCacheMaxSize': 10 * 1024 * 1024 * 1024, # bytes
+    'DataSetCacheVerify': False, # check cache hits against fresh conversion
     # write data set to file name
     'WriteDataSetFileName': None,
     'WriteDataSetTreeName': 'data',
@@ -456,7 +466,8 @@ defaultConfig = {
 
 from B2DXFitters.WS import WS
 from B2DXFitters.utils import setConstantIfSoConfigured, printPDFTermsOnDataSet
-from B2DXFitters.datasetio import readDataSet, writeDataSet, readTemplate1D
+from B2DXFitters.datasetio import (readDataSet, writeDataSet, readTemplate1D,
+        sortDataSetByCategories)
 from B2DXFitters.acceptanceutils import buildSplineAcceptance
 from B2DXFitters.resmodelutils import getResolutionModel
 from B2DXFitters.timepdfutils import buildBDecayTimePdf
@@ -2324,8 +2335,25 @@ def getMasterPDF(config, name, debug = False):
             'weight': weight
             }
 
+def getCachedMasterPDF(config, name, debug = False, pdfCache = None):
+    # like getMasterPDF, but load the pdf from pdfCache (a
+    # B2DXFitters.pdfcache.PdfCache) if it was built before with the same
+    # configuration
+    if None == pdfCache:
+        return getMasterPDF(config, name, debug)
+    from B2DXFitters import cpobservables
+    # data set file names and the like do not change the pdf
+    key = pdfCache.key(config, name, [ __file__, cpobservables.__file__ ],
+            [ 'DataFileName', 'WriteDataSetFileName', 'WriteDataSetTreeName',
+                'QuitAfterGeneration' ])
+    pdf = pdfCache.load(key)
+    if None == pdf:
+        pdf = getMasterPDF(config, name, debug)
+        if None != pdf: pdfCache.store(key, pdf['ws'], pdf)
+    return pdf
+
 def runBsGammaFittercFit(generatorConfig, fitConfig, toy_num, debug, wsname,
-        initvars, calibplotfile = None) :
+        initvars, calibplotfile = None, pdfCache = None) :
     # tune integrator configuration
     from ROOT import RooAbsReal, TRandom3, RooArgSet, RooRandom, RooLinkedList
     RooAbsReal.defaultIntegratorConfig().setEpsAbs(1e-9)
@@ -2337,7 +2365,7 @@ def runBsGammaFittercFit(generatorConfig, fitConfig, toy_num, debug, wsname,
 
     # Instantiate and run the fitter in toy MC mode
     # (generate using the PDFs)
-    pdf = getMasterPDF(generatorConfig, 'GEN', debug)
+    pdf = getCachedMasterPDF(generatorConfig, 'GEN', debug, pdfCache)
 
     # seed the pseudo random number generator
     rndm = TRandom3(toy_num + 1)
@@ -2421,34 +2449,7 @@ def runBsGammaFittercFit(generatorConfig, fitConfig, toy_num, debug, wsname,
 
     # to speed things up during the fit, we sort events by qf and qt
     # this avoids "cache poisoning" by making pdf argument changes rarer
-    oldds = [ dataset ]
-    del dataset
-    # split according to category
-    for s in cats[0:3]:
-        newds = [ ]
-        # loop over datasets, split each in subsamples, one per category index
-        for ds in oldds:
-            it = s.typeIterator()
-            while True:
-                obj = it.Next()
-                if None == obj:
-                    break
-                newds.append(ds.reduce(
-                    RooFit.Cut('%s==%s' % (s.GetName(), obj.getVal()))))
-            del obj
-            del it
-            for ds in newds:
-                ROOT.SetOwnership(ds, True)
-        # split step for current category done
-        oldds = newds
-        del newds
-        gc.collect()
-        # now merge all datasets
-        while len(oldds) > 1:
-            oldds[0].append(oldds[1])
-            del oldds[1]
-    dataset = oldds[0]
-    del oldds
+    dataset = sortDataSetByCategories(dataset, cats[0:3], True)
 
     del cats
     del pdf
@@ -2504,7 +2505,18 @@ def runBsGammaFittercFit(generatorConfig, fitConfig, toy_num, debug, wsname,
     for o in fitOpts:
         fitopts.Add(o)
 
+    warmStart = None
+    if None != fitConfig['WarmStartFile']:
+        if not fitConfig['IsToy'] and fitConfig['Blinding']:
+            print 'WARNING: warm-start store not used for blinded fits to data'
+        else:
+            from B2DXFitters.warmstart import WarmStartStore
+            warmStart = WarmStartStore(fitConfig['WarmStartFile'], debug)
+            warmStart.warmStart(pdf['pdf'], dataset)
+
     fitResult = pdf['pdf'].fitTo(dataset, fitopts)
+    if None != warmStart:
+        warmStart.record(pdf['pdf'], dataset, fitResult)
 
     from B2DXFitters.FitResult import getDsHBlindFitResult
     print getDsHBlindFitResult(not fitConfig['IsToy'], fitConfig['Blinding'],
@@ -2724,6 +2736,13 @@ parser.add_option('--calibplotfile',
         action = 'store',
         help = 'file name for calibration plot'
         )
+parser.add_option('--pdfCacheDir',
+        dest = 'pdfCacheDir',
+        default = None,
+        type = 'string',
+        action = 'store',
+        help = 'load the generator pdf from (and store it in) a pdf cache in this directory (default: $B2DXFITTERS_PDFCACHE); without either, the pdf is always built from the config'
+        )
 
 # -----------------------------------------------------------------------------
 
@@ -2774,6 +2793,8 @@ if __name__ == '__main__' :
                     '[command line, generator config string]'))
     if '' == options.calibplotfile:
         options.calibplotfile = None
+    from B2DXFitters.pdfcache import openPdfCache
+    pdfCache = openPdfCache(options.pdfCacheDir, options.debug)
     
     runBsGammaFittercFit(
             generatorConfig,
@@ -2782,6 +2803,7 @@ if __name__ == '__main__' :
             options.debug,
             options.wsname,
             options.initvars,
-            options.calibplotfile)
+            options.calibplotfile,
+            pdfCache)
 
     # -----------------------------------------------------------------------------
@@ -149,7 +149,8 @@ def getTotalBkgPDF(myconfigfile, beautyMass, charmMass, workspace, workInt, merg
 #------------------------------------------------------------------------------
 def runMDFitter( debug, sample, mode, sweight,  
                  fileNameAll, fileNameToys, workName, sweightName,
-                 configName, wider, merge, dim, fileDataName, year, binned) :
+                 configName, wider, merge, dim, fileDataName, year, binned,
+                 warmStartFile = "", categoryWorkers = 0) :
 
     # Get the configuration file
     myconfigfilegrabber = __import__(configName,fromlist=['getconfig']).getconfig
@@ -449,9 +450,24 @@ def runMDFitter( debug, sample, mode, sweight,
     import sys
     import random
 
-    fitter.fit(True, RooFit.Extended(), RooFit.NumCPU(4)) #,  RooFit.Verbose(True)) #,  RooFit.ExternalConstraints(constList)) #, RooFit.InitialHesse(True))
+    # start from the closest stored converged fit (FitMeTool fits its own
+    # copies of the model and data)
+    warmStart = None
+    if warmStartFile != "":
+        from B2DXFitters.warmstart import WarmStartStore
+        warmStart = WarmStartStore(warmStartFile, debug)
+        warmStart.warmStart(fitter.getModelPDF(), fitter.getData())
+
+    if categoryWorkers > 1:
+        # NLL split by sample category, balanced over persistent workers
+        fitter.setCategoryParallelFit(categoryWorkers)
+        fitter.fit(True, RooFit.Extended())
+    else:
+        fitter.fit(True, RooFit.Extended(), RooFit.NumCPU(4)) #,  RooFit.Verbose(True)) #,  RooFit.ExternalConstraints(constList)) #, RooFit.InitialHesse(True))
     #fitter.setData(combData)
     result = fitter.getFitResult()
+    if None != warmStart:
+        warmStart.record(fitter.getModelPDF(), fitter.getData(), result)
     result.Print("v")
     floatpar = result.floatParsFinal()
     fitter.printTotalYields("*Evts")
@@ -591,6 +607,19 @@ parser.add_option( '--binned',
                    action = 'store_true',
                    help = 'binned data Set'
                    )
+parser.add_option( '--warmStart',
+                   dest = 'warmStart',
+                   default = "",
+                   help = 'warm-start store (SQLite file): start the fit from the closest stored '
+                   'converged fit, and store the result'
+                   )
+parser.add_option( '--categoryWorkers',
+                   dest = 'categoryWorkers',
+                   type = 'int',
+                   default = 0,
+                   help = 'split the NLL by sample category over this many worker processes, '
+                   'balanced by measured evaluation cost (instead of RooFit.NumCPU(4))'
+                   )
 
 # -----------------------------------------------------------------------------
 
@@ -615,6 +644,7 @@ if __name__ == '__main__' :
     runMDFitter( options.debug,  options.pol, options.mode, options.sweight, 
                  options.fileNameAll, options.fileNameToys, options.workName,
                  options.sweightName, configName, options.wider, 
-                 options.merge, options.dim, options.fileData, options.year, options.binned)
+                 options.merge, options.dim, options.fileData, options.year, options.binned,
+                 options.warmStart, options.categoryWorkers)
 
 # -----------------------------------------------------------------------------
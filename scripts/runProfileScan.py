@@ -0,0 +1,301 @@
+#!/bin/sh
+# -*- mode: python; coding: utf-8 -*-
+# vim: ft=python:sw=4:tw=78:expandtab
+# ---------------------------------------------------------------------------
+# @file runProfileScan.py
+#
+# @brief profile likelihood scan in one or two parameters of a fit model
+#        saved in a workspace, on a local process pool
+#
+# The parameters to scan are given as name:min:max:npoints (once or twice).
+# Grid points are fitted in parallel, each starting from its converged
+# neighbour, and the grid can be refined near the minimum (see
+# B2DXFitters.profilescan). The profile is saved as a columnar file (read it
+# with B2DXFitters.datasetio.readColumnarFile).
+#
+# Example:
+#   ./runProfileScan.py --fileName WS_Result.root --workName FitMeToolWS \
+#       --pdf time_signal --data dataSet_time_weighted \
+#       --scan lambda:0.:1.:21 --scan delta:0.:6.2832:41 \
+#       --nWorkers 8 --refine 2 --outputFile profile_lambda_delta.col
+#
+# ---------------------------------------------------------------------------
+# This file is used as both a shell script and as a Python script.
+""":"
+# This part is run by the shell. It does some setup which is convenient to save
+# work in common use cases.
+
+# make sure the environment is set up properly
+if test -n "$CMTCONFIG" \
+         -a -f $B2DXFITTERSROOT/$CMTCONFIG/libB2DXFittersDict.so \
+     -a -f $B2DXFITTERSROOT/$CMTCONFIG/libB2DXFittersLib.so; then
+    # all ok, software environment set up correctly, so don't need to do
+    # anything
+    true
+else
+    if test -n "$CMTCONFIG"; then
+    # clean up incomplete LHCb software environment so we can run
+    # standalone
+        echo Cleaning up incomplete LHCb software environment.
+        PYTHONPATH=`echo $PYTHONPATH | tr ':' '\n' | \
+            egrep -v "^($User_release_area|$MYSITEROOT/lhcb)" | \
+            tr '\n' ':' | sed -e 's/:$//'`
+        export PYTHONPATH
+        LD_LIBRARY_PATH=`echo $LD_LIBRARY_PATH | tr ':' '\n' | \
+            egrep -v "^($User_release_area|$MYSITEROOT/lhcb)" | \
+            tr '\n' ':' | sed -e 's/:$//'`
+        export LD_LIBRARY_PATH
+        exec env -u CMTCONFIG -u B2DXFITTERSROOT "$0" "$@"
+    fi
+    # automatic set up in standalone build mode
+    if test -z "$B2DXFITTERSROOT"; then
+        cwd="$(pwd)"
+        # try to find from where script is executed, use current directory as
+        # fallback
+        tmp="$(dirname $0)"
+        tmp=${tmp:-"$cwd"}
+        # convert to absolute path
+        tmp=`readlink -f "$tmp"`
+        # move up until standalone/setup.sh found, or root reached
+        while test \( \! -d "$tmp"/standalone \) -a -n "$tmp" -a "$tmp"\!="/"; do
+            tmp=`dirname "$tmp"`
+        done
+        if test -d "$tmp"/standalone; then
+            cd "$tmp"/standalone
+            . ./setup.sh
+        else
+            echo `basename $0`: Unable to locate standalone/setup.sh
+            exit 1
+        fi
+        cd "$cwd"
+        unset tmp
+        unset cwd
+    fi
+fi
+
+# figure out which custom allocators are available
+# prefer jemalloc over tcmalloc
+for i in libjemalloc libtcmalloc; do
+    for j in `echo "$LD_LIBRARY_PATH" | tr ':' ' '` \
+        /usr/local/lib /usr/lib /lib; do
+        for k in `find "$j" -name "$i"'*.so.?' | sort -r`; do
+            if test \! -e "$k"; then
+            continue
+        fi
+        echo adding $k to LD_PRELOAD
+        if test -z "$LD_PRELOAD"; then
+            export LD_PRELOAD="$k"
+            break 3
+        else
+            export LD_PRELOAD="$LD_PRELOAD":"$k"
+            break 3
+        fi
+    done
+    done
+done
+
+# set batch scheduling (if schedtool is available)
+schedtool="`which schedtool 2>/dev/zero`"
+if test -n "$schedtool" -a -x "$schedtool"; then
+    echo "enabling batch scheduling for this job (schedtool -B)"
+    schedtool="$schedtool -B -e"
+else
+    schedtool=""
+fi
+
+# set ulimit to protect against bugs which crash the machine: 3G vmem max,
+# no more then 8M stack
+ulimit -v $((3072 * 1024))
+ulimit -s $((   8 * 1024))
+
+# trampoline into python
+exec $schedtool /usr/bin/time -v env python -O "$0" - "$@"
+"""
+__doc__ = """ real docstring """
+# -----------------------------------------------------------------------------
+# Load necessary libraries
+# -----------------------------------------------------------------------------
+import B2DXFitters
+import ROOT
+from ROOT import RooFit
+from B2DXFitters.profilescan import profileScan, makeGrid
+
+from optparse import OptionParser
+import os, sys
+
+#-----------------------------------------------------------------------------
+def runProfileScan(fileName, workName, pdfName, dataName, scan, constParams,
+                   condObservables, nWorkers, refine, refineBelow, numCPU,
+                   outputFile, debug):
+
+    f = ROOT.TFile.Open(fileName)
+    if None == f or f.IsZombie():
+        print "ERROR: unable to open "+fileName
+        exit(-1)
+    ws = f.Get(workName)
+    if None == ws or not ws.InheritsFrom('RooWorkspace'):
+        print "ERROR: no workspace "+workName+" in "+fileName
+        exit(-1)
+    pdf = ws.pdf(pdfName)
+    data = ws.data(dataName)
+    if None == pdf or None == data:
+        print "ERROR: pdf "+pdfName+" or data "+dataName+" not found in workspace "+workName
+        exit(-1)
+
+    scanPars, grids = [], []
+    for s in scan:
+        name, lo, hi, n = s.split(':')
+        scanPars.append(name)
+        grids.append(makeGrid(float(lo), float(hi), int(n)))
+
+    params = pdf.getParameters(data)
+    ROOT.SetOwnership(params, True)
+    for name in constParams:
+        p = params.find(name)
+        if None == p:
+            print "ERROR: no parameter "+name
+            exit(-1)
+        p.setConstant(True)
+
+    # conditional observables (e.g. per-event decay time error or mistag
+    # without a pdf of their own): given explicitly, or the set stored in the
+    # workspace by the fitter (as the cFit script does)
+    condObs = ROOT.RooArgSet()
+    if None != condObservables:
+        obs = data.get()
+        for name in condObservables:
+            o = obs.find(name)
+            if None == o:
+                print "ERROR: no observable "+name+" in data "+dataName
+                exit(-1)
+            condObs.add(o)
+    elif None != ws.set('condobservables'):
+        condObs.add(ws.set('condobservables'))
+
+    fitOpts = [ RooFit.Strategy(2), RooFit.Offset(True) ]
+    if condObs.getSize() > 0:
+        print "Conditional observables: "+", ".join(
+            condObs[i].GetName() for i in xrange(0, condObs.getSize()))
+        fitOpts.append(RooFit.ConditionalObservables(condObs))
+    if numCPU > 1:
+        fitOpts.append(RooFit.NumCPU(numCPU))
+    if not debug:
+        fitOpts.append(RooFit.PrintLevel(-1))
+    if data.isWeighted():
+        fitOpts.append(RooFit.SumW2Error(True))
+
+    print "=========================================================="
+    print "Profile likelihood scan of "+", ".join(scanPars)+" with "+str(nWorkers)+" workers"
+    print "=========================================================="
+    profile = profileScan(pdf, data, scanPars, grids, fitOpts, nWorkers,
+                          refine, refineBelow, outputFile, debug)
+
+    print "=========================================================="
+    print " ".join("%12s" % s for s in scanPars + [ "deltaNll", "status", "level" ])
+    for i in xrange(0, len(profile["minNll"])):
+        print " ".join([ "%12.6g" % profile[s][i] for s in scanPars ] +
+                       [ "%12.4f" % profile["deltaNll"][i], "%12d" % profile["status"][i],
+                         "%12d" % profile["level"][i] ])
+    print "=========================================================="
+    print "Profile saved to "+outputFile
+
+#-----------------------------------------------------------------------------
+_usage = '%prog [options]'
+
+parser = OptionParser( _usage )
+
+parser.add_option( '--fileName',
+                   dest = 'fileName',
+                   default = 'WS_Result.root',
+                   help = 'ROOT file with the workspace holding the fit model and data'
+                   )
+parser.add_option( '--workName',
+                   dest = 'workName',
+                   default = 'FitMeToolWS',
+                   help = 'name of the workspace'
+                   )
+parser.add_option( '--pdf',
+                   dest = 'pdf',
+                   default = 'time_signal',
+                   help = 'name of the model pdf in the workspace'
+                   )
+parser.add_option( '--data',
+                   dest = 'data',
+                   default = 'dataSet_time_weighted',
+                   help = 'name of the data set in the workspace'
+                   )
+parser.add_option( '--scan',
+                   dest = 'scan',
+                   action = 'append',
+                   default = [],
+                   help = 'parameter to scan as name:min:max:npoints (give once or twice)'
+                   )
+parser.add_option( '--constParams',
+                   dest = 'constParams',
+                   default = '',
+                   help = 'comma separated list of parameters to fix in all fits'
+                   )
+parser.add_option( '--condObservables',
+                   dest = 'condObservables',
+                   default = None,
+                   help = 'comma separated list of conditional observables; '
+                   'default is the set "condobservables" in the workspace, if any'
+                   )
+parser.add_option( '--nWorkers',
+                   dest = 'nWorkers',
+                   type = 'int',
+                   default = 1,
+                   help = 'number of fits to run in parallel'
+                   )
+parser.add_option( '--refine',
+                   dest = 'refine',
+                   type = 'int',
+                   default = 0,
+                   help = 'number of grid refinement steps near the minimum'
+                   )
+parser.add_option( '--refineBelow',
+                   dest = 'refineBelow',
+                   type = 'float',
+                   default = 2.,
+                   help = 'refine around points with a NLL less than this above the minimum'
+                   )
+parser.add_option( '--numCPU',
+                   dest = 'numCPU',
+                   type = 'int',
+                   default = 1,
+                   help = 'number of processes for each fit (RooFit.NumCPU)'
+                   )
+parser.add_option( '--outputFile',
+                   dest = 'outputFile',
+                   default = 'profile.col',
+                   help = 'columnar file to save the profile to'
+                   )
+parser.add_option( '-d', '--debug',
+                   action = 'store_true',
+                   dest = 'debug',
+                   default = False,
+                   help = 'print debug information'
+                   )
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__' :
+    ( options, args ) = parser.parse_args()
+
+    if len( args ) > 0 or len( options.scan ) not in (1, 2) :
+        parser.print_help()
+        exit( -1 )
+
+    runProfileScan(options.fileName,
+                   options.workName,
+                   options.pdf,
+                   options.data,
+                   options.scan,
+                   [ p for p in options.constParams.split(',') if p != '' ],
+                   None if None == options.condObservables else
+                   [ o for o in options.condObservables.split(',') if o != '' ],
+                   options.nWorkers,
+                   options.refine,
+                   options.refineBelow,
+                   options.numCPU,
+                   options.outputFile,
+                   options.debug)
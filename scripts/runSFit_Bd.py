@@ -120,6 +120,8 @@ from B2DXFitters.timepdfutils_Bd import buildBDecayTimePdf
 from B2DXFitters.resmodelutils import getResolutionModel
 from B2DXFitters.acceptanceutils import buildSplineAcceptance
 from B2DXFitters.WS import WS as WS
+from B2DXFitters.multistart import multiStartFit
+from B2DXFitters.warmstart import WarmStartStore
 
 gROOT.SetBatch()
 
@@ -132,6 +134,30 @@ def setConstantIfSoConfigured(var,myconfigfile) :
         print "[INFO] Parameter: %s floats in the fit" %(var.GetName())
         print "[INFO]   ",var.Print()
 
+#------------------------------------------------------------------------------
+def fitPDF(pdf, data, fitOpts, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart = None):
+    # fit once, or from multiStart starting points drawn from the
+    # "randomiseParams" config entry (keeping the best fit, see
+    # B2DXFitters.multistart); with a warm-start store, start from the
+    # closest stored result, and store the result if the fit converged
+    if None != warmStart:
+        warmStart.warmStart(pdf, data)
+    if multiStart <= 0:
+        opts = RooLinkedList()
+        for cmd in fitOpts:
+            opts.Add(cmd)
+        result = pdf.fitTo(data, opts)
+    else:
+        print "[INFO] Multi-start fit: "+str(multiStart)+" starting points, "+str(nWorkers)+" parallel fits"
+        if "randomiseParams" not in myconfigfile.keys():
+            print "ERROR: multi-start fit needs the randomiseParams entry in the config file"
+            exit(-1)
+        result, summary = multiStartFit(pdf, data, myconfigfile, multiStart, int(seed), fitOpts, nWorkers,
+                                        fileName = outputdir+"sFit_MultiStart.root", debug = debug)
+    if None != warmStart and None != result:
+        warmStart.record(pdf, data, result)
+    return result
+
 # ------------------------------------------------------------------------------
 def getCPparameters(ws, myconfigfile, UniformBlinding):
 
@@ -210,7 +236,8 @@ def runSFit(debug, wsname,
             configName, scan,
             binned, plotsWeights, noweight,
             sample, mode, year, hypo, merge, unblind, randomise, superimpose,
-            seed, preselection, UniformBlinding, extended, fitresultFileName):
+            seed, preselection, UniformBlinding, extended, fitresultFileName,
+            multiStart = 0, nWorkers = 1, warmStartFile = ""):
 
     if MC and not noweight:
         print "ERROR: cannot use sWeighted MC sample (for now)"
@@ -220,6 +247,11 @@ def runSFit(debug, wsname,
     myconfigfilegrabber = __import__(configName,fromlist=['getconfig']).getconfig
     myconfigfile = myconfigfilegrabber()
 
+    warmStart = None
+    if warmStartFile != "":
+        print "[INFO] Warm-start store: "+warmStartFile
+        warmStart = WarmStartStore(warmStartFile, debug)
+
     #Modify config dict such that buildBDecayTimePdf can understand it
     myconfigfile["Context"] = "FIT"
     myconfigfile["Debug"] = True if debug else False
@@ -879,18 +911,18 @@ def runSFit(debug, wsname,
                 print "[INFO] Fitting binned dataset"
                 if not noweight:
                     print "[INFO] Fitting weighted dataset"
-                    myfitresult = totPDF.fitTo(dataWA_binned, fitOpts)
+                    myfitresult = fitPDF(totPDF, dataWA_binned, fitOpts_temp, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart)
                 else:
                     print "[INFO] Fitting unweighted dataset"
-                    myfitresult = totPDF.fitTo(data_binned, fitOpts)
+                    myfitresult = fitPDF(totPDF, data_binned, fitOpts_temp, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart)
             else:
                 print "[INFO] Fitting unbinned dataset"
                 if not noweight:
                     print "[INFO] Fitting weighted dataset"
-                    myfitresult = totPDF.fitTo(dataWA, fitOpts)
+                    myfitresult = fitPDF(totPDF, dataWA, fitOpts_temp, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart)
                 else:
                     print "[INFO] Fitting unweighted dataset"
-                    myfitresult = totPDF.fitTo(data, fitOpts)
+                    myfitresult = fitPDF(totPDF, data, fitOpts_temp, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart)
             myfitresult.Print("v")
             myfitresult.correlationMatrix().Print()
             myfitresult.covarianceMatrix().Print()
@@ -925,18 +957,18 @@ def runSFit(debug, wsname,
                 print "[INFO] Fitting binned dataset"
                 if not noweight:
                     print "[INFO] Fitting weighted dataset"
-                    myfitresult = totPDF.fitTo(dataWA_binned, fitOpts)
+                    myfitresult = fitPDF(totPDF, dataWA_binned, fitOpts_temp, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart)
                 else:
                     print "[INFO] Fitting unweighted dataset"
-                    myfitresult = totPDF.fitTo(data_binned, fitOpts)
+                    myfitresult = fitPDF(totPDF, data_binned, fitOpts_temp, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart)
             else:
                 print "[INFO] Fitting unbinned dataset"
                 if not noweight:
                     print "[INFO] Fitting weighted dataset"
-                    myfitresult = totPDF.fitTo(dataWA, fitOpts)
+                    myfitresult = fitPDF(totPDF, dataWA, fitOpts_temp, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart)
                 else:
                     print "[INFO] Fitting unweighted dataset"
-                    myfitresult = totPDF.fitTo(data, fitOpts)
+                    myfitresult = fitPDF(totPDF, data, fitOpts_temp, myconfigfile, multiStart, seed, nWorkers, outputdir, debug, warmStart)
 
             print '[INFO Result] Matrix quality is', myfitresult.covQual()
             par = myfitresult.floatParsFinal()
@@ -1164,6 +1196,25 @@ parser.add_option( '--seed',
                    default = 4534209875,
                    help = 'seed for initial parameter randomisation'
                    )
+parser.add_option( '--multiStart',
+                   dest = 'multiStart',
+                   type = 'int',
+                   default = 0,
+                   help = 'fit from this many starting points (the nominal one, and others drawn '
+                   'from the randomiseParams config entry with --seed) and keep the best fit'
+                   )
+parser.add_option( '--nWorkers',
+                   dest = 'nWorkers',
+                   type = 'int',
+                   default = 1,
+                   help = 'number of multi-start fits to run in parallel'
+                   )
+parser.add_option( '--warmStart',
+                   dest = 'warmStart',
+                   default = "",
+                   help = 'warm-start store (SQLite file): start the fit from the closest stored '
+                   'converged fit, and store the result'
+                   )
 parser.add_option( '--year',
                    dest = 'year',
                    default = "",
@@ -1250,6 +1301,9 @@ if __name__ == '__main__' :
              options.preselection,
              options.UniformBlinding,
              options.extended,
-             options.fileNameFitresult)
+             options.fileNameFitresult,
+             options.multiStart,
+             options.nWorkers,
+             options.warmStart)
 
 # -----------------------------------------------------------------------------
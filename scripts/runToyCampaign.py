@@ -0,0 +1,228 @@
+#!/bin/sh
+# -*- mode: python; coding: utf-8 -*-
+# vim: ft=python:sw=4:tw=78:expandtab
+# ---------------------------------------------------------------------------
+# @file runToyCampaign.py
+#
+# @brief run a toy campaign (generate -> fit -> pull extraction) on a local
+#        process pool
+#
+# Each seed is one job running the stages (shell commands) given in the
+# campaign configuration file one after the other. The state of all jobs is
+# kept in an SQLite database (see B2DXFitters.campaignutils), so the same
+# command can be run again to resume an interrupted campaign: completed
+# seeds are skipped and failed ones are retried, with the tail of their log
+# stored in the database. Pull rows are collected into the database as soon
+# as each toy is fitted; --exportPulls writes them into a single pull tree.
+#
+# Example:
+#   ./runToyCampaign.py --configName ../data/toyCampaignConfig.py --nWorkers 8
+#   ./runToyCampaign.py --configName ../data/toyCampaignConfig.py --status
+#   ./runToyCampaign.py --configName ../data/toyCampaignConfig.py \
+#       --exportPulls PullTree.root
+#
+# ---------------------------------------------------------------------------
+# This file is used as both a shell script and as a Python script.
+""":"
+# This part is run by the shell. It does some setup which is convenient to save
+# work in common use cases.
+
+# make sure the environment is set up properly
+if test -n "$CMTCONFIG" \
+         -a -f $B2DXFITTERSROOT/$CMTCONFIG/libB2DXFittersDict.so \
+     -a -f $B2DXFITTERSROOT/$CMTCONFIG/libB2DXFittersLib.so; then
+    # all ok, software environment set up correctly, so don't need to do
+    # anything
+    true
+else
+    if test -n "$CMTCONFIG"; then
+    # clean up incomplete LHCb software environment so we can run
+    # standalone
+        echo Cleaning up incomplete LHCb software environment.
+        PYTHONPATH=`echo $PYTHONPATH | tr ':' '\n' | \
+            egrep -v "^($User_release_area|$MYSITEROOT/lhcb)" | \
+            tr '\n' ':' | sed -e 's/:$//'`
+        export PYTHONPATH
+        LD_LIBRARY_PATH=`echo $LD_LIBRARY_PATH | tr ':' '\n' | \
+            egrep -v "^($User_release_area|$MYSITEROOT/lhcb)" | \
+            tr '\n' ':' | sed -e 's/:$//'`
+        export LD_LIBRARY_PATH
+        exec env -u CMTCONFIG -u B2DXFITTERSROOT "$0" "$@"
+    fi
+    # automatic set up in standalone build mode
+    if test -z "$B2DXFITTERSROOT"; then
+        cwd="$(pwd)"
+        # try to find from where script is executed, use current directory as
+        # fallback
+        tmp="$(dirname $0)"
+        tmp=${tmp:-"$cwd"}
+        # convert to absolute path
+        tmp=`readlink -f "$tmp"`
+        # move up until standalone/setup.sh found, or root reached
+        while test \( \! -d "$tmp"/standalone \) -a -n "$tmp" -a "$tmp"\!="/"; do
+            tmp=`dirname "$tmp"`
+        done
+        if test -d "$tmp"/standalone; then
+            cd "$tmp"/standalone
+            . ./setup.sh
+        else
+            echo `basename $0`: Unable to locate standalone/setup.sh
+            exit 1
+        fi
+        cd "$cwd"
+        unset tmp
+        unset cwd
+    fi
+fi
+
+# figure out which custom allocators are available
+# prefer jemalloc over tcmalloc
+for i in libjemalloc libtcmalloc; do
+    for j in `echo "$LD_LIBRARY_PATH" | tr ':' ' '` \
+        /usr/local/lib /usr/lib /lib; do
+        for k in `find "$j" -name "$i"'*.so.?' | sort -r`; do
+            if test \! -e "$k"; then
+            continue
+        fi
+        echo adding $k to LD_PRELOAD
+        if test -z "$LD_PRELOAD"; then
+            export LD_PRELOAD="$k"
+            break 3
+        else
+            export LD_PRELOAD="$LD_PRELOAD":"$k"
+            break 3
+        fi
+    done
+    done
+done
+
+# set batch scheduling (if schedtool is available)
+schedtool="`which schedtool 2>/dev/zero`"
+if test -n "$schedtool" -a -x "$schedtool"; then
+    echo "enabling batch scheduling for this job (schedtool -B)"
+    schedtool="$schedtool -B -e"
+else
+    schedtool=""
+fi
+
+# set ulimit to protect against bugs which crash the machine: 3G vmem max,
+# no more then 8M stack
+ulimit -v $((3072 * 1024))
+ulimit -s $((   8 * 1024))
+
+# trampoline into python
+exec $schedtool /usr/bin/time -v env python -O "$0" - "$@"
+"""
+__doc__ = """ real docstring """
+# -----------------------------------------------------------------------------
+# Load necessary libraries
+# -----------------------------------------------------------------------------
+import B2DXFitters
+import ROOT
+from B2DXFitters.campaignutils import JobDatabase, Campaign, exportPulls
+
+from optparse import OptionParser
+import os, sys
+
+#-----------------------------------------------------------------------------
+def runToyCampaign(configName, database, nWorkers, maxAttempts, minFreeMemory,
+                   status, pullFile):
+
+    # Get the configuration file
+    myconfigfilegrabber = __import__(configName,fromlist=['getconfig']).getconfig
+    myconfigfile = myconfigfilegrabber()
+
+    if None == database:
+        database = os.path.join(myconfigfile["WorkDir"], "campaign.sqlite")
+    campaign = Campaign(myconfigfile, JobDatabase(database))
+
+    if not status and None == pullFile:
+        print "=========================================================="
+        print "Running toy campaign with "+str(nWorkers)+" workers"
+        print "Job database: "+database
+        print "=========================================================="
+        campaign.run(nWorkers, maxAttempts, minFreeMemory)
+
+    if None != pullFile:
+        n = exportPulls(campaign.db, pullFile, myconfigfile.get("PullTree", "PullTree"))
+        print "Wrote "+str(n)+" pull rows to "+pullFile
+
+    print "=========================================================="
+    print "Campaign status:"
+    for state, n in sorted(campaign.db.summary().items()):
+        print "%10s: %d" % (state, n)
+    for seed, attempts, stage, log in campaign.db.failures():
+        print "----------------------------------------------------------"
+        print "Seed %d failed (%d attempts, stage %s), end of log:" % (seed, attempts, stage)
+        print log
+    print "=========================================================="
+
+#-----------------------------------------------------------------------------
+_usage = '%prog [options]'
+
+parser = OptionParser( _usage )
+
+parser.add_option( '--configName',
+                   dest = 'configName',
+                   default = 'MyConfigFile',
+                   help = 'campaign configuration file name'
+                   )
+parser.add_option( '--database',
+                   dest = 'database',
+                   default = None,
+                   help = 'SQLite job database (default: campaign.sqlite in the work directory)'
+                   )
+parser.add_option( '--nWorkers',
+                   dest = 'nWorkers',
+                   type = 'int',
+                   default = 1,
+                   help = 'number of jobs to run at the same time'
+                   )
+parser.add_option( '--maxAttempts',
+                   dest = 'maxAttempts',
+                   type = 'int',
+                   default = 3,
+                   help = 'maximum number of attempts per seed'
+                   )
+parser.add_option( '--minFreeMemory',
+                   dest = 'minFreeMemory',
+                   type = 'float',
+                   default = None,
+                   help = 'do not start new jobs while less than this many MB of memory are available'
+                   )
+parser.add_option( '--status',
+                   action = 'store_true',
+                   dest = 'status',
+                   default = False,
+                   help = 'only print the campaign status (and failed jobs)'
+                   )
+parser.add_option( '--exportPulls',
+                   dest = 'exportPulls',
+                   default = None,
+                   help = 'write all pull rows collected so far into this file (and do not run jobs)'
+                   )
+
+#-----------------------------------------------------------------------------
+if __name__ == '__main__' :
+    ( options, args ) = parser.parse_args()
+
+    if len( args ) > 0 :
+        parser.print_help()
+        exit( -1 )
+
+    config = options.configName
+    last = config.rfind("/")
+    directory = config[:last+1]
+    configName = config[last+1:]
+    p = configName.rfind(".")
+    configName = configName[:p]
+
+    sys.path.append(directory)
+
+    runToyCampaign(configName,
+                   options.database,
+                   options.nWorkers,
+                   options.maxAttempts,
+                   options.minFreeMemory,
+                   options.status,
+                   options.exportPulls)
@@ -124,6 +124,11 @@ from B2DXFitters import acceptanceutils
 from B2DXFitters import resmodelutils
 from B2DXFitters import timepdfutils_Bd
 from B2DXFitters import cpobservables
+from B2DXFitters.datasetio import writeColumnarFile, fillDataSetFromArrays
+from B2DXFitters.samplingutils import InverseCDFSampler, randomState
+from B2DXFitters.rngutils import substream, seedGlobalGenerators
+from B2DXFitters.toypipeline import ToyFitter, loadFitModel
+from B2DXFitters.pdfcache import openPdfCache
 
 from optparse import OptionParser
 from math     import pi, log
@@ -219,6 +224,65 @@ def BuildTagging(workspaceIn, myconfigfile, obsDict, debug):
 
     return tagDict
 
+#------------------------------------------------------------
+def UseInverseCDFSampler(myconfigfile):
+
+    #Draw proto data by inverse-CDF lookup in tabulated templates instead of
+    #RooAbsPdf.generate (opt-in, since the drawn values differ)
+    return "ProtoDataSampler" in myconfigfile.keys() and myconfigfile["ProtoDataSampler"] == "InverseCDF"
+
+#------------------------------------------------------------
+def ProtoDataSamplerBins(myconfigfile, ndim):
+
+    #Number of table cells per observable (None for the default)
+    if "ProtoDataSamplerBins" in myconfigfile.keys():
+        return myconfigfile["ProtoDataSamplerBins"][ndim-1]
+    return None
+
+#------------------------------------------------------------
+def BuildProtoDataSamplers(myconfigfile, obsDict, tagDict, resAccDict, debug):
+
+    #Tabulate mistag and time error pdfs for fast proto data sampling (these
+    #are python objects, so they are not part of the cached generator)
+    for comp in myconfigfile["Components"].iterkeys():
+        tagDict[comp]["MistagSampler"] = None
+        if UseInverseCDFSampler(myconfigfile) and tagDict[comp]["MistagPDF"] != None:
+            tagDict[comp]["MistagSampler"] = BuildMistagSamplers(myconfigfile, comp, obsDict, tagDict[comp]["MistagPDF"], debug)
+
+        resAccDict[comp]["TimeErrorSampler"] = None
+        if UseInverseCDFSampler(myconfigfile) and resAccDict[comp]["TimeErrorPDF"] != None:
+            if debug:
+                print "Tabulate inverse CDF of "+resAccDict[comp]["TimeErrorPDF"].GetName()
+            resAccDict[comp]["TimeErrorSampler"] = InverseCDFSampler(resAccDict[comp]["TimeErrorPDF"],
+                                                                     [ obsDict["BeautyTimeErr"] ],
+                                                                     ProtoDataSamplerBins(myconfigfile, 1))
+
+#------------------------------------------------------------
+def BuildMistagSamplers(myconfigfile, comp, obsDict, mistagPDFs, debug):
+
+    #Tabulate the mistag pdf(s) of one component once; taggers sharing the
+    #same (two-dimensional, e.g. correlated OS/SS) template are sampled jointly.
+    #Returns list of samplers, each covering one or more mistag observables
+    samplers = []
+    pdfs = []
+    observables = []
+    tag = 0
+    for tagger in myconfigfile["Taggers"][comp].iterkeys():
+        if "Mistag"+tagger in obsDict.keys() and "TagDec"+tagger in obsDict.keys():
+            pdf = mistagPDFs[tag]
+            names = [ p.GetName() for p in pdfs ]
+            if pdf.GetName() in names:
+                observables[names.index(pdf.GetName())].append( obsDict["Mistag"+tagger] )
+            else:
+                pdfs.append( pdf )
+                observables.append( [ obsDict["Mistag"+tagger] ] )
+            tag = tag+1
+    for pdf, obs in zip(pdfs, observables):
+        if debug:
+            print "Tabulate inverse CDF of "+pdf.GetName()+" in "+", ".join([ o.GetName() for o in obs ])
+        samplers.append( InverseCDFSampler(pdf, obs, ProtoDataSamplerBins(myconfigfile, len(obs))) )
+    return samplers
+
 #------------------------------------------------------------
 def BuildMistagPDF(workspaceIn, myconfigfile, tagger, comp, obsDict, debug):
 
@@ -492,6 +556,18 @@ def BuildTotalPDF(workspaceIn, myconfigfile, obsDict, ACPDict, tagDict, resAccDi
                                                                                                 resAccDict,
                                                                                                 asymmDict,
                                                                                                 debug))
+                            if "TimeGenerator" in myconfigfile["ACP"][comp].keys() and myconfigfile["ACP"][comp]["TimeGenerator"] == "Envelope":
+                                pdfDict[hypo][year][mode][comp]["TimeGenerator"] = BuildTimeGenerator(workspaceIn,
+                                                                                                      myconfigfile,
+                                                                                                      hypo,
+                                                                                                      year,
+                                                                                                      comp,
+                                                                                                      mode,
+                                                                                                      obsDict,
+                                                                                                      ACPDict,
+                                                                                                      tagDict,
+                                                                                                      resAccDict,
+                                                                                                      debug)
                         elif obs in ["BeautyMass", "CharmMass", "BacPIDK", "TrueID"]:
 
                             print "Observables: "+obs
@@ -641,6 +717,43 @@ def BuildTimePDF(workspaceIn, myconfigfile, hypo, year, comp, mode, obsDict, ACP
 
     return WS(workspaceIn, pdf)
 
+#-----------------------------------------------------------------------------
+def BuildTimeGenerator(workspaceIn, myconfigfile, hypo, year, comp, mode, obsDict, ACPDict, tagDict, resAccDict, debug):
+
+    #Collect what the dedicated decay time generator (RooBDecayEnvelopeGenContext)
+    #needs to know about the time PDF built by BuildTimePDF
+
+    resolution = None
+    resConfig = myconfigfile["ResolutionAcceptance"][comp]["Resolution"]
+    if None != resConfig:
+        config = {}
+        if resConfig["Type"] == "GaussianWithPEDTE":
+            config["DecayTimeResolutionModel"] = "GaussianWithPEDTE"
+        else:
+            config["DecayTimeResolutionModel"] = resConfig["Parameters"]
+        config["DecayTimeResolutionBias"] = resConfig["Bias"][0]
+        config["DecayTimeResolutionScaleFactor"] = resConfig["ScaleFactor"][0]
+        terr = None
+        if "BeautyTimeErr" in obsDict.keys():
+            terr = obsDict["BeautyTimeErr"]
+        try:
+            resolution = resmodelutils.getResolutionParameters(workspaceIn, config, terr)
+        except TypeError, e:
+            print "WARNING: envelope generator does not support the resolution of "+comp+" ("+str(e)+"), using the default generator"
+            return None
+
+    if debug:
+        print "Use envelope generator for decay time of "+comp+" ("+hypo+", "+year+", "+mode+")"
+
+    return {"Name"       : "TimePDF_both"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo",
+            "Workspace"  : workspaceIn,
+            "Gamma"      : ACPDict[comp]["Gamma"],
+            "DeltaGamma" : ACPDict[comp]["DeltaGamma"],
+            "DeltaM"     : ACPDict[comp]["DeltaM"],
+            "Resolution" : resolution,
+            "Acceptance" : resAccDict[comp]["Acceptance"],
+            "PerEvent"   : resAccDict[comp]["TimeErrorPDF"] != None or tagDict[comp]["MistagPDF"] != None}
+
 #-----------------------------------------------------------------------------
 def BuildPDF(workspaceIn, myconfigfile, hypo, year, comp, mode, obs, workTemplate, debug):
 
@@ -864,19 +977,200 @@ def BuildAnalyticalPdf(workspaceIn, shapeType, myconfigfile, hypo, year, comp, m
     return pdf
 
 #-----------------------------------------------------------------------------
-def BuildProtoData(workspaceIn, myconfigfile, obsDict, tagDict, resAccDict, pdfDict, seed, debug):
+def BuildProtoDataCell(workspaceIn, myconfigfile, obsDict, tagDict, resAccDict, hypo, year, mode, comp, poissonNum, debug):
 
-    if "BeautyTime" not in obsDict.keys():
+    #Generate proto data (per event mistag(s), time error) for one
+    #hypothesys/year/mode/component cell; returns list of data sets
+
+    protoList = []
+    suffix = "both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo"
+
+    if UseInverseCDFSampler(myconfigfile):
+        data = SampleProtoDataCell(tagDict, resAccDict, comp, poissonNum, suffix, debug)
+        if data != None:
+            protoList.append( WS(workspaceIn, data) )
+        return protoList
+
+    #Check tagging
+    tag = 0
+    if tagDict[comp]["MistagPDF"] != None:
+        for tagger in myconfigfile["Taggers"][comp].iterkeys():
+            if "Mistag"+tagger in obsDict.keys() and "TagDec"+tagger in obsDict.keys():
+                if debug:
+                    print "Generate "+str(poissonNum)+" Mistag"+tagger+" proto data from "+tagDict[comp]["MistagPDF"][tag].GetName()
+                data = tagDict[comp]["MistagPDF"][tag].generate( RooArgSet(obsDict["Mistag"+tagger]),
+                                                                 RooFit.AutoBinned(False),
+                                                                 RooFit.NumEvents(poissonNum) )
+                data.SetName(data.GetName()+suffix)
+                data.SetTitle(data.GetName())
+                protoList.append( WS(workspaceIn, data) )
+                tag = tag+1
+
+    #Check per-event error
+    if resAccDict[comp]["TimeErrorPDF"] != None:
+        if debug:
+            print "Generate "+str(poissonNum)+" per-event time error proto data from "+resAccDict[comp]["TimeErrorPDF"].GetName()
+        data = resAccDict[comp]["TimeErrorPDF"].generate( RooArgSet(obsDict["BeautyTimeErr"]), poissonNum )
+        data.SetName(data.GetName()+suffix)
+        data.SetTitle(data.GetName())
+        protoList.append( WS(workspaceIn, data) )
+
+    return protoList
+
+#-----------------------------------------------------------------------------
+def SampleProtoDataCell(tagDict, resAccDict, comp, poissonNum, suffix, debug):
+
+    #Draw all proto data observables of one cell from the tabulated inverse
+    #CDFs, and bulk-load them into a single data set (None if there are no
+    #per-event observables). The values are drawn with a numpy generator seeded
+    #from RooRandom, so they follow the per-cell substreams
+
+    samplers = []
+    if tagDict[comp]["MistagSampler"] != None:
+        samplers += tagDict[comp]["MistagSampler"]
+    if resAccDict[comp]["TimeErrorSampler"] != None:
+        samplers.append( resAccDict[comp]["TimeErrorSampler"] )
+    if len(samplers) == 0:
         return None
 
-    #Setup poisson generator for yields
-    poissonGen = TRandom3(seed)
+    rnd = randomState()
+    columns = []
+    for sampler in samplers:
+        if debug:
+            print "Sample "+str(poissonNum)+" values of "+", ".join([ o.GetName() for o in sampler.observables ])+" proto data"
+        columns += zip(sampler.observables, sampler.sample(poissonNum, rnd))
+
+    row = RooArgSet()
+    for var, values in columns:
+        row.add(var)
+    data = RooDataSet("ProtoData_"+suffix, "ProtoData_"+suffix, row)
+    fillDataSetFromArrays(data, row, columns)
+    return data
+
+#-----------------------------------------------------------------------------
+def MergeProtoDataCell(protoList, hypo, year, mode, comp):
+
+    #Merge the proto data sets of one cell into a single data set
+
+    merged = None
+    for data in protoList:
+        if None == merged:
+            merged = copy.deepcopy( data )
+        else:
+            merged.merge( data )
+    merged.SetName("ProtoData_both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo")
+    merged.SetTitle("ProtoData_both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo")
+    return merged
+
+#-----------------------------------------------------------------------------
+def GenerateToysCell(workspaceIn, myconfigfile, observables, pdf, protoData, hypo, year, mode, comp, poissonNum, debug):
+
+    #Generate all observables for one hypothesys/year/mode/component cell;
+    #returns dictionary observable name -> data set
+
+    cellDict = {}
+
+    #Loop over observables
+    for obs in myconfigfile["Observables"].iterkeys():
+
+        if obs == "BeautyTime":
+            print "Observable: "+obs
+            genset = RooArgSet(observables.find(obs),
+                               observables.find("BacCharge"))
+            if "TagDecOS" in myconfigfile["Observables"].keys():
+                genset.add( observables.find("TagDecOS") )
+            if "TagDecSS" in myconfigfile["Observables"].keys():
+                genset.add( observables.find("TagDecSS") )
+            timeGen = None
+            if "TimeGenerator" in pdf[hypo][year][mode][comp].keys():
+                timeGen = pdf[hypo][year][mode][comp]["TimeGenerator"]
+            #Use the dedicated generator if requested (needs proto data for per-event mistag/time error)
+            if None != timeGen and (None != protoData or not timeGen["PerEvent"]):
+                if debug:
+                    print "Generate "+str(poissonNum)+" decay time data from "+pdf[hypo][year][mode][comp][obs].GetName()+" (envelope generator)"
+                genContext = timepdfutils_Bd.buildBDecayEnvelopeGenContext(timeGen["Name"],
+                                                                           timeGen["Workspace"],
+                                                                           pdf[hypo][year][mode][comp][obs],
+                                                                           genset,
+                                                                           observables.find(obs),
+                                                                           timeGen["Gamma"],
+                                                                           timeGen["DeltaGamma"],
+                                                                           timeGen["DeltaM"],
+                                                                           timeGen["Resolution"],
+                                                                           timeGen["Acceptance"],
+                                                                           protoData)
+                cellDict[obs] = WS(workspaceIn, genContext.generate(poissonNum))
+                if debug:
+                    print "Envelope generator: "+str(genContext.nTrials())+" trials for "+str(poissonNum)+" events"
+            #If we have proto data use it, otherwise only draw number of events to generate from Poisson distribution
+            elif None != protoData:
+                if debug:
+                    print "Generate "+str(poissonNum)+" decay time data from "+pdf[hypo][year][mode][comp][obs].GetName()
+                cellDict[obs] = WS(workspaceIn, pdf[hypo][year][mode][comp][obs].generate(genset,
+                                                                                          RooFit.ProtoData(protoData),
+                                                                                          RooFit.NumEvents(poissonNum)) )
+            else:
+                if debug:
+                    print "Generate "+str(poissonNum)+" decay time data from "+pdf[hypo][year][mode][comp][obs].GetName()
+                    print "No proto data used - the generation takes ages, do it at your own 'risk'"
+                cellDict[obs] = WS(workspaceIn, pdf[hypo][year][mode][comp][obs].generate(genset,
+                                                                                          RooFit.NumEvents(poissonNum) ) )
+        elif obs in ["BeautyMass", "CharmMass", "BacPIDK", "TrueID"]:
+            print "Observable: "+obs
+            genset = RooArgSet(observables.find(obs))
+
+            if obs == "BacPIDK":
+                if debug:
+                    print "Generate "+str(poissonNum)+" BacPIDK data from "+pdf[hypo][year][mode][comp][obs].GetName()
+                cellDict[obs] = WS(workspaceIn, pdf[hypo][year][mode][comp][obs].generate(genset,
+                                                                                          RooFit.AutoBinned(False),
+                                                                                          RooFit.NumEvents(poissonNum) ) )
+            else:
+                if debug:
+                    print "Generate "+str(poissonNum) + " " + obs + " data from "+pdf[hypo][year][mode][comp][obs].GetName()
+                cellDict[obs] = WS(workspaceIn, pdf[hypo][year][mode][comp][obs].generate(genset,
+                                                                                          RooFit.NumEvents(poissonNum) ) )
+
+    return cellDict
+
+#-----------------------------------------------------------------------------
+def DrawYields(myconfigfile, pdfDict, seed, debug):
+
+    #Draw the number of events to generate for each hypothesys/year/mode/component
+    #cell, once, from the cell's own substream, so that proto data and generated
+    #data always agree, and do not depend on the order the cells are processed in
+
+    nevts = pdfDict["Events"]
+    yields = {}
+
+    for hypo in myconfigfile["Hypothesys"]:
+        yields[hypo] = {}
+        for year in myconfigfile["Years"]:
+            yields[hypo][year] = {}
+            for mode in myconfigfile["CharmModes"]:
+                yields[hypo][year][mode] = {}
+                for comp in myconfigfile["Components"].iterkeys():
+                    if int(nevts[hypo][year][mode][comp]) > 0:
+                        poissonGen = substream(seed, hypo, year, mode, comp, "yield")
+                        yields[hypo][year][mode][comp] = poissonGen.Poisson( int(nevts[hypo][year][mode][comp]) )
+                    else:
+                        yields[hypo][year][mode][comp] = None
+
     if debug:
-        print "Seed to generate yields: "+str(poissonGen.GetSeed())
+        print "Yields dictionary:"
+        print yields
+
+    return yields
+
+#-----------------------------------------------------------------------------
+def BuildProtoData(workspaceIn, myconfigfile, obsDict, tagDict, resAccDict, yields, seed, debug):
+
+    if "BeautyTime" not in obsDict.keys():
+        return None
 
     #Ok, we have time observable. Let's see if we need per event mistag/time error
-    nevts = pdfDict["Events"]
     protoDataDict = {}
+    atLeast = 0
 
     for hypo in myconfigfile["Hypothesys"]:
         protoDataDict[hypo] = {}
@@ -889,42 +1183,15 @@ def BuildProtoData(workspaceIn, myconfigfile, obsDict, tagDict, resAccDict, pdfD
 
                 for comp in myconfigfile["Components"].iterkeys():
                     protoDataDict[hypo][year][mode][comp] = []
-                    atLeast = 0
 
-                    #Get random number of events to generate
-                    if int(nevts[hypo][year][mode][comp]) > 0:
-                        poissonNum = poissonGen.Poisson( int(nevts[hypo][year][mode][comp]) )
-                    else:
+                    poissonNum = yields[hypo][year][mode][comp]
+                    if None == poissonNum:
                         continue
 
-                    #Check tagging
-                    tag = 0
-                    if tagDict[comp]["MistagPDF"] != None:
-                        for tagger in myconfigfile["Taggers"][comp].iterkeys():
-                            if "Mistag"+tagger in obsDict.keys() and "TagDec"+tagger in obsDict.keys():
-                                if debug:
-                                    print "Generate "+str(poissonNum)+" Mistag"+tagger+" proto data from "+tagDict[comp]["MistagPDF"][tag].GetName()
-                                protoDataDict[hypo][year][mode][comp].append( tagDict[comp]["MistagPDF"][tag].generate( RooArgSet(obsDict["Mistag"+tagger]),
-                                                                                                                        RooFit.AutoBinned(False),
-                                                                                                                        RooFit.NumEvents(poissonNum) ) )
-                                protoDataDict[hypo][year][mode][comp][atLeast].SetName(protoDataDict[hypo][year][mode][comp][atLeast].GetName()+"both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo")
-                                protoDataDict[hypo][year][mode][comp][atLeast].SetTitle(protoDataDict[hypo][year][mode][comp][atLeast].GetName()+"both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo")
-                                protoDataDict[hypo][year][mode][comp][atLeast] = WS(workspaceIn, protoDataDict[hypo][year][mode][comp][atLeast])
-
-                                atLeast = atLeast+1
-                                tag = tag+1
-
-                    #Check per-event error
-                    if resAccDict[comp]["TimeErrorPDF"] != None:
-                        if debug:
-                            print "Generate "+str(poissonNum)+" per-event time error proto data from "+resAccDict[comp]["TimeErrorPDF"].GetName()
-                        protoDataDict[hypo][year][mode][comp].append( resAccDict[comp]["TimeErrorPDF"].generate( RooArgSet(obsDict["BeautyTimeErr"]),
-                                                                                                                 poissonNum ) )
-                        protoDataDict[hypo][year][mode][comp][atLeast].SetName(protoDataDict[hypo][year][mode][comp][atLeast].GetName()+"both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo")
-                        protoDataDict[hypo][year][mode][comp][atLeast].SetTitle(protoDataDict[hypo][year][mode][comp][atLeast].GetName()+"both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo")
-                        protoDataDict[hypo][year][mode][comp][atLeast] = WS(workspaceIn, protoDataDict[hypo][year][mode][comp][atLeast])
-
-                        atLeast = atLeast+1
+                    seedGlobalGenerators(seed, hypo, year, mode, comp, "proto")
+                    protoDataDict[hypo][year][mode][comp] = BuildProtoDataCell(workspaceIn, myconfigfile, obsDict, tagDict, resAccDict,
+                                                                               hypo, year, mode, comp, poissonNum, debug)
+                    atLeast = atLeast + len(protoDataDict[hypo][year][mode][comp])
 
     if atLeast == 0:
         if debug:
@@ -951,21 +1218,11 @@ def BuildProtoData(workspaceIn, myconfigfile, obsDict, tagDict, resAccDict, pdfD
 
                     if protoDataDict[hypo][year][mode][comp].__len__() > 0:
 
-                        protoDataMerged[hypo][year][mode][comp] = {}
-                        countGenObs = 0
-
-                        for data in protoDataDict[hypo][year][mode][comp]:
-                            if countGenObs == 0:
-                                protoDataMerged[hypo][year][mode][comp] = copy.deepcopy( protoDataDict[hypo][year][mode][comp][countGenObs] )
-                            else:
-                                protoDataMerged[hypo][year][mode][comp].merge( protoDataDict[hypo][year][mode][comp][countGenObs] )
-                            countGenObs = countGenObs+1
-
-                        protoDataMerged[hypo][year][mode][comp].SetName("ProtoData_both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo")
-                        protoDataMerged[hypo][year][mode][comp].SetTitle("ProtoData_both_"+year+"_"+comp+"_"+mode+"_"+hypo+"Hypo")
+                        protoDataMerged[hypo][year][mode][comp] = MergeProtoDataCell(protoDataDict[hypo][year][mode][comp],
+                                                                                     hypo, year, mode, comp)
 
                     else:
-                        protoDataMerged[hypo][mode] = None
+                        protoDataMerged[hypo][year][mode][comp] = None
 
     if debug:
         print "Merged proto data dictionary:"
@@ -974,18 +1231,12 @@ def BuildProtoData(workspaceIn, myconfigfile, obsDict, tagDict, resAccDict, pdfD
     return protoDataMerged
 
 #-----------------------------------------------------------------------------
-def GenerateToys(workspaceIn, myconfigfile, observables, pdfDict, protoData, seed, debug):
+def GenerateToys(workspaceIn, myconfigfile, observables, pdfDict, protoData, yields, seed, debug):
 
     pdf = pdfDict["PDF"]
-    nevts = pdfDict["Events"]
 
     toyDict = {}
 
-    #Setup poisson generator for yields
-    poissonGen = TRandom3(seed)
-    if debug:
-        print "Seed to generate yields: "+str(poissonGen.GetSeed())
-
     #Loop over bachelor mass hypotheses
     for hypo in myconfigfile["Hypothesys"]:
         print "Hypothesys: "+hypo
@@ -1003,56 +1254,96 @@ def GenerateToys(workspaceIn, myconfigfile, observables, pdfDict, protoData, see
                     print "Components: "+comp
                     toyDict[hypo][year][mode][comp] = {}
 
-                    #Get random number of events to generate
-                    if int(nevts[hypo][year][mode][comp]) > 0:
-                        poissonNum = poissonGen.Poisson( int(nevts[hypo][year][mode][comp]) )
-                    else:
-                        toyDict[hypo][year][mode][comp][obs] = None
+                    poissonNum = yields[hypo][year][mode][comp]
+                    if None == poissonNum:
                         continue
 
-                    #Loop over observables
-                    for obs in myconfigfile["Observables"].iterkeys():
+                    seedGlobalGenerators(seed, hypo, year, mode, comp, "generate")
+                    toyDict[hypo][year][mode][comp] = GenerateToysCell(workspaceIn, myconfigfile, observables, pdf,
+                                                                       protoData[hypo][year][mode][comp] if None != protoData else None,
+                                                                       hypo, year, mode, comp, poissonNum, debug)
 
-                        if obs == "BeautyTime":
-                            print "Observable: "+obs
-                            toyDict[hypo][year][mode][comp][obs] = {}
-                            genset = RooArgSet(observables.find(obs),
-                                               observables.find("BacCharge"))
-                            if "TagDecOS" in myconfigfile["Observables"].keys():
-                                genset.add( observables.find("TagDecOS") )
-                            if "TagDecSS" in myconfigfile["Observables"].keys():
-                                genset.add( observables.find("TagDecSS") )
-                            #If we have proto data use it, otherwise only draw number of events to generate from Poisson distribution
-                            if None != protoData:
-                                if debug:
-                                    print "Generate "+str(poissonNum)+" decay time data from "+pdf[hypo][year][mode][comp][obs].GetName()
-                                toyDict[hypo][year][mode][comp][obs] = WS(workspaceIn, pdf[hypo][year][mode][comp][obs].generate(genset,
-                                                                                                                                 RooFit.ProtoData(protoData[hypo][year][mode][comp]),
-                                                                                                                                 RooFit.NumEvents(poissonNum)) )
-                            else:
-                                if debug:
-                                    print "Generate "+str(poissonNum)+" decay time data from "+pdf[hypo][year][mode][comp][obs].GetName()
-                                    print "No proto data used - the generation takes ages, do it at your own 'risk'"
-                                toyDict[hypo][year][mode][comp][obs] = WS(workspaceIn, pdf[hypo][year][mode][comp][obs].generate(genset,
-                                                                                                                                 RooFit.NumEvents(poissonNum) ) )
-                        elif obs in ["BeautyMass", "CharmMass", "BacPIDK", "TrueID"]:
-                            print "Observable: "+obs
-                            genset = RooArgSet(observables.find(obs))
-                            toyDict[hypo][year][mode][comp][obs] = {}
-
-                            if obs == "BacPIDK":
-                                if debug:
-                                    print "Generate "+str(poissonNum)+" BacPIDK data from "+pdf[hypo][year][mode][comp][obs].GetName()
-                                toyDict[hypo][year][mode][comp][obs] = WS(workspaceIn, pdf[hypo][year][mode][comp][obs].generate(genset,
-                                                                                                                                 RooFit.AutoBinned(False),
-                                                                                                                                 #RooFit.Extended(),
-                                                                                                                                 RooFit.NumEvents(poissonNum) ) )
-                            else:
-                                if debug:
-                                    print "Generate "+str(poissonNum) + " " + obs + " data from "+pdf[hypo][year][mode][comp][obs].GetName()
-                                toyDict[hypo][year][mode][comp][obs] = WS(workspaceIn, pdf[hypo][year][mode][comp][obs].generate(genset,
-                                                                                                                                 #RooFit.Extended(),
-                                                                                                                                 RooFit.NumEvents(poissonNum) ) )
+    if debug:
+        print "Toy dictionary:"
+        print toyDict
+
+    return toyDict
+
+#-----------------------------------------------------------------------------
+# Parallel generation: each hypothesys/year/mode/component cell is generated
+# in a worker process, from the same random number substreams as in
+# GenerateToys, and the results are merged in a fixed order, so the toy does
+# not depend on the number of workers
+#-----------------------------------------------------------------------------
+# generator and configuration shared with the workers (inherited through fork)
+cellContext = {}
+
+def GenerateCellTask(task):
+
+    #Generate one cell and save its data sets (one per observable) to a file
+
+    seed, cell, poissonNum, fileName = task
+    generator = cellContext["generator"]
+    myconfigfile = cellContext["config"]
+    debug = cellContext["debug"]
+    hypo, year, mode, comp = cell
+
+    workspaceCell = RooWorkspace("workCell", "workCell")
+    protoData = None
+    if "BeautyTime" in generator["obsDict"].keys():
+        seedGlobalGenerators(seed, hypo, year, mode, comp, "proto")
+        protoList = BuildProtoDataCell(workspaceCell, myconfigfile, generator["obsDict"], generator["tagDict"],
+                                       generator["resAccDict"], hypo, year, mode, comp, poissonNum, debug)
+        if len(protoList) > 0:
+            protoData = MergeProtoDataCell(protoList, hypo, year, mode, comp)
+    seedGlobalGenerators(seed, hypo, year, mode, comp, "generate")
+    cellDict = GenerateToysCell(workspaceCell, myconfigfile, generator["observables"], generator["pdfDict"]["PDF"],
+                                protoData, hypo, year, mode, comp, poissonNum, debug)
+
+    cellFile = TFile.Open(fileName, "RECREATE")
+    for obs in cellDict.iterkeys():
+        cellFile.WriteTObject(cellDict[obs], obs)
+    cellFile.Close()
+    return poissonNum
+
+#-----------------------------------------------------------------------------
+def GenerateToysParallel(workspaceIn, myconfigfile, generator, yields, seed, nWorkers, debug):
+
+    from B2DXFitters.parallelutils import runInPool
+    import tempfile, shutil
+
+    toyDict = {}
+    cells = []
+    for hypo in myconfigfile["Hypothesys"]:
+        toyDict[hypo] = {}
+        for year in myconfigfile["Years"]:
+            toyDict[hypo][year] = {}
+            for mode in myconfigfile["CharmModes"]:
+                toyDict[hypo][year][mode] = {}
+                for comp in myconfigfile["Components"].iterkeys():
+                    toyDict[hypo][year][mode][comp] = {}
+                    if None != yields[hypo][year][mode][comp]:
+                        cells.append((hypo, year, mode, comp))
+
+    cellContext.update({ "generator" : generator, "config" : myconfigfile, "debug" : debug })
+    tmpdir = tempfile.mkdtemp(prefix = "toyFactory_")
+    try:
+        tasks = [ (int(seed), cell, yields[cell[0]][cell[1]][cell[2]][cell[3]],
+                   os.path.join(tmpdir, "cell_%04d.root" % i)) for i, cell in enumerate(cells) ]
+        labels = [ "/".join(cell) for cell in cells ]
+        runInPool(GenerateCellTask, tasks, nWorkers, labels)
+        #Merge in the order of the configuration, whatever order the cells finished in
+        for cell, task in zip(cells, tasks):
+            hypo, year, mode, comp = cell
+            cellFile = TFile.Open(task[3])
+            for obs in myconfigfile["Observables"].iterkeys():
+                data = cellFile.Get(obs)
+                if None == data:
+                    continue
+                toyDict[hypo][year][mode][comp][obs] = WS(workspaceIn, data)
+            cellFile.Close()
+    finally:
+        shutil.rmtree(tmpdir, True)
 
     if debug:
         print "Toy dictionary:"
@@ -1236,17 +1527,142 @@ def MergeYears(myconfigfile, modesData, debug):
 
 
 #-----------------------------------------------------------------------------
+# Streaming assembly: instead of merging/appending/importing copies of the
+# generated data sets (several copies of the toy alive at once), the columns
+# of each cell are streamed straight into the final (tree-backed) data set,
+# with the sample category set; merging years is just a relabelling of the
+# sample category
+#-----------------------------------------------------------------------------
+def SampleLabels(myconfigfile, debug):
+
+    #Sample category label and index for each hypothesys/year/mode; with
+    #merged years, all years of a hypothesys/mode share the "run1" label
+
+    mergedYears = myconfigfile.has_key("MergedYears") and myconfigfile["MergedYears"] == True
+    labels = {}
+    modes = []
+    for hypo in myconfigfile["Hypothesys"]:
+        labels[hypo] = {}
+        for year in myconfigfile["Years"]:
+            labels[hypo][year] = {}
+            for mode in myconfigfile["CharmModes"]:
+                modeSmall = GeneralUtils.GetModeLower(TString(mode),debug)
+                typeName = "both_"+modeSmall.Data()+"_"+("run1" if mergedYears else year)+"_"+hypo+"Hypo"
+                if typeName not in [ m[0] for m in modes ]:
+                    modes.append( (typeName, "dataSet"+myconfigfile["Decay"]+"_"+typeName) )
+                labels[hypo][year][mode] = typeName
+    return labels, modes
+
+def StreamTotalDataset(workspaceIn, myconfigfile, toyDict, yields, debug):
+
+    #Returns the total data set and a generator of the per-mode data sets
+    #(made one at a time, and only if needed)
+
+    import numpy
+    from B2DXFitters.datasetio import dataSetToArrays
+
+    labels, modes = SampleLabels(myconfigfile, debug)
+    sam = RooCategory("sample","sample")
+    index = {}
+    for idx, (typeName, dataName) in enumerate(modes):
+        sam.defineType(typeName, idx)
+        index[typeName] = idx
+        if debug:
+            print "Defined category "+typeName+" with index "+str(idx)
+
+    #Observables of the final data set, in the order they first appear
+    cells = []
+    names = []
+    for hypo in myconfigfile["Hypothesys"]:
+        for year in myconfigfile["Years"]:
+            for mode in myconfigfile["CharmModes"]:
+                for comp in myconfigfile["Components"].iterkeys():
+                    if None == yields[hypo][year][mode][comp]:
+                        continue
+                    cellData = [ toyDict[hypo][year][mode][comp][obs] for obs in toyDict[hypo][year][mode][comp].iterkeys()
+                                 if None != toyDict[hypo][year][mode][comp][obs] ]
+                    if len(cellData) == 0:
+                        continue
+                    cells.append( (hypo, year, mode, comp, cellData) )
+                    for data in cellData:
+                        it = data.get().fwdIterator()
+                        while True:
+                            var = it.next()
+                            if None == var: break
+                            if var.GetName() not in names:
+                                names.append( var.GetName() )
+    observables = RooArgSet()
+    for name in names:
+        observables.add( workspaceIn.arg(name) )
+    row = RooArgSet(observables)
+    row.add(sam)
+
+    #The only full copy of the toy: tree-backed, so that writing the tree
+    #out does not need another one
+    storageType = RooAbsData.getDefaultStorageType()
+    RooAbsData.setDefaultStorageType(RooAbsData.Tree)
+    totData = RooDataSet("totData","totData", row)
+    RooAbsData.setDefaultStorageType(storageType)
+
+    expected = 0
+    for hypo, year, mode, comp, cellData in cells:
+        typeName = labels[hypo][year][mode]
+        print "Streaming "+comp+" into "+typeName
+        columns = {}
+        for data in cellData:
+            columns.update( dataSetToArrays(data) )
+            #The generated data set is not needed any more, free its storage
+            data.reset()
+        nEntries = len(columns[names[0]]) if names[0] in columns else 0
+        for name in names:
+            if name not in columns or len(columns[name]) != nEntries:
+                print "ERROR: observable "+name+" missing or with wrong number of entries for "+comp+" in "+typeName
+                exit(-1)
+        fillDataSetFromArrays(totData, row,
+                              [ (workspaceIn.arg(name), columns[name]) for name in names ] +
+                              [ (sam, numpy.full(nEntries, index[typeName], dtype = numpy.float64)) ])
+        expected = expected + yields[hypo][year][mode][comp]
+        del columns
+
+    if totData.numEntries() != expected:
+        print "ERROR: assembled data set has "+str(totData.numEntries())+" entries, expected "+str(expected)
+        exit(-1)
+
+    if debug:
+        print "Total dataset:"
+        totData.Print("v")
+        print "Sample categories:"
+        sam.Print("v")
+
+    return totData, ModeDatasets(totData, observables, modes)
+
+def ModeDatasets(totData, observables, modes):
+
+    #Per-mode data sets (without sample category), as BuildTotalDataset/MergeYears
+    #return them, made from the total data set one at a time
+    for typeName, dataName in modes:
+        data = totData.reduce(RooFit.SelectVars(observables), RooFit.Cut("sample==sample::"+typeName))
+        data.SetName(dataName)
+        data.SetTitle(dataName)
+        yield data
+        del data
+
+#-----------------------------------------------------------------------------
+def PeakMemory():
+
+    #Peak resident memory of this process so far, in MB
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
 #-----------------------------------------------------------------------------
 #-----------------------------------------------------------------------------
-def toyFactory(configName,
-               seed,
-               outputdir,
-               workOut,
-               workfileOut,
-               treeOut,
-               treefileOut,
-               saveTree,
-               debug):
+#-----------------------------------------------------------------------------
+def BuildGenerator(myconfigfile, debug, pdfCache = None):
+
+    #Build observables and PDFs needed for generation. Nothing in here draws
+    #random numbers, so the result can be used to generate any number of toys.
+    #With a pdfCache (see B2DXFitters.pdfcache), the PDFs are loaded from the
+    #cache if they were built before with the same configuration
 
     # Safe settings for numerical integration (if needed)
     RooAbsReal.defaultIntegratorConfig().setEpsAbs(1e-9)
@@ -1260,35 +1676,33 @@ def toyFactory(configName,
     RooAbsReal.defaultIntegratorConfig().method1DOpen().setLabel(
         'RooAdaptiveGaussKronrodIntegrator1D')
 
-    # Get the configuration file
-    myconfigfilegrabber = __import__(configName,fromlist=['getconfig']).getconfig
-    myconfigfile = myconfigfilegrabber()
+    RooAbsData.setDefaultStorageType(RooAbsData.Tree)
 
-    print "=========================================================="
-    print "GENERATETOYS IS RUNNING WITH THE FOLLOWING CONFIGURATION OPTIONS"
-    for option in myconfigfile :
-        if option == "constParams" :
-            for param in myconfigfile[option] :
-                print param, "is constant in the fit"
-        else :
-            print option, " = ", myconfigfile[option]
-    print "=========================================================="
+    generator = None
+    if None != pdfCache:
+        key = pdfCache.key(myconfigfile, "toyFactory",
+                           [ __file__, acceptanceutils.__file__, resmodelutils.__file__,
+                             timepdfutils_Bd.__file__, cpobservables.__file__ ])
+        generator = pdfCache.load(key)
+    if None == generator:
+        generator = BuildGeneratorPDFs(myconfigfile, debug)
+        if None != pdfCache:
+            pdfCache.store(key, generator["workspace"], generator)
 
-    RooAbsData.setDefaultStorageType(RooAbsData.Tree)
+    if None != generator["tagDict"]:
+        BuildProtoDataSamplers(myconfigfile, generator["obsDict"], generator["tagDict"], generator["resAccDict"], debug)
+
+    return generator
+
+#-----------------------------------------------------------------------------
+def BuildGeneratorPDFs(myconfigfile, debug):
+
+    #Build observables and PDFs needed for generation from scratch
 
     workspaceIn = RooWorkspace("workIn", "workIn")
     one = WS(workspaceIn, RooConstVar("one", "1", 1.0))
     zero = WS(workspaceIn, RooConstVar("zero", "0", 0.0))
 
-    print ""
-    print "=========================================================="
-    print "Set generation seed to "+str(seed)
-    print "=========================================================="
-    print ""
-
-    gInterpreter.ProcessLine('gRandom->SetSeed('+str(int(seed))+')')
-    RooRandom.randomGenerator().SetSeed(int(seed))
-
     print ""
     print "=========================================================="
     print "Build observables"
@@ -1355,12 +1769,6 @@ def toyFactory(configName,
     if "WorkspaceToRead" in myconfigfile.keys():
         filePDF.Close()
 
-    print ""
-    print "=========================================================="
-    print "Start toy generation"
-    print "=========================================================="
-    print ""
-
     #Include observables
     observables = RooArgSet()
     for obs in obsDict.keys():
@@ -1371,11 +1779,79 @@ def toyFactory(configName,
         print "Observables for generation:"
         observables.Print("v")
 
-    #Generate "proto data" from time error and mistag PDFs (if needed)
-    protoData = BuildProtoData(workspaceIn, myconfigfile, obsDict, tagDict, resAccDict, pdfDict, int(seed), debug)
+    return { "workspace" : workspaceIn,
+             "obsDict" : obsDict,
+             "tagDict" : tagDict,
+             "resAccDict" : resAccDict,
+             "pdfDict" : pdfDict,
+             "observables" : observables }
+
+#-----------------------------------------------------------------------------
+def SeedFileName(fileName, seed):
+
+    #Output file name for a given seed: "%d" in fileName is replaced by the
+    #seed, otherwise "_<seed>" is inserted before the extension
+
+    if "%" in fileName:
+        return fileName % int(seed)
+    root, ext = os.path.splitext(fileName)
+    return root+"_"+str(seed)+ext
+
+#-----------------------------------------------------------------------------
+def GenerateOneToy(generator,
+                   myconfigfile,
+                   seed,
+                   outputdir,
+                   workOut,
+                   workfileOut,
+                   treeOut,
+                   treefileOut,
+                   saveTree,
+                   debug,
+                   outputFormat,
+                   colfileOut,
+                   nWorkers = 0,
+                   streamAssembly = False,
+                   fitter = None,
+                   fitResultOut = None,
+                   pullFileOut = None):
+
+    print ""
+    print "=========================================================="
+    print "Set generation seed to "+str(seed)
+    print "=========================================================="
+    print ""
+
+    seedGlobalGenerators(seed)
+
+    obsDict = generator["obsDict"]
+    tagDict = generator["tagDict"]
+    resAccDict = generator["resAccDict"]
+    pdfDict = generator["pdfDict"]
+    observables = generator["observables"]
+
+    #Generated data sets go to a scratch workspace, so that toys generated
+    #in the same process do not clash with each other
+    workspaceToy = RooWorkspace("workToy", "workToy")
+
+    print ""
+    print "=========================================================="
+    print "Start toy generation"
+    print "=========================================================="
+    print ""
 
-    #Generate toys
-    toyDict = GenerateToys(workspaceIn, myconfigfile, observables, pdfDict, protoData, int(seed), debug)
+    #Draw the number of events of each component (shared by proto data and generation)
+    yields = DrawYields(myconfigfile, pdfDict, int(seed), debug)
+
+    if nWorkers > 0:
+        #Generate hypothesys/year/mode/component cells in parallel
+        toyDict = GenerateToysParallel(workspaceToy, myconfigfile, generator, yields, int(seed), nWorkers, debug)
+    else:
+        #Generate "proto data" from time error and mistag PDFs (if needed)
+        protoData = BuildProtoData(workspaceToy, myconfigfile, obsDict, tagDict, resAccDict, yields, int(seed), debug)
+
+        #Generate toys
+        toyDict = GenerateToys(workspaceToy, myconfigfile, observables, pdfDict, protoData, yields, int(seed), debug)
 
     print toyDict
     print ""
@@ -1385,11 +1861,30 @@ def toyFactory(configName,
     print "=========================================================="
     print ""
 
-    totData, modesData = BuildTotalDataset(workspaceIn, myconfigfile, toyDict, debug)
+    print "[INFO] Peak memory before data set assembly: %.1f MB" % PeakMemory()
+    if streamAssembly:
+        totData, modesData = StreamTotalDataset(workspaceToy, myconfigfile, toyDict, yields, debug)
+    else:
+        totData, modesData = BuildTotalDataset(workspaceToy, myconfigfile, toyDict, debug)
+
+        if myconfigfile.has_key("MergedYears"):
+            if myconfigfile["MergedYears"] == True:
+                totData, modesData = MergeYears(myconfigfile, modesData, debug)
+    print "[INFO] Peak memory after data set assembly: %.1f MB" % PeakMemory()
 
-    if myconfigfile.has_key("MergedYears"):
-        if myconfigfile["MergedYears"] == True:
-            totData, modesData = MergeYears(myconfigfile, modesData, debug)
+    if None != fitter:
+        print ""
+        print "=========================================================="
+        print "Fit toy in memory, save fit result and pull tree to:"
+        print outputdir+fitResultOut
+        print outputdir+pullFileOut
+        print "=========================================================="
+        print ""
+        fitter.fitAndSave(totData, outputdir+fitResultOut, outputdir+pullFileOut)
+
+    #Only the fit result is needed (unless the tree is explicitly requested)
+    if outputFormat == "none" and not saveTree:
+        return
 
     observables = totData.get()
     observables.Print("v")
@@ -1441,6 +1936,18 @@ def toyFactory(configName,
         tree.Write()
         fileTree.Close()
 
+    if outputFormat in ["columnar", "both"]:
+        print ""
+        print "=========================================================="
+        print "Save columnar data set to following file:"
+        print outputdir+colfileOut
+        print "=========================================================="
+        print ""
+        writeColumnarFile(totData, outputdir+colfileOut)
+
+    if outputFormat not in ["workspace", "both"]:
+        return
+
     #totData = WS(workspaceOut, totData)
     for data in modesData:
         d = WS(workspaceOut, data)
@@ -1455,6 +1962,67 @@ def toyFactory(configName,
     workspaceOut.Print("v")
     workspaceOut.writeToFile( outputdir+workfileOut )
 
+
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+#-----------------------------------------------------------------------------
+def toyFactory(configName,
+               seed,
+               outputdir,
+               workOut,
+               workfileOut,
+               treeOut,
+               treefileOut,
+               saveTree,
+               debug,
+               outputFormat = None,
+               colfileOut = "toyFactoryColFile.col",
+               seeds = None,
+               nWorkers = 0,
+               streamAssembly = False,
+               fitModel = None,
+               fitResultOut = "toyFactoryFitResult.root",
+               pullFileOut = "toyFactoryPullTree.root",
+               pdfCacheDir = None):
+
+    # Get the configuration file
+    myconfigfilegrabber = __import__(configName,fromlist=['getconfig']).getconfig
+    myconfigfile = myconfigfilegrabber()
+
+    print "=========================================================="
+    print "GENERATETOYS IS RUNNING WITH THE FOLLOWING CONFIGURATION OPTIONS"
+    for option in myconfigfile :
+        if option == "constParams" :
+            for param in myconfigfile[option] :
+                print param, "is constant in the fit"
+        else :
+            print option, " = ", myconfigfile[option]
+    print "=========================================================="
+
+    generator = BuildGenerator(myconfigfile, debug, openPdfCache(pdfCacheDir, debug))
+
+    #Fit model (if any) is built once as well, and fits every toy in memory
+    fitter = None
+    if None != fitModel:
+        fitter = ToyFitter(loadFitModel(fitModel), myconfigfile, debug)
+    if None == outputFormat:
+        outputFormat = "workspace" if None == fitter else "none"
+
+    if None == seeds:
+        GenerateOneToy(generator, myconfigfile, seed, outputdir, workOut, workfileOut,
+                       treeOut, treefileOut, saveTree, debug, outputFormat, colfileOut, nWorkers,
+                       streamAssembly, fitter, fitResultOut, pullFileOut)
+        return
+
+    #Build once, generate many: one toy per seed, each identical to the one
+    #a standalone run with that seed produces
+    for s in seeds:
+        GenerateOneToy(generator, myconfigfile, s, outputdir, workOut,
+                       SeedFileName(workfileOut, s), treeOut, SeedFileName(treefileOut, s),
+                       saveTree, debug, outputFormat, SeedFileName(colfileOut, s), nWorkers,
+                       streamAssembly, fitter, SeedFileName(fitResultOut, s), SeedFileName(pullFileOut, s))
+        gc.collect()
+
 #-----------------------------------------------------------------------------
 _usage = '%prog [options]'
 
@@ -1470,6 +2038,13 @@ parser.add_option( '--seed',
                    default = 193627,
                    help = 'seed for generation'
                    )
+parser.add_option( '--seeds',
+                   dest = 'seeds',
+                   default = None,
+                   help = 'generate one toy for each seed in START:STOP (STOP excluded) in a single job, '
+                   'building the PDFs only once; output file names get the seed appended (or '
+                   'substituted for %d if present)'
+                   )
 parser.add_option( '--outputdir',
                    dest = 'outputdir',
                    default = '',
@@ -1514,6 +2089,63 @@ parser.add_option( '-d', '--debug',
                    help = 'print debug information while processing'
                    )
 
+parser.add_option( '--nWorkers',
+                   dest = 'nWorkers',
+                   type = 'int',
+                   default = 0,
+                   help = 'generate hypothesys/year/mode/component cells in this many worker processes '
+                   '(default 0: generate in this process; the toy is the same either way)'
+                   )
+
+parser.add_option( '--streamAssembly',
+                   action = 'store_true',
+                   dest = 'streamAssembly',
+                   default = False,
+                   help = 'stream generated events straight into the final (tree-backed) data set, '
+                   'instead of merging/appending copies (much lower peak memory)'
+                   )
+
+parser.add_option( '--outputFormat',
+                   dest = 'outputFormat',
+                   type = 'choice',
+                   choices = ['workspace', 'columnar', 'both', 'none'],
+                   default = None,
+                   help = 'save toy as workspace, as memory-mappable columnar file (see datasetio.writeColumnarFile), both, '
+                   'or not at all (default: workspace, or none with --fitModel)'
+                   )
+
+parser.add_option( '--colfileOut',
+                   dest = 'colfileOut',
+                   default = 'toyFactoryColFile.col',
+                   help = 'output columnar file name'
+                   )
+
+parser.add_option( '--fitModel',
+                   dest = 'fitModel',
+                   default = None,
+                   help = 'python file defining getfitmodel (see B2DXFitters.toypipeline, e.g. data/toyFactoryFitModel.py): '
+                   'fit each toy in memory right after generation, building the fit model only once'
+                   )
+
+parser.add_option( '--fitResultOut',
+                   dest = 'fitResultOut',
+                   default = 'toyFactoryFitResult.root',
+                   help = 'output fit result file name (with --fitModel)'
+                   )
+
+parser.add_option( '--pullFileOut',
+                   dest = 'pullFileOut',
+                   default = 'toyFactoryPullTree.root',
+                   help = 'output pull tree file name (with --fitModel)'
+                   )
+
+parser.add_option( '--pdfCacheDir',
+                   dest = 'pdfCacheDir',
+                   default = None,
+                   help = 'load the generator PDFs from (and store them in) a PDF cache in this directory '
+                   '(default: $B2DXFITTERS_PDFCACHE); without either, the PDFs are always built from the config'
+                   )
+
 #-----------------------------------------------------------------------------
 if __name__ == '__main__' :
     ( options, args ) = parser.parse_args()
@@ -1535,6 +2167,14 @@ if __name__ == '__main__' :
     print "Config file name: "+configName
     print "Directory: "+directory
 
+    seeds = None
+    if None != options.seeds:
+        try:
+            start, stop = [ int(x) for x in options.seeds.split(":") ]
+        except ValueError:
+            parser.error("--seeds expects START:STOP, got "+options.seeds)
+        seeds = range(start, stop)
+
     toyFactory(configName,
                options.seed,
                options.outputdir,
@@ -1543,4 +2183,13 @@ if __name__ == '__main__' :
                options.treeOut,
                options.treefileOut,
                options.saveTree,
-               options.debug)
+               options.debug,
+               options.outputFormat,
+               options.colfileOut,
+               seeds,
+               options.nWorkers,
+               options.streamAssembly,
+               options.fitModel,
+               options.fitResultOut,
+               options.pullFileOut,
+               options.pdfCacheDir)
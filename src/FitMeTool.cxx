@@ -10,10 +10,13 @@
 //---------------------------------------------------------------------------//
 
 // STL includes
+#include <algorithm>
 #include <limits>
 #include <utility>
 #include <map>
 #include <iterator>
+#include <sstream>
+#include <vector>
 
 // ROOT and RooFit includes
 #include "TTree.h"
@@ -23,9 +26,16 @@
 #include "RooExtendPdf.h"
 #include "RooStats/SPlot.h"
 #include "RooMsgService.h"
+#include "RooCmdConfig.h"
+#include "RooAddition.h"
+#include "RooConstraintSum.h"
+#include "RooRealMPFE.h"
+#include "RooMinimizer.h"
+#include "TStopwatch.h"
 
 // B2DXFitters includes
 #include "B2DXFitters/FitMeTool.h"
+#include "B2DXFitters/PartitionedNLL.h"
 
 
 //=============================================================================
@@ -65,6 +75,7 @@ void FitMeTool::initialiseDataMembers()
   m_config_seed               = -1;
   m_config_seedSet            = false;
   m_config_saveFitResult2File = false;
+  m_config_categoryWorkers    = 0;
   
   // Initialise relevant variables
   m_observables = NULL;
@@ -226,7 +237,10 @@ void FitMeTool::fit( bool save2file,
   cmdArgs.Add(const_cast<RooCmdArg*>(&arg5));
   cmdArgs.Add(const_cast<RooCmdArg*>(&arg6));
   cmdArgs.Add(const_cast<RooCmdArg*>(&arg7));
-  m_fitResult = m_modelPDF -> fitTo(*m_data, cmdArgs);
+  if ( m_config_categoryWorkers > 1 )
+    m_fitResult = fitCategoryParallel( cmdArgs );
+  else
+    m_fitResult = m_modelPDF -> fitTo(*m_data, cmdArgs);
   //if ( m_fitResult ) m_fitResult -> Print( "v" );
   //std::cout << "FIT ERRORS!" << std::endl;
   //std::cout << m_modelPDF->find("deltaMs_ub")->getVal() << " +- " << m_modelPDF->find("deltaMs_ub")->getError() << std::endl;
@@ -255,6 +269,204 @@ RooFitResult* FitMeTool::getFitResult()
   return m_fitResult;
 }
 
+//=============================================================================
+// Set the number of worker processes for category parallel fits (public)
+//=============================================================================
+void FitMeTool::setCategoryParallelFit( int nWorkers )
+{
+  if ( m_config_debug )
+    printf( "==> FitMeTool::setCategoryParallelFit( nWorkers=%d )\n", nWorkers );
+  
+  m_config_categoryWorkers = nWorkers;
+}
+
+//=============================================================================
+// Fit with the NLL partitioned by category of the simultaneous model PDF,
+// each partition evaluated in a persistent worker process (protected)
+//
+// The per-category NLLs are built with the NLL options of the fit (Extended,
+// ConditionalObservables, Range, Offset, ...), and timed on the initial
+// parameter values; categories are then assigned to partitions, most
+// expensive first, always to the partition with the least total cost so
+// far. Constraint terms are added once, in the calling process.
+//=============================================================================
+RooFitResult* FitMeTool::fitCategoryParallel( const RooLinkedList& cmdArgs )
+{
+  if ( m_config_debug )
+    printf( "==> FitMeTool::fitCategoryParallel()\n" );
+  
+  RooSimultaneous* simPDF = dynamic_cast<RooSimultaneous*>( m_modelPDF );
+  if ( ! simPDF ) {
+    printf( "[WARNING] Category parallel fit needs a RooSimultaneous model PDF, using a plain fit.\n" );
+    return m_modelPDF -> fitTo( *m_data, const_cast<RooLinkedList&>( cmdArgs ) );
+  }
+  
+  // Fit options
+  // -----------
+  RooCmdConfig pc( "FitMeTool::fitCategoryParallel" );
+  pc.defineInt( "optConst", "Optimize", 0, 2 );
+  pc.defineInt( "verbose", "Verbose", 0, 0 );
+  pc.defineInt( "doTimer", "Timer", 0, 0 );
+  pc.defineInt( "plevel", "PrintLevel", 0, 1 );
+  pc.defineInt( "strategy", "Strategy", 0, 1 );
+  pc.defineInt( "initHesse", "InitialHesse", 0, 0 );
+  pc.defineInt( "hesse", "Hesse", 0, 1 );
+  pc.defineInt( "minos", "Minos", 0, 0 );
+  pc.defineObject( "minosSet", "Minos", 0, 0 );
+  pc.defineString( "mintype", "Minimizer", 0, "Minuit" );
+  pc.defineString( "minalg", "Minimizer", 1, "migrad" );
+  pc.defineInt( "sumw2", "SumW2Error", 0, -1 );
+  pc.defineSet( "cPars", "Constrain", 0, 0 );
+  pc.defineSet( "extCons", "ExternalConstraints", 0, 0 );
+  pc.allowUndefined();
+  pc.process( cmdArgs );
+  if ( -1 != pc.getInt( "sumw2" ) )
+    printf( "[WARNING] SumW2Error is not supported in category parallel fits, ignored.\n" );
+  std::string minType( pc.getString( "mintype", "Minuit" ) );
+  if ( "OldMinuit" == minType ) minType = "Minuit";
+  
+  // Options for the per-category NLLs: constraints are added once below,
+  // and NumCPU would fork on top of the category workers
+  const char* nllArgNames[] = { "ProjectedObservables", "Extended", "Range",
+                                "RangeWithName", "SumCoefRange", "SplitRange",
+                                "CloneData", "OffsetLikelihood",
+                                "GlobalObservables", 0 };
+  RooArgSet noConstraints;
+  RooCmdArg noConstraintsArg = RooFit::Constrain( noConstraints );
+  RooLinkedList nllArgs;
+  TIterator* ait = cmdArgs.MakeIterator();
+  while ( RooCmdArg* arg = dynamic_cast<RooCmdArg*>( ait -> Next() ) ) {
+    for ( int i = 0; nllArgNames[i]; ++i ) {
+      if ( std::string( nllArgNames[i] ) == arg -> GetName() ) {
+        nllArgs.Add( arg );
+        break;
+      }
+    }
+  }
+  delete ait;
+  nllArgs.Add( &noConstraintsArg );
+  
+  // Constraint terms (internal and external), once for the whole model
+  // ------------------------------------------------------------------
+  RooArgSet* params = m_modelPDF -> getParameters( *m_data );
+  const RooArgSet* cPars = pc.getSet( "cPars" );
+  RooArgSet* constraints = m_modelPDF -> getAllConstraints( *m_data -> get(),
+      cPars ? *const_cast<RooArgSet*>( cPars ) : *params, cPars ? kFALSE : kTRUE );
+  const RooArgSet* extCons = pc.getSet( "extCons" );
+  if ( extCons ) constraints -> add( *extCons );
+  RooConstraintSum* constraintSum = NULL;
+  if ( constraints -> getSize() > 0 )
+    constraintSum = new RooConstraintSum( "nll_constraints", "nll_constraints",
+                                          *constraints, *params );
+  
+  // Per-category NLLs and their evaluation cost
+  // -------------------------------------------
+  const int nTimingEvals = 3;
+  TList* slices = m_data -> split( simPDF -> indexCat(), kTRUE );
+  std::vector<RooAbsReal*> catNLLs;
+  std::vector<std::string> catNames;
+  std::vector<double> catCosts;
+  TIterator* sit = slices -> MakeIterator();
+  while ( RooAbsData* slice = dynamic_cast<RooAbsData*>( sit -> Next() ) ) {
+    RooAbsPdf* catPDF = simPDF -> getPdf( slice -> GetName() );
+    if ( ! catPDF ) continue;
+    RooAbsReal* nll = catPDF -> createNLL( *slice, nllArgs );
+    nll -> SetName( ( std::string( "nll_" ) + slice -> GetName() ).c_str() );
+    // first evaluation fills caches (normalisation integrals, ...)
+    nll -> getVal();
+    TStopwatch sw;
+    sw.Start();
+    for ( int i = 0; i < nTimingEvals; ++i ) {
+      nll -> setValueDirty();
+      nll -> getVal();
+    }
+    sw.Stop();
+    catNLLs.push_back( nll );
+    catNames.push_back( slice -> GetName() );
+    catCosts.push_back( sw.CpuTime() / nTimingEvals );
+  }
+  delete sit;
+  
+  // Balance categories over partitions (longest processing time first)
+  // -------------------------------------------------------------------
+  const unsigned nParts = std::min( unsigned( m_config_categoryWorkers ),
+                                    unsigned( catNLLs.size() ) );
+  std::vector<unsigned> order( catNLLs.size() );
+  for ( unsigned i = 0; i < order.size(); ++i ) order[i] = i;
+  std::sort( order.begin(), order.end(),
+             [&catCosts] ( unsigned a, unsigned b ) { return catCosts[a] > catCosts[b]; } );
+  std::vector<double> partCosts( nParts, 0. );
+  std::vector<std::vector<unsigned> > parts( nParts );
+  for ( unsigned i = 0; i < order.size(); ++i ) {
+    const unsigned p = std::min_element( partCosts.begin(), partCosts.end() ) - partCosts.begin();
+    parts[p].push_back( order[i] );
+    partCosts[p] += catCosts[order[i]];
+  }
+  
+  printf( "[INFO] Category parallel fit: %u categories in %u worker processes\n",
+          unsigned( catNLLs.size() ), nParts );
+  std::vector<RooAddition*> partSums;
+  std::vector<RooRealMPFE*> partMPFEs;
+  RooArgList terms;
+  for ( unsigned p = 0; p < nParts; ++p ) {
+    printf( "[INFO]   worker %2u: %8.4f s/evaluation:", p, partCosts[p] );
+    RooArgList partNLLs;
+    for ( unsigned i = 0; i < parts[p].size(); ++i ) {
+      partNLLs.add( *catNLLs[parts[p][i]] );
+      printf( " %s", catNames[parts[p][i]].c_str() );
+    }
+    printf( "\n" );
+    std::ostringstream name;
+    name << "nll_partition" << p;
+    partSums.push_back( new RooAddition( name.str().c_str(), name.str().c_str(), partNLLs ) );
+    name << "_mpfe";
+    partMPFEs.push_back( new RooRealMPFE( name.str().c_str(), name.str().c_str(),
+                                          *partSums.back(), kFALSE ) );
+    terms.add( *partMPFEs.back() );
+  }
+  if ( constraintSum ) terms.add( *constraintSum );
+  
+  // Minimise the sum of the partial NLLs
+  // ------------------------------------
+  RooFitResult* result = NULL;
+  {
+    PartitionedNLL nll( "nll_partitioned", "nll_partitioned", terms );
+    RooMinimizer m( nll );
+    m.setMinimizerType( minType.c_str() );
+    m.setPrintLevel( pc.getInt( "plevel" ) );
+    m.setStrategy( pc.getInt( "strategy" ) );
+    m.setVerbose( pc.getInt( "verbose" ) );
+    m.setProfile( pc.getInt( "doTimer" ) );
+    m.optimizeConst( pc.getInt( "optConst" ) );
+    if ( pc.getInt( "initHesse" ) ) m.hesse();
+    m.minimize( minType.c_str(), pc.getString( "minalg", "migrad" ) );
+    if ( pc.getInt( "hesse" ) ) m.hesse();
+    if ( pc.getInt( "minos" ) ) {
+      const RooArgSet* minosSet = static_cast<const RooArgSet*>( pc.getObject( "minosSet" ) );
+      if ( minosSet ) m.minos( *minosSet );
+      else m.minos();
+    }
+    std::string resultName = std::string( "fitresult_" ) + m_modelPDF -> GetName() +
+      "_" + m_data -> GetName();
+    result = m.save( resultName.c_str(), resultName.c_str() );
+  }
+  
+  // Clean up (deleting the RooRealMPFEs terminates the worker processes)
+  // ---------------------------------------------------------------------
+  for ( unsigned p = 0; p < nParts; ++p ) {
+    delete partMPFEs[p];
+    delete partSums[p];
+  }
+  for ( unsigned i = 0; i < catNLLs.size(); ++i ) delete catNLLs[i];
+  delete constraintSum;
+  delete constraints;
+  delete params;
+  slices -> Delete();
+  delete slices;
+  
+  return result;
+}
+
 //=============================================================================
 // Set debugging mode on/off (public)
 //=============================================================================
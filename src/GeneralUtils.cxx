@@ -16,6 +16,8 @@
 #include <stdexcept>
 #include <cmath>
 #include <utility>
+#include <map>
+#include <cstdlib>
 
 // ROOT and RooFit includes
 #include "TH1D.h"
@@ -52,6 +54,14 @@
 #include "RooArgList.h"
 #include "RooConstVar.h"
 #include "TObjArray.h"
+#include "TLeaf.h"
+#include "TTreeFormula.h"
+#include "TChain.h"
+#include "TTreeCache.h"
+#include "TObjString.h"
+#include "TSystem.h"
+#include "TEnv.h"
+#include "TMD5.h"
  
 // B2DXFitters includes
 #include "B2DXFitters/GeneralUtils.h"
@@ -459,23 +469,19 @@ namespace GeneralUtils {
     if ( debug == true) std::cout<<"[INFO] ==> GeneralUtils::ReadTreeData(...). Read TTree from FileName"<<std::endl;
     
     int i=sample;
-    std::string name[5];
 
-    TFile* file = NULL;
-    TTree* tree = NULL;
-
-   
-    name[0] = FileName[0]+FileName[i+1];
-    if ( debug == true) std::cout<<"[INFO] file to open "<<name[0]<<std::endl; 
-
-    file = TFile::Open(name[0].c_str());
-    tree = (TTree*) file->Get(FileName[i+3].c_str());
-    
-    if ( debug == true){
-      std::cout<<"[INFO] file content:"<<std::endl;
-      file->ls();
-      std::cout<<"[INFO] tree to read "<<FileName[i+3].c_str()<<std::endl;
+    std::vector <TString> names;
+    TString list = FileName[i+1].c_str();
+    TObjArray* tokens = list.Tokenize(",");
+    for ( Int_t k = 0; k < tokens->GetEntries(); k++ )
+    {
+      TString name = ((TObjString*)tokens->At(k))->GetString().Strip(TString::kBoth);
+      if ( name != "" ) { names.push_back(FileName[0]+name); }
     }
+    delete tokens;
+    if ( debug == true) std::cout<<"[INFO] file(s) to open "<<FileName[0]+FileName[i+1]<<std::endl; 
+
+    TTree* tree = OpenTreeChain(names, FileName[i+3].c_str(), debug);
     
     if  ( tree ==  NULL ) {
       std::cout<<" Cannot open file: "<<FileName[0]+FileName[i+1]<<std::endl;
@@ -484,7 +490,6 @@ namespace GeneralUtils {
     else {  
       if ( debug == true)
       {
-        //std::cout<<"Open file: "<<FileName[0]+FileName[i+1]<<std::endl;
         std::cout<<"[INFO] with Tree: "<<tree->GetName()<<std::endl;
         std::cout<<"----------------------------------------------------------"<<std::endl;
       }
@@ -503,10 +508,8 @@ namespace GeneralUtils {
   {
     if ( debug == true) std::cout<<"[INFO] ==> GeneralUtils::ReadTreeMC(...). Read Tree from MC"<<std::endl;
 
-    TFile* file = NULL;
-    TTree* tree = NULL;
-    file = TFile::Open(fileName);
-    tree = (TTree*) file->Get(treeName);
+    std::vector <TString> names(1, TString(fileName));
+    TTree* tree = OpenTreeChain(names, treeName, debug);
 
     if ( tree != NULL ){ 
       if ( debug == true)
@@ -520,6 +523,130 @@ namespace GeneralUtils {
     else { if ( debug == true) std::cout<<"Cannot open MCFile"<<std::endl; return NULL;}
   }
 
+  //===========================================================================
+  // TChain based reading with TTreeCache, prefetching and local staging
+  //===========================================================================
+  namespace {
+    TString s_stagingDir = std::getenv("B2DXFITTERS_STAGING_DIR") ? std::getenv("B2DXFITTERS_STAGING_DIR") : "";
+    Long64_t s_cacheSize = 32*1024*1024;
+    bool s_asyncPrefetch = true;
+    // bytes read (TFile::GetFileBytesRead) and time (ms) when a chain was
+    // opened in debug mode, until PrintTreeIOStatistics reports it
+    std::map <const TTree*, std::pair <Long64_t, Long64_t> > s_ioStart;
+
+    // return path of the staged copy of fileName (copying it if needed), or
+    // fileName itself if staging is off or not possible
+    TString StageFile(const TString& fileName, bool debug)
+    {
+      if ( s_stagingDir == "" || fileName.Contains("://") || fileName.MaybeWildcard() ) { return fileName; }
+      FileStat_t st;
+      if ( gSystem->GetPathInfo(fileName.Data(), st) != 0 ) { return fileName; }
+      TString id = Form("%s:%lld:%ld", fileName.Data(), st.fSize, st.fMtime);
+      TMD5 md5;
+      md5.Update((const UChar_t*) id.Data(), id.Length());
+      md5.Final();
+      TString staged = s_stagingDir + "/" + md5.AsString() + "_" + gSystem->BaseName(fileName.Data());
+      FileStat_t stStaged;
+      if ( gSystem->GetPathInfo(staged.Data(), stStaged) == 0 && stStaged.fSize == st.fSize )
+      {
+        if ( debug == true ) { std::cout<<"[INFO] Using staged copy "<<staged<<" of "<<fileName<<std::endl; }
+        return staged;
+      }
+      gSystem->mkdir(s_stagingDir.Data(), kTRUE);
+      TString tmp = staged + Form(".tmp%d", gSystem->GetPid());
+      if ( debug == true ) { std::cout<<"[INFO] Staging "<<fileName<<" to "<<staged<<std::endl; }
+      if ( !TFile::Cp(fileName.Data(), tmp.Data(), kFALSE) || gSystem->Rename(tmp.Data(), staged.Data()) != 0 )
+      {
+        std::cout<<"[WARNING] GeneralUtils::StageFile(...): cannot stage "<<fileName<<", reading it directly"<<std::endl;
+        gSystem->Unlink(tmp.Data());
+        return fileName;
+      }
+      return staged;
+    }
+  }
+
+  void ConfigureTreeReading(TString stagingDir, Long64_t cacheSize, bool asyncPrefetch)
+  {
+    s_stagingDir = stagingDir;
+    s_cacheSize = cacheSize;
+    s_asyncPrefetch = asyncPrefetch;
+  }
+
+  TChain* OpenTreeChain(std::vector <TString> &fileNames, const char* treeName, bool debug)
+  {
+    if ( debug == true) std::cout<<"[INFO] ==> GeneralUtils::OpenTreeChain(...). Open "<<treeName<<" from "<<fileNames.size()<<" file(s)"<<std::endl;
+
+    // has to be set before the files are opened
+    if ( s_asyncPrefetch == true ) { gEnv->SetValue("TFile.AsyncPrefetching", 1); }
+
+    Long64_t bytesStart = TFile::GetFileBytesRead();
+    Long64_t timeStart = (Long64_t) gSystem->Now();
+
+    TChain* chain = new TChain(treeName, treeName);
+    Int_t nfiles = 0;
+    for ( unsigned int i = 0; i < fileNames.size(); i++ )
+    {
+      TString name = StageFile(fileNames[i], debug);
+      // nentries = 0: connect the file(s) now, so missing trees are noticed
+      Int_t added = chain->Add(name.Data(), 0);
+      if ( added == 0 )
+      {
+        std::cout<<"[ERROR] GeneralUtils::OpenTreeChain(...): no tree "<<treeName<<" in "<<name<<std::endl;
+      }
+      nfiles += added;
+    }
+    if ( nfiles == 0 )
+    {
+      delete chain;
+      return NULL;
+    }
+
+    if ( s_cacheSize > 0 )
+    {
+      chain->SetCacheSize(s_cacheSize);
+      chain->SetCacheLearnEntries(100);
+    }
+    // only debug runs report I/O statistics (which erases the entry again)
+    if ( debug == true ) { s_ioStart[chain] = std::make_pair(bytesStart, timeStart); }
+
+    if ( debug == true)
+    {
+      std::cout<<"[INFO] Chain of "<<nfiles<<" file(s), "<<chain->GetEntries()<<" entries, cache size "<<s_cacheSize
+               <<" bytes, asynchronous prefetching "<<(s_asyncPrefetch ? "on" : "off")<<std::endl;
+      if ( s_stagingDir != "" ) { std::cout<<"[INFO] Staging directory: "<<s_stagingDir<<std::endl; }
+    }
+    return chain;
+  }
+
+  void PrintTreeIOStatistics(TTree* tree)
+  {
+    if ( tree == NULL ) { return; }
+    Long64_t bytes = TFile::GetFileBytesRead();
+    Double_t wall = 0;
+    // the entry is erased once reported, so the map does not grow with every
+    // chain opened (and a new chain at the same address starts afresh)
+    bool timed = false;
+    std::map <const TTree*, std::pair <Long64_t, Long64_t> >::iterator it = s_ioStart.find(tree);
+    if ( it != s_ioStart.end() )
+    {
+      bytes -= it->second.first;
+      wall = ((Long64_t) gSystem->Now() - it->second.second) / 1000.;
+      timed = true;
+      s_ioStart.erase(it);
+    }
+    TTreeCache* cache = NULL;
+    TFile* file = tree->GetCurrentFile();
+    if ( file != NULL )
+    {
+      cache = dynamic_cast<TTreeCache*>(file->GetCacheRead(tree));
+      if ( cache == NULL ) { cache = dynamic_cast<TTreeCache*>(file->GetCacheRead(tree->GetTree())); }
+    }
+    std::cout<<"[INFO] I/O statistics for "<<tree->GetName()<<": "<<bytes/(1024.*1024.)<<" MB read";
+    if ( cache != NULL ) { std::cout<<", cache hit rate "<<100.*cache->GetEfficiency()<<"%"; }
+    if ( timed == true ) { std::cout<<", wall time "<<wall<<" s"; }
+    std::cout<<std::endl;
+  }
+
   //===========================================================================
   // Read one name (mode) for MC2011-March  
   // if the path to the MC file: /afs/cern.ch/project/lbcern/vol0/adudziak/MCAddBDTG/Merged_Bd2DstPi_Dst2D-Pi0_MD_BsHypo_BDTG.root then
@@ -834,6 +961,90 @@ namespace GeneralUtils {
     else { if ( debug == true) std::cout<<" Cannot cut tree "<<std::endl; return NULL; }
   }
 
+  //===========================================================================
+  // Prepare tree for a single, selective pass: enable only the branches
+  // needed for varNames and the cut, set up TTreeCache for them, and
+  // compile the cut
+  //==========================================================================
+  TTreeFormula* PrepareTreeReading(TTree* tree,
+                                   std::vector <TString> &varNames,
+                                   TCut &cut,
+                                   Long64_t cacheSize,
+                                   bool debug)
+  {
+    if ( debug == true) std::cout<<"[INFO] ==> GeneralUtils::PrepareTreeReading(...)"<<std::endl;
+
+    TTreeFormula* selection = NULL;
+    TString cutString = cut.GetTitle();
+    if ( cutString.Strip(TString::kBoth) != "" )
+    {
+      // chains need a tree loaded to compile the formula
+      tree->LoadTree(0);
+      selection = new TTreeFormula("selection", cutString.Data(), tree);
+      if ( selection->GetNdim() == 0 )
+      {
+        std::cout<<"[ERROR] GeneralUtils::PrepareTreeReading(...): cannot compile cut "<<cutString<<std::endl;
+        delete selection;
+        throw std::runtime_error("GeneralUtils::PrepareTreeReading: invalid cut");
+      }
+    }
+
+    // collect branches we need
+    std::vector <TString> branches;
+    for ( unsigned int i = 0; i < varNames.size(); i++ )
+    {
+      if ( varNames[i] == "" ) { continue; }
+      TLeaf* leaf = tree->GetLeaf(varNames[i].Data());
+      if ( leaf == NULL )
+      {
+        std::cout<<"[ERROR] GeneralUtils::PrepareTreeReading(...): no leaf "<<varNames[i]<<" in tree "<<tree->GetName()<<std::endl;
+        continue;
+      }
+      branches.push_back(leaf->GetBranch()->GetName());
+    }
+    if ( selection != NULL )
+    {
+      for ( Int_t i = 0; i < selection->GetNcodes(); i++ )
+      {
+        TLeaf* leaf = selection->GetLeaf(i);
+        if ( leaf != NULL ) { branches.push_back(leaf->GetBranch()->GetName()); }
+      }
+    }
+
+    tree->SetBranchStatus("*", 0);
+    tree->SetCacheSize(cacheSize);
+    for ( unsigned int i = 0; i < branches.size(); i++ )
+    {
+      tree->SetBranchStatus(branches[i].Data(), 1);
+      if ( cacheSize > 0 ) { tree->AddBranchToCache(branches[i].Data(), kTRUE); }
+    }
+    if ( cacheSize > 0 ) { tree->StopCacheLearningPhase(); }
+    if ( selection != NULL ) { selection->UpdateFormulaLeaves(); }
+
+    if ( debug == true )
+    {
+      std::cout<<"[INFO] Reading "<<branches.size()<<" (not necessarily distinct) branches of "
+               <<tree->GetListOfBranches()->GetEntries()<<" in tree "<<tree->GetName()<<std::endl;
+      std::cout<<"[INFO] Selection: "<<cutString<<std::endl;
+    }
+    return selection;
+  }
+
+  bool PassTreeCut(TTree* tree, TTreeFormula* selection, Long64_t entry)
+  {
+    Int_t treeNumber = tree->GetTreeNumber();
+    if ( tree->LoadTree(entry) < 0 ) { return false; }
+    if ( selection == NULL ) { return true; }
+    // chains: leaves move when the next file is opened
+    if ( tree->GetTreeNumber() != treeNumber ) { selection->UpdateFormulaLeaves(); }
+    Int_t ndata = selection->GetNdata();
+    for ( Int_t i = 0; i < ndata; i++ )
+    {
+      if ( selection->EvalInstance(i) != 0 ) { return true; }
+    }
+    return false;
+  }
+
   //===========================================================================
   // Create RooKeysPdf for dataSetMC with observable massMC. 
   // Sample and mode are used to create the name of RooKeysPdf.   
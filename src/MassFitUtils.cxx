@@ -44,6 +44,7 @@
 #include "RooBinning.h"
 #include "RooAbsArg.h"
 #include "TLeaf.h"
+#include "TTreeFormula.h"
 #include "TStyle.h"
 #include "RooRealVar.h"
 
@@ -287,8 +288,10 @@ Double_t SetValCatObs(MDFitterSettings* mdSet, RooArgSet* obs,
       TString name = "dataSet"+mode+"_"+smp[i]+"_"+md[i]+y[i]+h[i];
       dataSet[i] = new RooDataSet(name.Data(),name.Data(), *obs);
       
-      TTree* treetmp=NULL;
-      treetmp = TreeCut(tree[i],All_cut,smp[i],mode, debug);
+      // single pass over the input tree: only the branches we need are
+      // read, and the selection is evaluated on the fly
+      TTree* treetmp = tree[i];
+      TTreeFormula* selection = PrepareTreeReading(treetmp, tN, All_cut, 32*1024*1024, debug);
       
       std::vector <TString> tB; 		
       std::vector <Double_t> varD; std::vector <Int_t> varI; std::vector <Float_t> varF; std::vector <Short_t> varS;  
@@ -305,14 +308,61 @@ Double_t SetValCatObs(MDFitterSettings* mdSet, RooArgSet* obs,
       {
         SetBranchAddress(treetmp, tB[k], tN[k], varD[k], varI[k], varF[k], varS[k], debug);
       }
+
+      // work out once what to do with each variable (the per-event string
+      // comparisons used to dominate the run time)
+      enum { kOther = 0, kTime, kPIDK, kLog, kMass, kID, kTag };
+      const Float_t c = 299792458.0;
+      const Float_t corr = c/1e9;
+      std::vector <Int_t> role(tN.size(), kOther);
+      std::vector <Bool_t> isCat(tN.size(), false);
+      std::vector <RooRealVar*> realObs(tN.size(), (RooRealVar*)NULL);
+      std::vector <RooCategory*> catObs(tN.size(), (RooCategory*)NULL);
+      Int_t kMom = -1, kTrMom = -1; 
+      for(unsigned k = 0; k < tN.size(); k++)
+      {
+        if ( tN[k] == mdSet->GetIDVar() ) { isCat[k] = true; }
+        if(  mdSet->CheckTagVar() == true )
+        {
+          for(int m = 0; m<mdSet->GetNumTagVar(); m++)
+          {
+            if ( tN[k] ==  mdSet->GetTagVar(m) )
+            {
+              isCat[k] = true;
+              break;
+            }
+          }
+        }
+        if ( tN[k] == mdSet->GetMomVar() ) { kMom = k; }
+        if ( tN[k] == mdSet->GetTrMomVar() ) { kTrMom = k; }
+        TString name = mdSet->GetVarOutName(tN[k]); 
+        if ( name == "" ) { continue; }
+        if ( isCat[k] == true )
+        {
+          catObs[k] = (RooCategory*)obs->find(name.Data());
+          role[k] = ( name == mdSet->GetIDVarOutName() ) ? kID : kTag;
+        }
+        else
+        {
+          realObs[k] = (RooRealVar*)obs->find(name.Data());
+          if ( name == mdSet->GetTimeVarOutName() || name == mdSet->GetTerrVarOutName() ) { role[k] = kTime; }
+          else if ( name == mdSet->GetPIDKVarOutName() ) { role[k] = kPIDK; }
+          else if ( name == mdSet->GetTracksVarOutName() || name == mdSet->GetMomVarOutName() || name == mdSet->GetTrMomVarOutName() ) { role[k] = kLog; }
+          else if ( name == mdSet->GetMassBVarOutName() || name == mdSet->GetMassDVarOutName() ) { role[k] = kMass; }
+        }
+      }
       //Bool_t Twotopo, Threetopo, Fourtopo; 
 
       //treetmp->SetBranchAddress("lab0_Hlt2Topo2BodyBBDTDecision_TOS",    &Twotopo);
       //treetmp->SetBranchAddress("lab0_Hlt2Topo3BodyBBDTDecision_TOS",    &Threetopo);
       //treetmp->SetBranchAddress("lab0_Hlt2Topo4BodyBBDTDecision_TOS",    &Fourtopo);
 
-      for (Long64_t jentry=0; jentry<treetmp->GetEntries(); jentry++) {
+      Long64_t nEntries = treetmp->GetEntries();
+      Long64_t nSelected = 0; 
+      for (Long64_t jentry=0; jentry<nEntries; jentry++) {
+        if ( PassTreeCut(treetmp, selection, jentry) == false ) { continue; }
         treetmp->GetEntry(jentry);
+        nSelected++;
 
 	Double_t pT(0), p(0);
 	Double_t pl(0), eta(0);
@@ -324,25 +374,35 @@ Double_t SetValCatObs(MDFitterSettings* mdSet, RooArgSet* obs,
           //Threebody_TOS->setVal(Threetopo);
           //Fourbody_TOS->setVal(Fourtopo); 
           
-          Bool_t cat = false;
-          if ( tN[k] == mdSet->GetIDVar() ) { cat = true; }
-          if(  mdSet->CheckTagVar() == true )                                                                                                                                       
-          {                                                                                                                                                                       
-            for(int m = 0; m<mdSet->GetNumTagVar(); m++)                                                                                                                          
-            {                                                               
-              if ( tN[k] ==  mdSet->GetTagVar(m) ) 
+          Double_t v = GetValue(tB[k], varD[k], varI[k], varF[k], varS[k]);
+          if ( isCat[k] == true )
+          {
+            if ( role[k] == kID ) { catObs[k]->setIndex( v > 0 ? 1 : -1 ); }
+            else if ( role[k] == kTag ) 
+            {
+              if ( v > 0.1) { catObs[k]->setIndex(1); }
+              else if ( v < -0.1) { catObs[k]->setIndex(-1); }
+              else { catObs[k]->setIndex(0); } 
+            }
+          }
+          else
+          {
+            val = v; 
+            if ( realObs[k] != NULL ) 
+            {
+              switch ( role[k] )
               {
-                cat = true;
-                break;
+                case kTime: val = val/corr; break;
+                case kPIDK: val = log(fabs(val)); break;
+                case kLog:  val = log(val); break;
+                default: break; 
               }
+              realObs[k]->setVal(val);
             }
           }
-          TString name = mdSet->GetVarOutName(tN[k]); 
-          if ( cat == true ) { SetValCatObs(mdSet, obs, name , tB[k], varD[k], varI[k], varF[k], varS[k]); }
-          else{ val = SetValRealObs(mdSet, obs, name, tB[k], varD[k], varI[k], varF[k], varS[k], mode); }
 
-	  if ( tN[k] == mdSet->GetMomVar() ) { p = val; }
-          if ( tN[k] == mdSet->GetTrMomVar() ) { pT = val; }
+	  if ( (Int_t)k == kMom ) { p = val; }
+          if ( (Int_t)k == kTrMom ) { pT = val; }
 
         }
 
@@ -352,7 +412,7 @@ Double_t SetValCatObs(MDFitterSettings* mdSet, RooArgSet* obs,
 
         if ( mode.Contains("Comb") == true )
         {
-          if ( jentry < 10000 )
+          if ( nSelected <= 10000 )
           {
             dataSet[i]->add(*obs);
           }
@@ -362,6 +422,15 @@ Double_t SetValCatObs(MDFitterSettings* mdSet, RooArgSet* obs,
           dataSet[i]->add(*obs);
         }
       }
+      treetmp->ResetBranchAddresses();
+      treetmp->SetBranchStatus("*", 1);
+      if ( selection != NULL ) { delete selection; }
+      if ( debug == true )
+      {
+        Double_t eff = nEntries > 0 ? (Double_t)nSelected/nEntries*100 : 0.;
+        std::cout<<mode<<" Old tree: "<< nEntries <<" selected: "<<nSelected<<" eff: "<<eff<<"%"<<std::endl;
+        PrintTreeIOStatistics(treetmp);
+      }
       
       if ( debug == true)
       {
@@ -0,0 +1,47 @@
+/**
+ * @file PartitionedNLL.cxx
+ *
+ * sum of partial NLLs evaluated concurrently in worker processes
+ */
+
+#include "RooRealMPFE.h"
+
+#include "B2DXFitters/PartitionedNLL.h"
+
+PartitionedNLL::PartitionedNLL(const char *name, const char *title,
+	const RooArgList& terms) :
+    RooAbsReal(name,title),
+    _terms("terms","terms",this)
+{
+    _terms.add(terms);
+}
+
+PartitionedNLL::PartitionedNLL(const PartitionedNLL& other, const char* name) :
+    RooAbsReal(other,name),
+    _terms("terms",this,other._terms)
+{
+}
+
+PartitionedNLL::~PartitionedNLL() { }
+
+Double_t PartitionedNLL::evaluate() const
+{
+    // first dispatch: send new parameter values to all workers whose inputs
+    // changed, and start their calculation
+    RooFIter it = _terms.fwdIterator();
+    while (RooAbsArg* arg = it.next()) {
+	RooRealMPFE* mpfe = dynamic_cast<RooRealMPFE*>(arg);
+	if (mpfe && mpfe->isValueDirty()) mpfe->calculate();
+    }
+    // then evaluate the local terms while the workers are busy, and finally
+    // collect the workers' results
+    Double_t sum = 0.;
+    for (int pass = 0; pass < 2; ++pass) {
+	it = _terms.fwdIterator();
+	while (RooAbsArg* arg = it.next()) {
+	    if ((0 == pass) == (0 != dynamic_cast<RooRealMPFE*>(arg))) continue;
+	    sum += static_cast<RooAbsReal*>(arg)->getVal();
+	}
+    }
+    return sum;
+}
@@ -0,0 +1,249 @@
+/**
+ * @file RooBDecayEnvelopeGenContext.cxx
+ *
+ * fast generator context for RooBDecay based decay time pdfs with tagging,
+ * Gaussian resolution and an (unbinned) acceptance
+ */
+#include <cmath>
+#include <algorithm>
+#include <iostream>
+
+#include "TIterator.h"
+#include "TRandom.h"
+#include "RooMsgService.h"
+#include "RooAbsPdf.h"
+#include "RooAbsReal.h"
+#include "RooAbsCategoryLValue.h"
+#include "RooCatType.h"
+#include "RooRealVar.h"
+#include "RooDataSet.h"
+#include "RooRandom.h"
+
+#include "B2DXFitters/RooBDecayEnvelopeGenContext.h"
+
+RooBDecayEnvelopeGenContext::RooBDecayEnvelopeGenContext(
+	const RooAbsPdf& model, const RooArgSet& vars, const RooRealVar& time,
+	const RooAbsReal& tau, const RooAbsReal& dgamma, const RooAbsReal& dm,
+	const RooAbsReal& fcosh, const RooAbsReal& fsinh,
+	const RooAbsReal& fcos, const RooAbsReal& fsin,
+	const RooArgList& sigmas, const RooArgList& fractions,
+	const RooAbsReal& bias, const RooAbsReal& scale,
+	const RooAbsReal* acceptance, const RooDataSet* prototype,
+	Bool_t verbose) :
+    RooAbsGenContext(model, vars, prototype, 0, verbose),
+    _cloneSet(0), _sigmaList(sigmas), _fracList(fractions),
+    _timeName(time.GetName()), _tauName(tau.GetName()),
+    _dgammaName(dgamma.GetName()), _dmName(dm.GetName()),
+    _biasName(bias.GetName()), _scaleName(scale.GetName()),
+    _accName(acceptance ? acceptance->GetName() : ""),
+    _t(0), _acc(0), _bias(0), _scale(0),
+    _gamma(0.), _dgamma(0.), _dm(0.), _gammaMin(0.), _accMax(1.),
+    _nTrials(0)
+{
+    _coeffNames[0] = fcosh.GetName();
+    _coeffNames[1] = fsinh.GetName();
+    _coeffNames[2] = fcos.GetName();
+    _coeffNames[3] = fsin.GetName();
+    for (unsigned i = 0; i < 4; ++i) _coeff[i] = 0;
+    if (sigmas.getSize() && fractions.getSize() + 1 != sigmas.getSize()) {
+	coutE(Generation) << "RooBDecayEnvelopeGenContext(" << GetName() <<
+	    "): need " << sigmas.getSize() - 1 << " resolution fractions, got " <<
+	    fractions.getSize() << std::endl;
+	_isValid = kFALSE;
+    }
+    _inputs.add(tau, kTRUE);
+    _inputs.add(dgamma, kTRUE);
+    _inputs.add(dm, kTRUE);
+    _inputs.add(fcosh, kTRUE);
+    _inputs.add(fsinh, kTRUE);
+    _inputs.add(fcos, kTRUE);
+    _inputs.add(fsin, kTRUE);
+    _inputs.add(bias, kTRUE);
+    _inputs.add(scale, kTRUE);
+    _inputs.add(sigmas, kTRUE);
+    _inputs.add(fractions, kTRUE);
+    if (acceptance) _inputs.add(*acceptance, kTRUE);
+}
+
+RooBDecayEnvelopeGenContext::~RooBDecayEnvelopeGenContext()
+{ delete _cloneSet; }
+
+RooAbsReal* RooBDecayEnvelopeGenContext::attached(
+	const RooArgSet& theEvent, const RooAbsArg& arg) const
+{
+    RooAbsArg* a = theEvent.find(arg.GetName());
+    if (!a) a = _cloneSet->find(arg.GetName());
+    return dynamic_cast<RooAbsReal*>(a);
+}
+
+void RooBDecayEnvelopeGenContext::initGenerator(const RooArgSet& theEvent)
+{
+    // clone the inputs, and attach the clones to the event buffer
+    delete _cloneSet;
+    _cloneSet = (RooArgSet*) _inputs.snapshot(kTRUE);
+    {
+	TIterator* it = _cloneSet->createIterator();
+	for (RooAbsArg* arg = (RooAbsArg*) it->Next(); arg;
+		arg = (RooAbsArg*) it->Next())
+	    arg->recursiveRedirectServers(theEvent, kFALSE);
+	delete it;
+    }
+    _t = dynamic_cast<RooRealVar*>(theEvent.find(_timeName));
+    if (!_t) {
+	coutE(Generation) << "RooBDecayEnvelopeGenContext(" << GetName() <<
+	    "): decay time " << _timeName << " not among observables" << std::endl;
+	_isValid = kFALSE;
+	return;
+    }
+    for (unsigned i = 0; i < 4; ++i)
+	_coeff[i] = attached(theEvent, *_inputs.find(_coeffNames[i]));
+    _bias = attached(theEvent, *_inputs.find(_biasName));
+    _scale = attached(theEvent, *_inputs.find(_scaleName));
+    _acc = _accName.Length() ? attached(theEvent, *_inputs.find(_accName)) : 0;
+    _sigmas.clear();
+    _fracs.clear();
+    for (Int_t i = 0; i < _sigmaList.getSize(); ++i)
+	_sigmas.push_back(attached(theEvent, *_sigmaList.at(i)));
+    for (Int_t i = 0; i < _fracList.getSize(); ++i)
+	_fracs.push_back(attached(theEvent, *_fracList.at(i)));
+
+    // decay parameters do not change during generation
+    _gamma = 1. / attached(theEvent, *_inputs.find(_tauName))->getVal();
+    _dgamma = attached(theEvent, *_inputs.find(_dgammaName))->getVal();
+    _dm = attached(theEvent, *_inputs.find(_dmName))->getVal();
+    _gammaMin = _gamma - 0.5 * std::abs(_dgamma);
+
+    // enumerate all combinations of generated discrete observables
+    _cats.clear();
+    _states.assign(1, std::vector<Int_t>());
+    {
+	TIterator* it = theEvent.createIterator();
+	for (RooAbsArg* arg = (RooAbsArg*) it->Next(); arg;
+		arg = (RooAbsArg*) it->Next()) {
+	    if (_protoVars.find(arg->GetName())) continue;
+	    RooAbsCategoryLValue* cat = dynamic_cast<RooAbsCategoryLValue*>(arg);
+	    if (!cat) continue;
+	    _cats.push_back(cat);
+	    std::vector<std::vector<Int_t> > states;
+	    TIterator* tit = cat->typeIterator();
+	    for (RooCatType* type = (RooCatType*) tit->Next(); type;
+		    type = (RooCatType*) tit->Next()) {
+		for (unsigned j = 0; j < _states.size(); ++j) {
+		    states.push_back(_states[j]);
+		    states.back().push_back(type->getVal());
+		}
+	    }
+	    delete tit;
+	    _states.swap(states);
+	}
+	delete it;
+    }
+    _coeffVals.assign(4 * _states.size(), 0.);
+    _envelope.assign(_states.size(), 0.);
+
+    // maximum of the acceptance: scan the decay time range (with some
+    // safety margin); raised during generation if found to be too low
+    _accMax = 1.;
+    if (_acc) {
+	const Double_t tmin = _t->getMin(), tmax = _t->getMax();
+	const unsigned nscan = 1000;
+	Double_t amax = 0.;
+	for (unsigned i = 0; i <= nscan; ++i) {
+	    _t->setVal(tmin + (tmax - tmin) * Double_t(i) / Double_t(nscan));
+	    amax = std::max(amax, _acc->getVal());
+	}
+	_accMax = 1.05 * amax;
+    }
+    _nTrials = 0;
+}
+
+void RooBDecayEnvelopeGenContext::generateEvent(
+	RooArgSet& /* theEvent */, Int_t /* remaining */)
+{
+    // coefficients and envelope weight for each combination of discrete
+    // observables (they depend on the per-event mistags)
+    Double_t sum = 0.;
+    for (unsigned s = 0; s < _states.size(); ++s) {
+	for (unsigned j = 0; j < _cats.size(); ++j)
+	    _cats[j]->setIndex(_states[s][j]);
+	Double_t* c = &_coeffVals[4 * s];
+	for (unsigned i = 0; i < 4; ++i) c[i] = _coeff[i]->getVal();
+	sum += 1.001 * (std::abs(c[0]) + std::abs(c[1]) +
+		std::sqrt(c[2] * c[2] + c[3] * c[3]));
+	_envelope[s] = sum;
+    }
+    if (!(sum > 0.)) {
+	coutE(Generation) << "RooBDecayEnvelopeGenContext(" << GetName() <<
+	    "): all decay rate coefficients vanish" << std::endl;
+	return;
+    }
+
+    const Double_t tmin = _t->getMin(), tmax = _t->getMax();
+    TRandom* rnd = RooRandom::randomGenerator();
+    while (true) {
+	++_nTrials;
+	// draw combination of discrete observables and true decay time from
+	// the envelope, accept against true decay rate
+	const Double_t u = sum * RooRandom::uniform();
+	unsigned s = 0;
+	while (s + 1 < _states.size() && _envelope[s] < u) ++s;
+	const Double_t* c = &_coeffVals[4 * s];
+	const Double_t ttrue = -std::log(RooRandom::uniform()) / _gammaMin;
+	const Double_t dgt = 0.5 * _dgamma * ttrue, dmt = _dm * ttrue;
+	const Double_t f = std::exp(-_gamma * ttrue) * (
+		c[0] * std::cosh(dgt) + c[1] * std::sinh(dgt) +
+		c[2] * std::cos(dmt) + c[3] * std::sin(dmt));
+	const Double_t w = (_envelope[s] - (s ? _envelope[s - 1] : 0.)) *
+	    std::exp(-_gammaMin * ttrue);
+	if (f < 0.) {
+	    coutE(Generation) << "RooBDecayEnvelopeGenContext(" << GetName() <<
+		"): negative decay rate at t = " << ttrue << std::endl;
+	    continue;
+	}
+	if (w * RooRandom::uniform() > f) continue;
+	// smear with resolution model
+	Double_t t = ttrue;
+	if (!_sigmas.empty()) {
+	    unsigned k = 0;
+	    if (_sigmas.size() > 1) {
+		const Double_t v = RooRandom::uniform();
+		Double_t cum = 0.;
+		for (k = 0; k + 1 < _sigmas.size(); ++k) {
+		    cum += _fracs[k]->getVal();
+		    if (v < cum) break;
+		}
+	    }
+	    const Double_t sf = _scale->getVal();
+	    t += sf * (_bias->getVal() + _sigmas[k]->getVal() * rnd->Gaus(0., 1.));
+	}
+	if (t < tmin || t > tmax) continue;
+	// acceptance
+	_t->setVal(t);
+	if (_acc) {
+	    const Double_t a = _acc->getVal();
+	    if (a > _accMax) {
+		coutW(Generation) << "RooBDecayEnvelopeGenContext(" << GetName() <<
+		    "): acceptance " << a << " at t = " << t <<
+		    " above assumed maximum " << _accMax << ", raising it" <<
+		    std::endl;
+		_accMax = 1.05 * a;
+	    }
+	    if (a < _accMax * RooRandom::uniform()) continue;
+	}
+	// leave accepted combination of discrete observables in the event
+	for (unsigned j = 0; j < _cats.size(); ++j)
+	    _cats[j]->setIndex(_states[s][j]);
+	return;
+    }
+}
+
+void RooBDecayEnvelopeGenContext::printMultiline(std::ostream& os,
+	Int_t content, Bool_t verbose, TString indent) const
+{
+    RooAbsGenContext::printMultiline(os, content, verbose, indent);
+    os << indent << "--- RooBDecayEnvelopeGenContext ---" << std::endl;
+    os << indent << "decay time " << _timeName << ", " << _states.size() <<
+	" combinations of discrete observables, " << _sigmas.size() <<
+	" resolution component(s), " << (_accName.Length() ? "with" : "without") <<
+	" acceptance" << std::endl;
+}
@@ -85,7 +85,8 @@ namespace SFitUtils {
                                      bool toys,
                                      bool applykfactor,
                                      bool sWeightsCorr,
-                                     bool debug
+                                     bool debug,
+                                     Long64_t chunkSize
                                      )
   {
     if ( debug == true)
@@ -101,12 +102,13 @@ namespace SFitUtils {
     RooWorkspace* work = NULL;
     work =  new RooWorkspace("workspace","workspace");
     TTree* treeSW = ReadTreeMC(pathFile.Data(),treeName.Data(), debug);
+    const bool hasTerr = treeSW->GetBranch(mdSet->GetTerrVarOutName().Data()) != NULL;
 
     RooRealVar* lab0_TAU      = new RooRealVar(mdSet->GetTimeVarOutName(),                mdSet->GetTimeVarOutName(),
                                                mdSet->GetTimeRangeDown(),                 mdSet->GetTimeRangeUp());
     RooRealVar* lab0_TAUERR;
     RooRealVar* lab0_TAUERR_calib;
-    if(treeSW->GetBranch(mdSet->GetTerrVarOutName().Data()) != NULL)
+    if(hasTerr == true)
     {
       lab0_TAUERR   = new RooRealVar(mdSet->GetTerrVarOutName(),                mdSet->GetTerrVarOutName(),
                                      mdSet->GetTerrRangeDown(),                 mdSet->GetTerrRangeUp());
@@ -199,7 +201,7 @@ namespace SFitUtils {
 
     RooArgSet* obs = new RooArgSet(*lab0_TAU,
                                    *qf);
-    if(treeSW->GetBranch(mdSet->GetTerrVarOutName().Data()) != NULL)
+    if(hasTerr == true)
     {
       obs->add(*lab0_TAUERR);
       obs->add(*lab0_TAUERR_calib);
@@ -208,7 +210,7 @@ namespace SFitUtils {
     if ( debug )
     {
       std::cout<<"[INFO] Variable "<<lab0_TAU->GetName()<<" in data set."<<std::endl;
-      if(treeSW->GetBranch(mdSet->GetTerrVarOutName().Data()) != NULL)
+      if(hasTerr == true)
       {
         std::cout<<"[INFO] Variable "<<lab0_TAUERR->GetName()<<" in data set."<<std::endl;
       }
@@ -265,93 +267,90 @@ namespace SFitUtils {
       dataSet = new RooDataSet(   cat.Data(), cat.Data(), *obs);
     }
 
-    Double_t tau;
-    Double_t tauerr;
-    Int_t ID;
+    Double_t tau = 0;
+    Double_t tauerr = 0;
+    Int_t ID = 0;
     Double_t sw[bound];
-    Double_t trueid;
-    Double_t mass;
+    Double_t trueid = 0;
+    Double_t mass = 0;
+
+    const bool hasTrueID = mdSet->CheckVarOutName("TrueID")==true && toys;
+    const Int_t nTag = mdSet->CheckTagVar() == true ? mdSet->CheckNumUsedTag() : 0;
+    const Int_t nOmega = mdSet->CheckTagOmegaVar() == true ? mdSet->CheckNumUsedTag() : 0;
+
+    // only the branches listed here are read from the tree
+    std::vector <TString> readNames;
+    std::vector <TString> swNames;
 
     treeSW->SetBranchAddress(mdSet->GetTimeVarOutName().Data(), &tau);
-    if(treeSW->GetBranch(mdSet->GetTerrVarOutName().Data()) != NULL)
+    readNames.push_back(mdSet->GetTimeVarOutName());
+    if( hasTerr == true )
     {
       treeSW->SetBranchAddress(mdSet->GetTerrVarOutName().Data(), &tauerr);
+      readNames.push_back(mdSet->GetTerrVarOutName());
     }
     TString nameID = mdSet->GetIDVarOutName()+"_idx";
     treeSW->SetBranchAddress(nameID.Data(), &ID);
-    if(treeSW->GetBranch(mdSet->GetMassBVarOutName().Data()) != NULL)
+    readNames.push_back(nameID);
+    if(treeSW->GetBranch(mdSet->GetMassBVarOutName().Data()) != NULL && toys && applykfactor)
     {
       treeSW->SetBranchAddress(mdSet->GetMassBVarOutName().Data(), &mass);
+      readNames.push_back(mdSet->GetMassBVarOutName());
     }
     Int_t tag[mdSet->GetNumTagVar()];
     Double_t omega[mdSet->GetNumTagOmegaVar()];
 
-    //if (toys == false)
-    //{
-      if( mdSet->CheckTagVar() == true )
-      {
-        for(int k = 0; k<mdSet->CheckNumUsedTag(); k++)
-        {
-          TString pre = lab0_TAG[k]->GetName();
-          TString nameTag = pre +"_idx";
-          treeSW->SetBranchAddress(nameTag, &tag[k]);
-        }
-      }
-      if( mdSet->CheckTagOmegaVar() == true )
-      {
-        for(int k = 0; k<mdSet->CheckNumUsedTag(); k++)
-        {
-          treeSW->SetBranchAddress(lab0_TAGOMEGA[k]->GetName(), &omega[k]);
-        }
-      }
-      //}
-
-      /*else
+    for(int k = 0; k<nTag; k++)
     {
-      treeSW->SetBranchAddress("tagDecComb_idx", &tag[0]);
-      treeSW->SetBranchAddress("tagOmegaComb", &omega[0]);
-      }*/
+      TString pre = lab0_TAG[k]->GetName();
+      TString nameTag = pre +"_idx";
+      treeSW->SetBranchAddress(nameTag, &tag[k]);
+      readNames.push_back(nameTag);
+    }
+    for(int k = 0; k<nOmega; k++)
+    {
+      treeSW->SetBranchAddress(lab0_TAGOMEGA[k]->GetName(), &omega[k]);
+      readNames.push_back(lab0_TAGOMEGA[k]->GetName());
+    }
 
-    if(mdSet->CheckVarOutName("TrueID")==true && toys)
+    if( hasTrueID == true )
     {
       treeSW->SetBranchAddress("TrueID", &trueid);
+      readNames.push_back("TrueID");
     }
 
     for (int i = 0; i<bound; i++)
     {
       TString swname = "nSig_"+s[i]+"_Evts_sw";
       treeSW->SetBranchAddress(swname.Data(), &sw[i]);
+      readNames.push_back(swname);
+      swNames.push_back(swname);
       if (debug == true ) { std::cout<<"[INFO] sWeights names: "<<swname<<std::endl; }
-
-      /*TCanvas canvasw("canvasw");
-      canvasw.cd();
-      treeSW->Draw("BeautyTime>>hw",swname.Data(),"goff");
-      TH1F* hw = (TH1F*)gDirectory->Get("hw");
-      hw->Draw("HIST");
-      canvasw.SaveAs("TESTWDATA_src.pdf");
-
-      TCanvas canvas("canvas");
-      canvas.cd();
-      treeSW->Draw("BeautyTime>>h","","goff");
-      TH1F* h = (TH1F*)gDirectory->Get("h");
-      h->Draw("HIST");
-      canvas.SaveAs("TESTDATA_src.pdf");*/
-
     }
 
-
     Double_t sqSumsW = 0;
     Double_t SumsW = 0;
     double correction=0.0;
 
-    Double_t tagEff[2];
-    tagEff[0] = 0;
-    tagEff[1] = 0;
+    std::vector <Double_t> tagEff(nTag > 2 ? nTag : 2, 0.0);
+
+    // Events passing the time (and time error) range are buffered as rows of
+    // (time, time error, charge, true ID, sum of sWeights, tags..., mistags...)
+    // and moved into the data set once the sWeights correction factor is known.
+    // With chunkSize > 0 the correction factor is obtained from a pass over the
+    // sWeight branches only, and the buffer is flushed every chunkSize events,
+    // so memory stays bounded; otherwise the tree is read exactly once.
+    const Int_t rowSize = 5 + nTag + nOmega;
+    const Long64_t nEntries = treeSW->GetEntries();
+    const bool bufferAll = sWeightsCorr && chunkSize <= 0;
+    const Long64_t flushRows = chunkSize > 0 ? chunkSize : 1;
+    std::vector <Double_t> rows;
+    TCut noCut = "";
 
-    //Perform a first loop to compute sWeight correction factor
     Double_t swCorr = 1.0;
-    if( sWeightsCorr ){
-      for (Long64_t jentry=0; jentry<treeSW->GetEntries(); jentry++){
+    if( sWeightsCorr && chunkSize > 0 ){
+      PrepareTreeReading(treeSW, swNames, noCut, 32*1024*1024, debug);
+      for (Long64_t jentry=0; jentry<nEntries; jentry++){
         treeSW->GetEntry(jentry);
 
         Double_t sum_sw=0;
@@ -363,146 +362,96 @@ namespace SFitUtils {
       swCorr = SumsW / sqSumsW;
       std::cout<<"[INFO] ==> SFitUtils::ReadDataFromSWeights(...). sWeights correction factor: "<<swCorr<<std::endl;
     }
-    else{
+    else if ( sWeightsCorr == false ) {
       std::cout<<"[INFO] ==> SFitUtils::ReadDataFromSWeights(...). No sWeights correction applied"<<std::endl;
     }
+    if ( bufferAll == false ) { rows.reserve(flushRows*rowSize); }
 
-    //Now, do the full loop
+    PrepareTreeReading(treeSW, readNames, noCut, 32*1024*1024, debug);
     sqSumsW = 0;
     SumsW = 0;
-    for (Long64_t jentry=0; jentry<treeSW->GetEntries(); jentry++) {
+    for (Long64_t jentry=0; jentry<nEntries; jentry++) {
       treeSW->GetEntry(jentry);
-      double m = 0;
-      double merr = 0;
-      //if (jentry>10000) continue;
-      if(toys)
+      double m = tau;
+      double merr = tauerr;
+      if(toys && applykfactor == true)
       {
-        m =tau;
-        merr = tauerr;
-        if (applykfactor == true )
-        {
-          if ((trueid > 1.5) && (trueid < 9.5)) {
-            //Apply k-factor smearing
-            if (fabs(trueid-2) < 0.5 || fabs(trueid-8) < 0.5) {
-              //correctionmean  = 1+2*(mass-5279.)/5279.;
-              correction      = mass/5279.;//gR->Gaus(correctionmean,0.0001);
-            } else if (fabs(trueid-4) < 0.5 || fabs(trueid-7) < 0.5 || fabs(trueid-8) < 0.5) {
-              correction      = mass/5369.;
-            } else if (fabs(trueid-5) < 0.5 || fabs(trueid-6) < 0.5) {
-              correction      = mass/5620.;
-            }
-            //cout << "Applying k-factor correction " << trueid << " " << mass << " " << tau << " " << correction << endl;
-          } else correction = 1.;
-        }
-        else
-        { correction = 1.; }
-        //std::cout << "The correction factor is " << correction << std::endl;
+        if ((trueid > 1.5) && (trueid < 9.5)) {
+          //Apply k-factor smearing
+          if (fabs(trueid-2) < 0.5 || fabs(trueid-8) < 0.5) {
+            correction      = mass/5279.;
+          } else if (fabs(trueid-4) < 0.5 || fabs(trueid-7) < 0.5 || fabs(trueid-8) < 0.5) {
+            correction      = mass/5369.;
+          } else if (fabs(trueid-5) < 0.5 || fabs(trueid-6) < 0.5) {
+            correction      = mass/5620.;
+          }
+        } else correction = 1.;
         m *=correction;
       }
-      else
-      {
-        m =tau;
-        merr = tauerr;
-      }
 
-      //if ( m < 0.2 ) continue;
+      Double_t sum_sw=0;
+      for (int i = 0; i<bound; i++) {
+        sum_sw += sw[i];
+      }
+      SumsW += sum_sw;
+      sqSumsW += sum_sw*sum_sw;
 
-      lab0_TAU->setVal(m);
-      if(treeSW->GetBranch(mdSet->GetTerrVarOutName().Data()) != NULL)
+      for(int k = 0; k<nTag; k++)
       {
-        lab0_TAUERR->setVal(merr);
-        lab0_TAUERR_calib->setVal(1.37*merr);
+        if( tag[k] > 0.1 ) {   tag[k] = 1; tagEff[k] += sum_sw; }
+        else if ( tag[k] < -0.1 ) { tag[k] = -1; tagEff[k] += sum_sw; }
+        else{ tag[k]=0; }
       }
 
-      if(mdSet->CheckVarOutName("TrueID")==true && toys)
+      if ( m > mdSet->GetTimeRangeDown() && m < mdSet->GetTimeRangeUp() &&
+           ( hasTerr == false || ( merr > mdSet->GetTerrRangeDown() && merr <mdSet->GetTerrRangeUp() ) ) )
       {
-        TrueID->setVal(trueid);
+        rows.push_back(m);
+        rows.push_back(merr);
+        rows.push_back(ID > 0 ? 1 : -1);
+        rows.push_back(trueid);
+        rows.push_back(sum_sw);
+        for(int k = 0; k<nTag; k++) { rows.push_back(tag[k]); }
+        for(int k = 0; k<nOmega; k++) { rows.push_back(omega[k] > 0.5 ? 0.5 : omega[k]); }
       }
 
-      //if (tagweight > 0.5) tagweight = 0.5;
-      //lab0_TAGOMEGA->setVal(tagweight);
+      if ( jentry+1 < nEntries && ( bufferAll == true || (Long64_t)rows.size() < flushRows*rowSize ) ) { continue; }
 
-      //lab1_P->setVal(p);
-      //lab1_PT->setVal(pt);
-      //nTracks->setVal(nTr);
-      //lab1_PIDK->setVal(PIDK);
-      //lab1_PIDp->setVal(PIDp);
-      //lab0_MM->setVal(mass);
-
-      Double_t sum_sw=0;
-      for (int i = 0; i<bound; i++) {
-        sum_sw += sw[i];
+      if ( bufferAll == true )
+      {
+        swCorr = SumsW / sqSumsW;
+        std::cout<<"[INFO] ==> SFitUtils::ReadDataFromSWeights(...). sWeights correction factor: "<<swCorr<<std::endl;
       }
-
-
-      if (ID > 0) { qf->setIndex(1); } else { qf->setIndex(-1); }
-      //if( toys == false)
-      //{
-        if(  mdSet->CheckTagVar() == true )
-        {
-          for(int k = 0; k<mdSet->CheckNumUsedTag(); k++)
-          {
-            if( tag[k] > 0.1 ) {   tag[k] = 1; tagEff[k] += sum_sw; }
-            else if ( tag[k] < -0.1 ) { tag[k] = -1; tagEff[k] += sum_sw; }
-            else{ tag[k]=0; }
-
-            lab0_TAG[k]->setIndex(tag[k]);
-          }
-        }
-        if(  mdSet->CheckTagOmegaVar() == true )
+      for (std::size_t r = 0; r < rows.size(); r += rowSize)
+      {
+        const Double_t* row = &rows[r];
+        lab0_TAU->setVal(row[0]);
+        if( hasTerr == true )
         {
-          for(int k = 0; k<mdSet->CheckNumUsedTag(); k++)
-          {
-            if (omega[k] > 0.5){ omega[k] = 0.5;}
-            lab0_TAGOMEGA[k]->setVal(omega[k]);
-          }
+          lab0_TAUERR->setVal(row[1]);
+          lab0_TAUERR_calib->setVal(1.37*row[1]);
         }
-        //}
-      /*else
-      {
-        lab0_TAG[0]->setIndex(tag[0]);
-        lab0_TAGOMEGA[0]->setVal(omega[0]);
-        }*/
-
-      //sum_sw = 1.0;
-      weights->setVal(sum_sw * swCorr);
-      sqSumsW += sum_sw*sum_sw *swCorr*swCorr;
-      //if ( m > mdSet->GetTimeRangeDown() && m < mdSet->GetTimeRangeUp())
-      //	{
-      if(treeSW->GetBranch(mdSet->GetTerrVarOutName().Data()) != NULL)
-      {
-        if ( m > mdSet->GetTimeRangeDown() && m < mdSet->GetTimeRangeUp() &&
-             merr > mdSet->GetTerrRangeDown() && merr <mdSet->GetTerrRangeUp() )
+        qf->setIndex(Int_t(row[2]));
+        if( hasTrueID == true ) { TrueID->setVal(row[3]); }
+        for(int k = 0; k<nTag; k++) { lab0_TAG[k]->setIndex(Int_t(row[5+k])); }
+        for(int k = 0; k<nOmega; k++) { lab0_TAGOMEGA[k]->setVal(row[5+nTag+k]); }
+        weights->setVal(row[4] * swCorr);
+        if (weighted == true )
         {
-          if (weighted == true )
-          {
-            dataSet->add(*obs,sum_sw * swCorr,0);
-          }
-          else
-          {
-            dataSet->add(*obs);
-          }
+          dataSet->add(*obs,row[4] * swCorr,0);
         }
-      }
-      else
-      {
-        if ( m > mdSet->GetTimeRangeDown() && m < mdSet->GetTimeRangeUp() )
+        else
         {
-          if (weighted == true )
-          {
-            dataSet->add(*obs,sum_sw * swCorr,0);
-          }
-          else
-          {
-            dataSet->add(*obs);
-          }
+          dataSet->add(*obs);
         }
       }
-
-      //	}
-      // std::cout << "this event has time = " << m << " and error = " << merr << " with weight = " << sum_sw << std::endl;
-
+      rows.clear();
     }
+    sqSumsW *= swCorr*swCorr;
+
+    treeSW->ResetBranchAddresses();
+    treeSW->SetBranchStatus("*", 1);
+    if ( debug == true ) { PrintTreeIOStatistics(treeSW); }
 
     if ( debug == true){
       if ( dataSet != NULL ){
@@ -513,7 +462,7 @@ namespace SFitUtils {
     }
 
     std::cout<<"tagEff1: "<<tagEff[0]/dataSet->sumEntries()<<" = "<<tagEff[0]<<" / "<<dataSet->sumEntries()<<std::endl;
-    std::cout<<"tagEff2: "<<tagEff[1]/dataSet->sumEntries()<<" = "<<tagEff[0]<<" / "<<dataSet->sumEntries()<<std::endl;
+    std::cout<<"tagEff2: "<<tagEff[1]/dataSet->sumEntries()<<" = "<<tagEff[1]<<" / "<<dataSet->sumEntries()<<std::endl;
     /*if ( toys == false)
     {
       RooArgList* tagList= new RooArgList();
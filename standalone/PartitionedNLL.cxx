@@ -0,0 +1 @@
+../src/PartitionedNLL.cxx
\ No newline at end of file
@@ -0,0 +1 @@
+../src/RooBDecayEnvelopeGenContext.cxx
\ No newline at end of file
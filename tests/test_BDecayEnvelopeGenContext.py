@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test and benchmark RooBDecayEnvelopeGenContext           #
+#                                                                             #
+#   It builds a B -> D pi like decay time pdf with buildBDecayTimePdf (one    #
+#   tagger with per-event mistag, Gaussian resolution with per-event decay    #
+#   time error, spline acceptance), generates it with RooFit's default        #
+#   context and with the envelope generator from the same proto data,         #
+#   prints the throughput of both, and checks that the decay time             #
+#   distribution, tagging efficiency and mixing asymmetry agree.              #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_BDecayEnvelopeGenContext.py [nevents]                           #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import sys, time, math
+import B2DXFitters
+import ROOT
+from ROOT import RooFit, RooRealVar, RooCategory, RooArgSet, RooWorkspace
+from ROOT import RooGaussian, RooRandom
+from B2DXFitters import timepdfutils_Bd, acceptanceutils, resmodelutils
+from B2DXFitters.WS import WS
+
+nevents = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+RooRandom.randomGenerator().SetSeed(42)
+
+ws = RooWorkspace('ws', 'ws')
+t = WS(ws, RooRealVar('time', 'time', 0.4, 15., 'ps'))
+terr = WS(ws, RooRealVar('timeerr', 'timeerr', 0.01, 0.1, 'ps'))
+eta = WS(ws, RooRealVar('eta', 'eta', 0., 0.5))
+qf = WS(ws, RooCategory('qf', 'qf'))
+qf.defineType('h+', +1)
+qf.defineType('h-', -1)
+qt = WS(ws, RooCategory('qt', 'qt'))
+qt.defineType('B', +1)
+qt.defineType('Bbar', -1)
+qt.defineType('Untagged', 0)
+
+calib = [ WS(ws, RooRealVar(n, n, v)) for n, v in (('p0', 0.37),
+    ('p1', 1.0), ('dp0', 0.), ('dp1', 0.), ('avgeta', 0.37),
+    ('tageff', 0.35), ('atageff', 0.)) ]
+params = dict((n, WS(ws, RooRealVar(n, n, v))) for n, v in (
+    ('Gamma', 0.656), ('DeltaGamma', 0.), ('DeltaM', 0.51),
+    ('C', 1.), ('S', -0.031), ('Sbar', 0.029), ('D', 0.), ('Dbar', 0.)))
+
+acc, accnorm = acceptanceutils.buildSplineAcceptance(ws, t, 'Bench',
+        [ 0.5, 1.0, 1.5, 2.0, 3.0, 12.0 ],
+        [ 0.4585, 0.6896, 0.8853, 1.1296, 1.2232, 1.2277 ], False, False)
+resconfig = {
+        'Context': 'GEN',
+        'AcceptanceFunction': 'Spline',
+        'DecayTimeResolutionModel': 'GaussianWithPEDTE',
+        'DecayTimeResolutionBias': 0.,
+        'DecayTimeResolutionScaleFactor': 1.2,
+        }
+resmodel, acc = resmodelutils.getResolutionModel(ws, resconfig, t, terr,
+        accnorm)
+
+config = {
+        'Context': 'GEN',
+        'Debug': False,
+        'ParameteriseIntegral': True,
+        'UseProtoData': True,
+        'NBinsAcceptance': 0,
+        'NBinsProperTimeErr': 100,
+        }
+terrpdf = WS(ws, RooGaussian('terrpdf', 'terrpdf', terr,
+    WS(ws, RooRealVar('terrmean', 'terrmean', 0.04)),
+    WS(ws, RooRealVar('terrsigma', 'terrsigma', 0.01))))
+etapdf = WS(ws, RooGaussian('etapdf', 'etapdf', eta,
+    WS(ws, RooRealVar('etamean', 'etamean', 0.37)),
+    WS(ws, RooRealVar('etasigma', 'etasigma', 0.08))))
+name = 'Bench'
+pdf = timepdfutils_Bd.buildBDecayTimePdf(config, name, ws,
+        t, terr, [ qt ], qf, [ eta ], [ calib ],
+        params['Gamma'], params['DeltaGamma'], params['DeltaM'],
+        params['C'], params['D'], params['Dbar'], params['S'], params['Sbar'],
+        resmodel, acc, terrpdf, [ etapdf ])
+
+# proto data: per-event decay time error and mistag
+proto = terrpdf.generate(RooArgSet(terr), nevents)
+proto.merge(etapdf.generate(RooArgSet(eta), nevents))
+genset = RooArgSet(t, qf, qt)
+
+def stats(data, hname):
+    """
+    mean and RMS of decay time, tagging efficiency, raw mixing asymmetry,
+    and histogram of the decay time distribution
+    """
+    s = [ 0., 0., 0., 0., 0. ]
+    h = ROOT.TH1D(hname, hname, 58, 0.4, 15.)
+    h.SetDirectory(None)
+    for i in xrange(data.numEntries()):
+        obs = data.get(i)
+        tag = obs.getCatIndex('qt')
+        s[0] += obs.getRealValue('time')
+        s[4] += obs.getRealValue('time') ** 2
+        h.Fill(obs.getRealValue('time'))
+        if 0 != tag:
+            s[1] += 1.
+            if tag * obs.getCatIndex('qf') > 0: s[2] += 1.
+            else: s[3] += 1.
+    n = float(data.numEntries())
+    tmean = s[0] / n
+    return (tmean, math.sqrt(max(0., s[4] / n - tmean ** 2)), s[1] / n,
+            (s[2] - s[3]) / max(1., s[2] + s[3]), h)
+
+results = {}
+start = time.time()
+data = pdf.generate(genset, RooFit.ProtoData(proto), RooFit.NumEvents(nevents))
+results['RooFit'] = (time.time() - start, stats(data, 'hRooFit'))
+
+start = time.time()
+ctx = timepdfutils_Bd.buildBDecayEnvelopeGenContext(name, ws, pdf, genset, t,
+        params['Gamma'], params['DeltaGamma'], params['DeltaM'],
+        resmodelutils.getResolutionParameters(ws, resconfig, terr), acc,
+        proto)
+data = ctx.generate(nevents)
+results['Envelope'] = (time.time() - start, stats(data, 'hEnvelope'))
+print 'Envelope generator: %d trials for %d events' % (ctx.nTrials(), nevents)
+
+print 72 * '#'
+print '%-10s %10s %12s %10s %10s %10s' % ('context', 'time [s]', 'events/s',
+        '<t>', 'tag eff', 'A_mix')
+for k in ('RooFit', 'Envelope'):
+    dt, (tmean, trms, teff, amix, h) = results[k]
+    print '%-10s %10.2f %12.0f %10.4f %10.4f %10.4f' % (k, dt, nevents / dt,
+            tmean, teff, amix)
+speedup = results['RooFit'][0] / results['Envelope'][0]
+print 'speed-up: %.1f' % speedup
+print 72 * '#'
+
+# the two samples are independent (fixed seed), so they must agree within
+# 5 standard deviations of the difference
+ref, env = results['RooFit'][1], results['Envelope'][1]
+n = float(nevents)
+err = 5. * math.sqrt(2.) * ref[1] / math.sqrt(n)
+assert abs(ref[0] - env[0]) < err, ('<t>', ref[0], env[0])
+err = 5. * math.sqrt(2. * ref[2] * (1. - ref[2]) / n)
+assert abs(ref[2] - env[2]) < err, ('tag eff', ref[2], env[2])
+err = 5. * math.sqrt(2. * (1. - ref[3] ** 2) / (n * ref[2]))
+assert abs(ref[3] - env[3]) < err, ('A_mix', ref[3], env[3])
+# shape of the decay time distribution
+prob = ref[4].KolmogorovTest(env[4])
+assert prob > 1e-3, ('decay time distributions differ', prob)
+print 'test_BDecayEnvelopeGenContext: OK'
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to check and benchmark InverseCDFSampler                    #
+#                                                                             #
+#   It draws mistags from a MistagDistribution with RooAbsPdf.generate and    #
+#   with the inverse-CDF sampler, prints the time taken by both, and checks   #
+#   that mean and width of the two samples agree, and that a two-sample       #
+#   Kolmogorov-Smirnov test does not tell them apart.                         #
+#                                                                             #
+#   It then draws correlated OS/SS mistag pairs from a two-dimensional pdf,   #
+#   and compares the cell occupancy and the correlation of the sample with    #
+#   the histogram of the pdf (chi-square test).                               #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_InverseCDFSampler.py [nevents]                                  #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import sys, time, math
+import numpy
+import B2DXFitters
+import ROOT
+from ROOT import (RooFit, RooRealVar, RooArgSet, RooArgList, RooRandom,
+        RooGenericPdf, MistagDistribution)
+from B2DXFitters.samplingutils import InverseCDFSampler
+
+nevents = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+RooRandom.randomGenerator().SetSeed(42)
+
+eta = RooRealVar('eta', 'eta', 0., 0.5)
+eta0 = RooRealVar('eta0', 'eta0', 0.01)
+etaavg = RooRealVar('etaavg', 'etaavg', 0.37)
+f = RooRealVar('f', 'f', 0.25)
+pdf = MistagDistribution('pdf', 'pdf', eta, eta0, etaavg, f)
+
+def moments(values):
+    """ return mean, rms and error on rms of values """
+    mean = values.mean()
+    rms = values.std()
+    m4 = ((values - mean) ** 4).mean()
+    return mean, rms, math.sqrt((m4 - rms ** 4) /
+            (4. * rms ** 2 * len(values)))
+
+results = {}
+start = time.time()
+data = pdf.generate(RooArgSet(eta), RooFit.AutoBinned(False),
+        RooFit.NumEvents(nevents))
+ref = numpy.array([ data.get(i).getRealValue('eta') for i in xrange(nevents) ])
+results['RooFit'] = (time.time() - start, ) + moments(ref)
+
+start = time.time()
+sampler = InverseCDFSampler(pdf, [ eta ])
+# fixed seed, so the outcome of the comparison below is reproducible
+values, = sampler.sample(nevents, numpy.random.RandomState(42))
+results['InverseCDF'] = (time.time() - start, ) + moments(values)
+
+print 72 * '#'
+print '%-12s %10s %10s %10s' % ('sampler', 'time [s]', '<eta>', 'rms')
+for k in ('RooFit', 'InverseCDF'):
+    print '%-12s %10.2f %10.5f %10.5f' % results[k][:4]
+print 72 * '#'
+
+# the two samples are independent, so mean and width must agree within 5
+# standard deviations of the difference
+dt, mean, rms, rmserr = results['RooFit']
+a, b = mean, results['InverseCDF'][1]
+assert abs(a - b) < 5. * math.sqrt(2. / nevents) * rms, ('<eta>', a, b)
+a, b = rms, results['InverseCDF'][2]
+assert abs(a - b) < 5. * math.sqrt(2.) * rmserr, ('rms', a, b)
+
+# two-sample Kolmogorov-Smirnov test
+ref.sort()
+values.sort()
+both = numpy.concatenate((ref, values))
+d = numpy.abs(numpy.searchsorted(ref, both, side = 'right') / float(len(ref)) -
+        numpy.searchsorted(values, both, side = 'right') /
+        float(len(values))).max()
+prob = ROOT.TMath.KolmogorovProb(d * math.sqrt(0.5 * nevents))
+print 'Kolmogorov-Smirnov: D = %g, prob = %g' % (d, prob)
+assert prob > 1e-3, ('distributions differ', d, prob)
+
+# two dimensions: correlated OS/SS mistags, as sampled jointly by toyFactory
+etaOS = RooRealVar('etaOS', 'etaOS', 0., 0.5)
+etaSS = RooRealVar('etaSS', 'etaSS', 0., 0.5)
+pdf2d = RooGenericPdf('pdf2d', 'pdf2d',
+        'exp(-0.5 * (pow((@0 - 0.35) / 0.08, 2) -'
+        ' 2. * 0.6 * (@0 - 0.35) / 0.08 * (@1 - 0.38) / 0.06 +'
+        ' pow((@1 - 0.38) / 0.06, 2)) / (1. - 0.6 * 0.6))',
+        RooArgList(etaOS, etaSS))
+# default grid of 200 x 200 cells, compared in 20 x 20 cells
+sampler = InverseCDFSampler(pdf2d, [ etaOS, etaSS ])
+valOS, valSS = sampler.sample(nevents, numpy.random.RandomState(42))
+assert len(valOS) == nevents and len(valSS) == nevents
+for v in (valOS, valSS):
+    assert 0. <= v.min() and v.max() <= 0.5, ('out of range', v.min(), v.max())
+h = pdf2d.createHistogram('pdf2d_ref', etaOS, RooFit.Binning(200, 0., 0.5),
+        RooFit.YVar(etaSS, RooFit.Binning(200, 0., 0.5)))
+h.Rebin2D(10, 10)
+expected = numpy.array([ [ h.GetBinContent(i + 1, j + 1) for j in xrange(20) ]
+    for i in xrange(20) ])
+expected *= nevents / expected.sum()
+edges = numpy.linspace(0., 0.5, 21)
+observed = numpy.histogram2d(valOS, valSS, bins = [ edges, edges ])[0]
+mask = expected >= 5.
+chi2 = (((observed - expected) ** 2)[mask] / expected[mask]).sum()
+ndf = mask.sum() - 1
+prob = ROOT.TMath.Prob(chi2, ndf)
+print '2D cell occupancy: chi2 / ndf = %g / %d, prob = %g' % (chi2, ndf, prob)
+assert prob > 1e-3, ('2D distributions differ', chi2, ndf, prob)
+
+def correlation(table):
+    """ return correlation coefficient of table of counts in 20 x 20 cells """
+    c = 0.5 * (edges[1:] + edges[:-1])
+    w = table / table.sum()
+    mx, my = (w.sum(axis = 1) * c).sum(), (w.sum(axis = 0) * c).sum()
+    cov = (w * numpy.outer(c - mx, c - my)).sum()
+    vx = (w.sum(axis = 1) * (c - mx) ** 2).sum()
+    vy = (w.sum(axis = 0) * (c - my) ** 2).sum()
+    return cov / math.sqrt(vx * vy)
+a, b = correlation(expected), correlation(observed)
+print '2D correlation: pdf %g, sample %g' % (a, b)
+assert abs(a - b) < 5. * (1. - a * a) / math.sqrt(nevents), ('rho', a, b)
+print 'test_InverseCDFSampler: OK'
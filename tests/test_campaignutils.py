@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test the toy campaign orchestrator (campaignutils)       #
+#                                                                             #
+#   It runs a small campaign whose "fit" stage writes a pull tree and fails   #
+#   for some seeds, checks that failed seeds are retried and reported with    #
+#   their log, that a second run skips completed seeds, and that the pulls    #
+#   collected in the job database can be exported into one pull tree.         #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_campaignutils.py                                                #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import os, sys, tempfile, shutil
+import B2DXFitters
+import ROOT
+from B2DXFitters.campaignutils import JobDatabase, Campaign, exportPulls
+
+writePulls = ('%s -c "import ROOT, array; f = ROOT.TFile(\'{workdir}pull_{seed}.root\', '
+        '\'RECREATE\'); t = ROOT.TTree(\'PullTree\', \'PullTree\'); '
+        'x = array.array(\'f\', [ {seed} ]); t.Branch(\'x_fit\', x, \'x_fit/F\'); '
+        't.Fill(); t.Write(); f.Close()"' % sys.executable)
+
+tmpdir = tempfile.mkdtemp(prefix = 'test_campaignutils_')
+try:
+    config = {
+            'Seeds': [ 0, 10 ],
+            'WorkDir': tmpdir + '/',
+            'Stages': [
+                [ 'generate', 'echo {seed} > {workdir}toy_{seed}.txt' ],
+                [ 'fit', 'test $(( {seed} % 4 )) -ne 1 || (echo fit failed; exit 3)' ],
+                [ 'pulls', writePulls ],
+                ],
+            'PullFile': '{workdir}pull_{seed}.root',
+            'CleanUp': [ '{workdir}toy_{seed}.txt', '{workdir}pull_{seed}.root' ],
+            }
+    dbname = os.path.join(tmpdir, 'campaign.sqlite')
+    summary = Campaign(config, JobDatabase(dbname)).run(4, 2, poll = 0.1)
+    assert summary == { 'done': 7, 'failed': 3 }, summary
+    db = JobDatabase(dbname)
+    failures = db.failures()
+    assert [ f[0] for f in failures ] == [ 1, 5, 9 ], failures
+    for seed, attempts, stage, log in failures:
+        assert 2 == attempts and 'fit' == stage and 'fit failed' in log
+    # second run: nothing left to do with at most 2 attempts
+    summary = Campaign(config, db).run(4, 2, poll = 0.1)
+    assert summary == { 'done': 7, 'failed': 3 }, summary
+    assert not os.path.exists(os.path.join(tmpdir, 'toy_0.txt'))
+
+    names, rows = db.pullRows()
+    assert names == [ 'x_fit' ] and [ r[0] for r in rows ] == [ 0, 2, 3, 4, 6,
+            7, 8 ], (names, rows)
+    assert all(r[0] == r[1][0] for r in rows)
+    assert 7 == exportPulls(db, os.path.join(tmpdir, 'PullTree.root'))
+    print 'test_campaignutils: OK'
+finally:
+    shutil.rmtree(tmpdir, True)
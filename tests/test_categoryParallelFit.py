@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test FitMeTool's category parallel fit mode              #
+#                                                                             #
+#   It fits a simultaneous model with categories of very different sizes      #
+#   once with RooAbsPdf::fitTo, and once with the NLL split by category over  #
+#   worker processes (FitMeTool::setCategoryParallelFit), and checks that     #
+#   both fits find the same minimum.                                          #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_categoryParallelFit.py [nworkers]                               #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import sys
+import B2DXFitters
+import ROOT
+from ROOT import (RooFit, RooRealVar, RooCategory, RooGaussian, RooExtendPdf,
+        RooSimultaneous, RooArgSet, RooDataSet, FitMeTool)
+
+nworkers = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+x = RooRealVar('x', 'x', -10., 10.)
+sample = RooCategory('sample', 'sample')
+sim = RooSimultaneous('sim', 'sim', sample)
+sigma = RooRealVar('sigma', 'sigma', 1.2, 0.1, 5.)
+keep = []
+ROOT.RooRandom.randomGenerator().SetSeed(42)
+data = None
+for i, n in enumerate([ 20000, 5000, 5000, 1000, 500, 100 ]):
+    label = 'cat%d' % i
+    sample.defineType(label, i)
+    mean = RooRealVar('mean_' + label, 'mean_' + label, 0.1 * i, -5., 5.)
+    nevts = RooRealVar('nEvts_' + label, 'nEvts_' + label, n, 0., 10. * n)
+    g = RooGaussian('g_' + label, 'g_' + label, x, mean, sigma)
+    e = RooExtendPdf('e_' + label, 'e_' + label, g, nevts)
+    sim.addPdf(e, label)
+    keep += [ mean, nevts, g, e ]
+    d = g.generate(RooArgSet(x), n)
+    ROOT.SetOwnership(d, True)
+    sample.setLabel(label)
+    d.addColumn(sample)
+    if None == data:
+        data = RooDataSet('data', 'data', d, RooArgSet(x, sample))
+    else:
+        data.append(RooDataSet('tmp', 'tmp', d, RooArgSet(x, sample)))
+params = sim.getParameters(data)
+initial = params.snapshot()
+
+results = []
+for workers in (0, nworkers):
+    params.assignValueOnly(initial)
+    fitter = FitMeTool(False)
+    fitter.setObservables(RooArgSet(x, sample))
+    fitter.setModelPDF(sim)
+    fitter.setData(data)
+    fitter.setCategoryParallelFit(workers)
+    fitter.fit(False, RooFit.Extended(), RooFit.PrintLevel(-1))
+    result = fitter.getFitResult()
+    assert 0 == result.status()
+    final = result.floatParsFinal()
+    results.append((result.minNll(), dict((final[j].GetName(),
+        final[j].getVal()) for j in xrange(0, final.getSize()))))
+assert abs(results[0][0] - results[1][0]) < 1e-6 * abs(results[0][0])
+for name, val in results[0][1].iteritems():
+    assert abs(val - results[1][1][name]) < 1e-3 * (1. + abs(val)), name
+print 'test_categoryParallelFit: OK'
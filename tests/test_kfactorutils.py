@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test the kfactorutils module                             #
+#                                                                             #
+#   It checks that the k-factors drawn by KFactorSmearing follow the k-factor #
+#   histogram of the mode and mass bin (chi-square test), that events of      #
+#   modes without k-factors or with unknown TRUEID get k = 1, that masses     #
+#   outside the mass range use the first or last mass bin, and that smear     #
+#   rescales and smears decay times and drops events outside the time range.  #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_kfactorutils.py                                                 #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import math
+import numpy
+import B2DXFitters
+import ROOT
+from ROOT import RooRealVar, RooArgSet, RooDataSet, TH1D
+from B2DXFitters.kfactorutils import KFactorSmearing
+from B2DXFitters.datasetio import dataSetToArrays
+
+myconfigfile = {
+        'DecayModeParameters': {
+            'Signal': { 'TRUEID': '1', 'KFACTOR': False },
+            'Bd2DPi': { 'TRUEID': '12', 'KFACTOR': True },
+            },
+        'massRange': [ 5300, 5400 ],
+        'kFactorBinning': 50,
+        'timeRange': [ 0.4, 15. ],
+        }
+
+# rising k-factor distribution in the low, falling one in the high mass bin
+histos = {}
+for name, content in (('5300_5350', lambda i: i + 1.),
+        ('5350_5400', lambda i: 20. - i)):
+    h = TH1D('kfactor_%s' % name, 'kfactor_%s' % name, 20, 0.8, 1.0)
+    for i in xrange(20):
+        h.SetBinContent(i + 1, content(i))
+    histos[name] = h
+smearing = KFactorSmearing(myconfigfile, { 'Bd2DPi': histos })
+rnd = numpy.random.RandomState(1234)
+
+def checkHisto(k, h):
+    """ chi-square test of k-factors k against histogram h """
+    edges = numpy.linspace(0.8, 1.0, 21)
+    observed = numpy.histogram(k, bins = edges)[0]
+    expected = numpy.array([ h.GetBinContent(i + 1) for i in xrange(20) ])
+    expected *= len(k) / expected.sum()
+    chi2 = ((observed - expected) ** 2 / expected).sum()
+    prob = ROOT.TMath.Prob(chi2, 19)
+    print '%s: chi2 / ndf = %g / 19, prob = %g' % (h.GetName(), chi2, prob)
+    assert prob > 1e-3, (h.GetName(), chi2, prob)
+
+# k-factors follow the histogram of their mass bin; TRUEIDs are rounded
+n = 100000
+k = smearing.kFactors(numpy.full(n, 11.9999), rnd.uniform(5300., 5350., n),
+        rnd)
+checkHisto(k, histos['5300_5350'])
+k = smearing.kFactors(numpy.full(n, 12.), rnd.uniform(5350., 5400., n), rnd)
+checkHisto(k, histos['5350_5400'])
+
+# masses below (above) the mass range use the first (last) mass bin
+k = smearing.kFactors(numpy.full(n, 12.), numpy.full(n, 5000.), rnd)
+checkHisto(k, histos['5300_5350'])
+k = smearing.kFactors(numpy.full(n, 12.), numpy.full(n, 6000.), rnd)
+checkHisto(k, histos['5350_5400'])
+
+# modes without k-factors and unknown TRUEIDs get k = 1
+trueid = numpy.array([ 1., 99., -12., 12., 1., 99. ] * 1000)
+k = smearing.kFactors(trueid, numpy.full(len(trueid), 5320.), rnd)
+assert (k[trueid != 12.] == 1.).all()
+assert (k[trueid == 12.] <= 1.).all() and (k[trueid == 12.] >= 0.8).all()
+
+# smear: signal at t = 5 is only smeared with the resolution, mode 12 at
+# t = 4 is scaled by 1 / k, unknown TRUEID at t = 0.3 is dropped
+t = RooRealVar('t', 't', 0., 20.)
+terr = RooRealVar('terr', 'terr', 0., 1.)
+tid = RooRealVar('tid', 'tid', 0., 100.)
+mass = RooRealVar('mass', 'mass', 5000., 6000.)
+obs = RooArgSet(t, terr, tid, mass)
+data = RooDataSet('data', 'data', obs)
+mass.setVal(5320.)
+terr.setVal(0.05)
+for tv, idv in ((5., 1.), (4., 12.), (0.3, 99.)):
+    t.setVal(tv)
+    tid.setVal(idv)
+    for i in xrange(4000):
+        data.add(obs)
+
+smeared = smearing.smear(data, 't', 'terr', 'tid', 'mass', 0.1, 0.,
+        myconfigfile['timeRange'], rnd)
+assert 12000 == data.numEntries()
+assert 8000 == smeared.numEntries(), smeared.numEntries()
+cols = dataSetToArrays(smeared)
+sig, bd = cols['tid'] == 1., cols['tid'] == 12.
+assert 4000 == sig.sum() and 4000 == bd.sum()
+assert (numpy.abs(cols['t'][sig] - 5.1) < 1e-9).all()
+checkHisto(4. / (cols['t'][bd] - 0.1), histos['5300_5350'])
+
+smeared = smearing.smear(data, 't', 'terr', 'tid', 'mass', 0., 2.,
+        myconfigfile['timeRange'], rnd)
+cols = dataSetToArrays(smeared)
+tsig = cols['t'][cols['tid'] == 1.]
+assert abs(tsig.mean() - 5.) < 5. * 0.1 / math.sqrt(len(tsig)), tsig.mean()
+assert abs(tsig.std() - 0.1) < 5. * 0.1 / math.sqrt(2. * len(tsig)), \
+        tsig.std()
+print 'test_kfactorutils: OK'
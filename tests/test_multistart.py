@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test the multi-start fit driver (multistart)             #
+#                                                                             #
+#   It fits the two means of a mixture of two gaussians with fixed, unequal   #
+#   fractions, which has a second (local) minimum with the means swapped.     #
+#   The nominal start is in the local minimum's basin, the randomised ones    #
+#   (fitted in worker processes) cover both. It checks that the starting      #
+#   points are independent and do not depend on the number of workers, that   #
+#   the global minimum is found and kept, and that the spread of the minima   #
+#   is recorded.                                                              #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_multistart.py                                                   #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import os, tempfile, shutil
+import B2DXFitters
+import ROOT
+from ROOT import RooFit, RooRealVar, RooGaussian, RooAddPdf, RooArgSet
+from ROOT import RooArgList
+from B2DXFitters.multistart import multiStartFit, drawStartingPoints
+
+x = RooRealVar('x', 'x', -10., 10.)
+mean1 = RooRealVar('mean1', 'mean1', 3., -5., 5.)
+mean2 = RooRealVar('mean2', 'mean2', -3., -5., 5.)
+sigma = RooRealVar('sigma', 'sigma', 1.)
+frac = RooRealVar('frac', 'frac', 0.7)
+g1 = RooGaussian('g1', 'g1', x, mean1, sigma)
+g2 = RooGaussian('g2', 'g2', x, mean2, sigma)
+pdf = RooAddPdf('mixture', 'mixture', RooArgList(g1, g2), RooArgList(frac))
+ROOT.RooRandom.randomGenerator().SetSeed(4321)
+data = pdf.generate(RooArgSet(x), 4000)
+ROOT.SetOwnership(data, True)
+
+# nominal start with the means swapped: MIGRAD ends in the local minimum
+# (mean1 = -3, mean2 = 3), which is about 1700 units of NLL above the global
+# one; starting points with mean1 > mean2 lead to the global minimum
+nominal = (-3., 3.)
+config = { 'randomiseParams': { 'mean1': { 'min': -5., 'max': 5. },
+    'mean2': { 'min': -5., 'max': 5. } } }
+nstarts = 8
+mean1.setVal(nominal[0])
+mean2.setVal(nominal[1])
+params = pdf.getParameters(data)
+starts = drawStartingPoints(config, params, nstarts, 1234)
+assert starts[0] == { 'mean1': nominal[0], 'mean2': nominal[1] }
+assert starts == drawStartingPoints(config, params, nstarts, 1234)
+# independent draws for different parameters and starting points
+assert len(set(s['mean1'] for s in starts)) == nstarts
+assert all(s['mean1'] != s['mean2'] for s in starts[1:])
+assert any(s['mean1'] > s['mean2'] for s in starts[1:])
+
+tmpdir = tempfile.mkdtemp(prefix = 'test_multistart_')
+try:
+    results = []
+    for nworkers in (1, 3):
+        mean1.setVal(nominal[0])
+        mean2.setVal(nominal[1])
+        result, summary = multiStartFit(pdf, data, config, nstarts, 1234,
+                [ RooFit.PrintLevel(-1) ], nworkers,
+                fileName = os.path.join(tmpdir, 'ms_%d.root' % nworkers))
+        fits = summary['fits']
+        assert nstarts == len(fits) and nstarts == summary['nConverged']
+        # the nominal start is stuck in the local minimum ...
+        assert fits[0]['values']['mean1'] < 0. and fits[0]['deltaNll'] > 100.
+        # ... and the best fit is the global one
+        best = fits[summary['best']]
+        assert all(f['minNll'] >= best['minNll'] for f in fits)
+        assert abs(best['values']['mean1'] - 3.) < 0.1
+        assert abs(best['values']['mean2'] + 3.) < 0.1
+        assert abs(result.minNll() - best['minNll']) < 1e-9
+        assert abs(mean1.getVal() - best['values']['mean1']) < 1e-12
+        assert 0 < summary['nAtMinimum'] < summary['nConverged']
+        assert summary['spread']['mean1'] > 1.
+        results.append([ f['minNll'] for f in fits ])
+        f = ROOT.TFile.Open(os.path.join(tmpdir, 'ms_%d.root' % nworkers))
+        assert nstarts == f.Get('MultiStartTree').GetEntries()
+        f.Close()
+    # same fits, whatever the number of workers
+    assert all(abs(a - b) < 1e-6 for a, b in zip(*results))
+    print 'test_multistart: OK'
+finally:
+    shutil.rmtree(tmpdir, True)
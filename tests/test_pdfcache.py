@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test the on-disk pdf cache (pdfcache)                    #
+#                                                                             #
+#   It stores a small workspace with the dictionary referring to it, checks   #
+#   that the same configuration (in any dictionary order) loads it back with  #
+#   working references, and that changing the configuration or a file it      #
+#   refers to gives a new cache key, and that objects are imported into the   #
+#   live workspace only when the store succeeds.                              #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_pdfcache.py                                                     #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import os, tempfile, shutil
+import B2DXFitters
+import ROOT
+from B2DXFitters.WS import WS
+from B2DXFitters.pdfcache import PdfCache
+
+tmpdir = tempfile.mkdtemp(prefix = 'test_pdfcache_')
+try:
+    template = os.path.join(tmpdir, 'template.txt')
+    f = open(template, 'w')
+    f.write('template 1\n')
+    f.close()
+    config = { 'Mean': 1.5, 'Sigma': [ 0.5 ], 'Template': template }
+
+    def build(config):
+        ws = ROOT.RooWorkspace('workIn', 'workIn')
+        x = WS(ws, ROOT.RooRealVar('x', 'x', -10., 10.))
+        m = WS(ws, ROOT.RooRealVar('m', 'm', config['Mean']))
+        s = WS(ws, ROOT.RooRealVar('s', 's', config['Sigma'][0]))
+        pdf = WS(ws, ROOT.RooGaussian('g', 'g', x, m, s))
+        return { 'workspace': ws, 'pdf': pdf, 'obs': ROOT.RooArgSet(x),
+                'params': ( m, s ), 'nevents': 1000, 'none': None }
+
+    cache = PdfCache(os.path.join(tmpdir, 'cache'))
+    key = cache.key(config, 'GEN')
+    assert None == cache.load(key)
+    built = build(config)
+    assert cache.store(key, built['workspace'], built)
+    # same configuration, different dictionary order
+    key2 = cache.key(dict(reversed(config.items())), 'GEN')
+    assert key == key2
+    cached = cache.load(key2)
+    assert None != cached
+    assert 'g' == cached['pdf'].GetName()
+    assert cached['workspace'].pdf('g') == cached['pdf']
+    assert 1 == cached['obs'].getSize() and None != cached['obs'].find('x')
+    assert abs(cached['params'][0].getVal() - 1.5) < 1e-12
+    assert 1000 == cached['nevents'] and None == cached['none']
+    cached['obs'].find('x').setVal(1.5)
+    assert abs(cached['pdf'].getVal() - 1.) < 1e-12
+
+    # invalidation: configuration, referenced file, other context
+    assert key != cache.key(dict(config, Mean = 1.6), 'GEN')
+    assert key != cache.key(config, 'FIT')
+    f = open(template, 'w')
+    f.write('template 2\n')
+    f.close()
+    assert key != cache.key(config, 'GEN')
+    # python objects cannot be cached, and a failed store leaves the live
+    # workspace alone
+    ws = built['workspace']
+    e = ROOT.RooRealVar('e', 'e', 1.)
+    assert not cache.store('x', ws, [ e, object() ])
+    assert None == ws.obj('e')
+    # objects new to the workspace are imported once the entry is stored
+    assert cache.store('y', ws, { 'workspace': ws, 'e': e })
+    assert None != ws.var('e')
+    print 'test_pdfcache: OK'
+finally:
+    shutil.rmtree(tmpdir, True)
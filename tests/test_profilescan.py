@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test the profile likelihood scan engine (profilescan)    #
+#                                                                             #
+#   It scans the coefficients of a cubic polynomial on [0, 1], which are      #
+#   strongly correlated, so the other coefficients move along the profile.    #
+#   The scan runs in a pool of worker processes on grids centred on the       #
+#   minimum. It checks each profile point against an independent fit with     #
+#   the scanned coefficient fixed, the curvature of the profile against the   #
+#   fitted error, that grid refinement adds points near the minimum, and      #
+#   that the profile can be read back from its columnar file.                 #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_profilescan.py                                                  #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import os, tempfile, shutil
+import B2DXFitters
+import ROOT
+from ROOT import RooFit, RooRealVar, RooPolynomial, RooArgSet, RooArgList
+from B2DXFitters.profilescan import profileScan, makeGrid
+from B2DXFitters.datasetio import readColumnarFile
+
+x = RooRealVar('x', 'x', 0., 1.)
+c1 = RooRealVar('c1', 'c1', 0.5, -5., 5.)
+c2 = RooRealVar('c2', 'c2', 0.3, -5., 5.)
+c3 = RooRealVar('c3', 'c3', 0., -5., 5.)
+pdf = RooPolynomial('poly', 'poly', x, RooArgList(c1, c2, c3))
+ROOT.RooRandom.randomGenerator().SetSeed(7)
+data = pdf.generate(RooArgSet(x), 20000)
+ROOT.SetOwnership(data, True)
+fitOpts = [ RooFit.PrintLevel(-1) ]
+
+def fit():
+    result = pdf.fitTo(data, RooFit.Save(True), *fitOpts)
+    ROOT.SetOwnership(result, True)
+    assert 0 == result.status()
+    return result
+
+# global minimum, to centre the grids on
+fit()
+best = [ (c.getVal(), c.getError()) for c in (c1, c2, c3) ]
+
+tmpdir = tempfile.mkdtemp(prefix = 'test_profilescan_')
+try:
+    # 1D scan of c1 over +/- 2.5 sigma, one chain per direction
+    mu, err = best[0]
+    profile = profileScan(pdf, data, [ 'c1' ],
+            [ makeGrid(mu - 2.5 * err, mu + 2.5 * err, 11) ], fitOpts, 2)
+    assert -1 == profile['level'][0] and 12 == len(profile['c1'])
+    assert all(0 == s for s in profile['status'])
+    assert not c1.isConstant() and abs(c1.getVal() - mu) < 1e-9
+    # the profile has its minimum at the global fit, and the curvature the
+    # fitted error implies (the likelihood is not quite parabolic)
+    assert abs(profile['deltaNll'][0]) < 1e-3
+    for m, d in zip(profile['c1'][1:], profile['deltaNll'][1:]):
+        expected = 0.5 * ((m - mu) / err) ** 2
+        assert abs(d - expected) < 0.25 * expected + 0.02, (m, d)
+    # c2 is anticorrelated with c1, so it is profiled away along the scan
+    c2fit = profile['c2_fit'][1:]
+    assert all(b < a for a, b in zip(c2fit[:-1], c2fit[1:]))
+    assert c2fit[0] - c2fit[-1] > 2. * best[1][1]
+    # every point agrees with a fit from the global minimum with c1 fixed
+    c1.setConstant(True)
+    for m, nll in zip(profile['c1'][1:], profile['minNll'][1:]):
+        for c, (val, e) in zip((c1, c2, c3), best):
+            c.setVal(val)
+        c1.setVal(m)
+        assert abs(fit().minNll() - nll) < 1e-3, (m, nll)
+    c1.setConstant(False)
+    for c, (val, e) in zip((c1, c2, c3), best):
+        c.setVal(val)
+        c.setError(e)
+
+    # 2D scan of c1 and c2 (c3 profiled) with refinement, saved to file
+    fileName = os.path.join(tmpdir, 'profile.col')
+    profile = profileScan(pdf, data, [ 'c1', 'c2' ],
+            [ makeGrid(v - 2. * e, v + 2. * e, 5) for v, e in best[:2] ],
+            fitOpts, 4, refine = 1, refineBelow = 1., fileName = fileName)
+    levels = list(profile['level'])
+    assert 25 == levels.count(0) and levels.count(1) > 0
+    refined = profile['level'] == 1
+    assert profile['deltaNll'][refined].max() < 1. + 2.
+    hdr, cols = readColumnarFile(fileName)
+    assert [ 'c1', 'c2' ] == hdr['extra']['scanPars']
+    assert len(levels) == hdr['entries']
+    assert all(cols['deltaNll'] == profile['deltaNll'])
+    print 'test_profilescan: OK'
+finally:
+    shutil.rmtree(tmpdir, True)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test datasetio.sortDataSetByCategories                   #
+#                                                                             #
+#   It sorts a toy data set by sample, qt and qf, both into a copy and in     #
+#   place, checks that the result is identical to splitting the data set by   #
+#   category with reduce and appending the pieces (the old way of sorting),   #
+#   and prints the time taken by each.                                        #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_sortDataSetByCategories.py [nevents]                            #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import sys, time, random
+import B2DXFitters
+import ROOT
+from ROOT import RooFit, RooRealVar, RooCategory, RooArgSet, RooDataSet
+from B2DXFitters.datasetio import sortDataSetByCategories, compareDataSets
+
+nevents = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+mass = RooRealVar('mass', 'mass', 5300., 5800.)
+sample = RooCategory('sample', 'sample')
+for i, label in enumerate([ 'nonres', 'phipi', 'kstk', 'kpipi' ]):
+    sample.defineType(label, i)
+qt = RooCategory('qt', 'qt')
+qt.defineType('B', +1)
+qt.defineType('Bbar', -1)
+qt.defineType('untagged', 0)
+qf = RooCategory('qf', 'qf')
+qf.defineType('h+', +1)
+qf.defineType('h-', -1)
+cats = [ sample, qt, qf ]
+
+random.seed(42)
+data = RooDataSet('data', 'data', RooArgSet(mass, sample, qt, qf))
+for i in xrange(0, nevents):
+    mass.setVal(random.uniform(5300., 5800.))
+    sample.setIndex(random.choice([ 0, 1, 2, 3 ]))
+    qt.setIndex(random.choice([ -1, 0, 1 ]))
+    qf.setIndex(random.choice([ -1, 1 ]))
+    data.add(RooArgSet(mass, sample, qt, qf))
+
+# reference: split by category, and append the pieces
+t0 = time.time()
+oldds = [ data ]
+for s in cats:
+    newds = [ ]
+    for ds in oldds:
+        it = s.typeIterator()
+        while True:
+            obj = it.Next()
+            if None == obj: break
+            newds.append(ds.reduce(
+                RooFit.Cut('%s==%s' % (s.GetName(), obj.getVal()))))
+            ROOT.SetOwnership(newds[-1], True)
+    oldds = newds
+    while len(oldds) > 1:
+        oldds[0].append(oldds[1])
+        del oldds[1]
+reference = oldds[0]
+t1 = time.time()
+sorted1 = sortDataSetByCategories(data, cats)
+t2 = time.time()
+sorted2 = sortDataSetByCategories(data, [ 'sample', 'qt', 'qf' ], True)
+t3 = time.time()
+assert sorted2 == data
+
+print 'reduce/append: %.2f s, copy: %.2f s, in place: %.2f s' % (t1 - t0,
+        t2 - t1, t3 - t2)
+for ds in (sorted1, sorted2):
+    diffs = compareDataSets(reference, ds)
+    assert 0 == len(diffs), diffs
+print 'test_sortDataSetByCategories: OK'
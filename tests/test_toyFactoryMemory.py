@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to measure the peak memory of toyFactory.py                 #
+#                                                                             #
+#   It generates the same toy twice, once assembling the final data set by    #
+#   merging/appending copies (default) and once by streaming the generated    #
+#   events into it (--streamAssembly), prints the peak resident memory and    #
+#   time of both jobs, and checks that both give the same per-mode data       #
+#   sets, and that streaming needs less memory.                               #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_toyFactoryMemory.py [configfile] [seed]                         #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import os, sys, time, subprocess, tempfile, shutil
+import B2DXFitters
+import ROOT
+from ROOT import TFile
+
+here = os.path.dirname(os.path.abspath(__file__))
+config = sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, '..', 'data',
+        'toyFactoryConfig.py')
+seed = sys.argv[2] if len(sys.argv) > 2 else '12345'
+script = os.path.join(here, '..', 'scripts', 'toyFactory.py')
+
+tmpdir = tempfile.mkdtemp(prefix = 'test_toyFactoryMemory_')
+results = {}
+try:
+    for name, extra in (('copies', []), ('streaming', [ '--streamAssembly' ])):
+        outdir = os.path.join(tmpdir, name) + '/'
+        os.mkdir(outdir)
+        start = time.time()
+        p = subprocess.Popen([ sys.executable, script, '--configName', config,
+            '--seed', seed, '--outputdir', outdir ] + extra,
+            stdout = open(os.path.join(outdir, 'log'), 'w'),
+            stderr = subprocess.STDOUT)
+        pid, status, usage = os.wait4(p.pid, 0)
+        if 0 != status:
+            print 'ERROR: toyFactory.py failed, see %slog' % outdir
+            sys.exit(1)
+        # ru_maxrss is in kB on Linux
+        results[name] = (time.time() - start, usage.ru_maxrss / 1024.)
+
+    print 72 * '#'
+    print '%-12s %10s %16s' % ('assembly', 'time [s]', 'peak RSS [MB]')
+    for k in ('copies', 'streaming'):
+        print '%-12s %10.1f %16.1f' % ((k, ) + results[k])
+    print 72 * '#'
+
+    # both must give the same per-mode data sets (names and sizes)
+    data = []
+    for name in ('copies', 'streaming'):
+        f = TFile(os.path.join(tmpdir, name, 'toyFactoryWorkFile.root'))
+        ws = f.Get('workspace')
+        d = ws.allData()
+        data.append(dict((d.at(i).GetName(), d.at(i).numEntries())
+            for i in xrange(d.GetSize())))
+        f.Close()
+    assert data[0] == data[1], ('per-mode data sets differ', data)
+    # streaming into the final data set is there to save the copies
+    assert results['streaming'][1] < results['copies'][1], (
+            'streaming assembly does not lower the peak RSS', results)
+    print 'test_toyFactoryMemory: OK'
+finally:
+    shutil.rmtree(tmpdir, True)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test the in-process generate-and-fit pipeline            #
+#   (toypipeline)                                                             #
+#                                                                             #
+#   It loads an exponential decay time fit model from a python file, fits     #
+#   data sets generated in memory with different decay rates with the same    #
+#   ToyFitter, and checks that each fit starts from the initial parameter     #
+#   values (so the result does not depend on the toys fitted before), that    #
+#   each fit finds the rate it was generated with, and that fit result and    #
+#   pull tree are written.                                                    #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_toypipeline.py                                                  #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import os, tempfile, shutil
+import B2DXFitters
+import ROOT
+from ROOT import RooFit
+from B2DXFitters.toypipeline import ToyFitter, loadFitModel
+
+fitModel = '''
+from ROOT import RooFit, RooRealVar, RooFormulaVar, RooExponential, RooArgList
+from B2DXFitters.WS import WS
+def getfitmodel(ws, myconfigfile, debug):
+    t = WS(ws, RooRealVar('time', 'time', 0.2, 15.))
+    gamma = WS(ws, RooRealVar('Gamma', 'Gamma', myconfigfile['Gamma'],
+        0.1, 5.))
+    rate = WS(ws, RooFormulaVar('rate', 'rate', '-@0', RooArgList(gamma)))
+    pdf = WS(ws, RooExponential('decay', 'decay', t, rate))
+    return { 'PDF': pdf, 'FitOptions': [ RooFit.Hesse(True) ],
+            'GenValues': { 'Gamma': myconfigfile['Gamma'] } }
+'''
+
+tmpdir = tempfile.mkdtemp(prefix = 'test_toypipeline_')
+try:
+    fname = os.path.join(tmpdir, 'decayFitModel.py')
+    f = open(fname, 'w')
+    f.write(fitModel)
+    f.close()
+    fitter = ToyFitter(loadFitModel(fname), { 'Gamma': 0.66 })
+
+    # toys with different rates: a fit starting from the previous result
+    # would start far from the initial value
+    t = ROOT.RooRealVar('time', 'time', 0.2, 15.)
+    rates = ( 0.66, 2.0, 0.3 )
+    ROOT.RooRandom.randomGenerator().SetSeed(17)
+    toys = []
+    for g in rates:
+        rate = ROOT.RooRealVar('rate', 'rate', -g)
+        gen = ROOT.RooExponential('gen', 'gen', t, rate)
+        toys.append(gen.generate(ROOT.RooArgSet(t), 3000))
+        ROOT.SetOwnership(toys[-1], True)
+
+    results = []
+    for i, (g, data) in enumerate(zip(rates, toys)):
+        r = fitter.fitAndSave(data, os.path.join(tmpdir, 'fit_%d.root' % i),
+                os.path.join(tmpdir, 'pull_%d.root' % i))
+        assert 0 == r.status(), r.status()
+        init = r.floatParsInit().find('Gamma')
+        assert abs(init.getVal() - 0.66) < 1e-12, init.getVal()
+        final = r.floatParsFinal().find('Gamma')
+        assert abs(final.getVal() - g) < 5. * final.getError(), (g,
+                final.getVal())
+        results.append(final.getVal())
+    # refitting the first toy gives the same result
+    again = fitter.fit(toys[0]).floatParsFinal().find('Gamma').getVal()
+    assert abs(again - results[0]) < 1e-6, (again, results[0])
+
+    pf = ROOT.TFile.Open(os.path.join(tmpdir, 'pull_2.root'))
+    t = pf.Get('PullTree')
+    assert 1 == t.GetEntries()
+    t.GetEntry(0)
+    assert abs(t.Gamma_gen - 0.66) < 1e-6
+    assert abs(t.Gamma_fit - results[2]) < 1e-5
+    pf.Close()
+    rf = ROOT.TFile.Open(os.path.join(tmpdir, 'fit_0.root'))
+    assert rf.Get('fitresult')
+    rf.Close()
+    print 'test_toypipeline: OK'
+finally:
+    shutil.rmtree(tmpdir, True)
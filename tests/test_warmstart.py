@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# --------------------------------------------------------------------------- #
+#                                                                             #
+#   Python script to test the fit warm-start store (warmstart)                #
+#                                                                             #
+#   It fits a mass-like model (gaussian signal on exponential background),    #
+#   stores the result, and checks that a new fit of the same model to the     #
+#   same data starts from the stored minimum, that a fit to a perturbed copy  #
+#   of the data (a few events more) starts from the result on the original    #
+#   and ends close to it, that a model with fewer floating parameters starts  #
+#   from the closest stored result, and that data set fingerprints depend on  #
+#   the contents only.                                                        #
+#                                                                             #
+#   Example usage:                                                            #
+#      ./test_warmstart.py                                                    #
+#                                                                             #
+# --------------------------------------------------------------------------- #
+
+import os, tempfile, shutil
+import B2DXFitters
+import ROOT
+from ROOT import RooFit, RooRealVar, RooGaussian, RooExponential, RooAddPdf
+from ROOT import RooArgSet, RooArgList, RooDataSet
+from B2DXFitters.warmstart import WarmStartStore, dataSetFingerprint
+
+mass = RooRealVar('mass', 'mass', 5100., 5600.)
+mean = RooRealVar('mean', 'mean', 5280., 5200., 5350.)
+sigma = RooRealVar('sigma', 'sigma', 20., 5., 50.)
+slope = RooRealVar('slope', 'slope', -3e-3, -1e-2, 0.)
+frac = RooRealVar('frac', 'frac', 0.4, 0., 1.)
+sig = RooGaussian('sig', 'sig', mass, mean, sigma)
+bkg = RooExponential('bkg', 'bkg', mass, slope)
+pdf = RooAddPdf('model', 'model', RooArgList(sig, bkg), RooArgList(frac))
+ROOT.RooRandom.randomGenerator().SetSeed(4242)
+data = pdf.generate(RooArgSet(mass), 3000)
+ROOT.SetOwnership(data, True)
+# perturbed copy: the same events, and a few more
+perturbed = RooDataSet(data, 'perturbed')
+ROOT.SetOwnership(perturbed, True)
+extra = pdf.generate(RooArgSet(mass), 30)
+ROOT.SetOwnership(extra, True)
+perturbed.append(extra)
+copy = RooDataSet(data, 'copy')
+ROOT.SetOwnership(copy, True)
+assert dataSetFingerprint(data) == dataSetFingerprint(copy)
+assert dataSetFingerprint(data) != dataSetFingerprint(perturbed)
+
+def fit(data):
+    result = pdf.fitTo(data, RooFit.Save(True), RooFit.PrintLevel(-1))
+    ROOT.SetOwnership(result, True)
+    assert 0 == result.status()
+    return result
+
+def values():
+    return tuple(p.getVal() for p in (mean, sigma, slope, frac))
+
+tmpdir = tempfile.mkdtemp(prefix = 'test_warmstart_')
+try:
+    fileName = os.path.join(tmpdir, 'warmstart.sqlite')
+    store = WarmStartStore(fileName)
+    assert None == store.warmStart(pdf, data)
+    result = fit(data)
+    assert store.record(pdf, data, result)
+    fitted, fittedErr = values(), mean.getError()
+
+    # same model, same data (new store on the same file): start at minimum
+    mean.setVal(5250.)
+    sigma.setVal(30.)
+    mean.setError(10.)
+    entry = WarmStartStore(fileName).warmStart(pdf, data)
+    assert None != entry and entry['exact'] and 1. == entry['overlap']
+    assert values() == fitted and mean.getError() == fittedErr
+    assert 4 == len(entry['covariance'])
+    assert abs(fit(data).minNll() - result.minNll()) < 1e-6
+
+    # perturbed data: start from the result on the original data, end close
+    mean.setVal(5250.)
+    entry = store.warmStart(pdf, perturbed)
+    assert None != entry and not entry['exact'] and 1. == entry['overlap']
+    assert values() == fitted
+    result2 = fit(perturbed)
+    assert abs(mean.getVal() - fitted[0]) < fittedErr
+    assert store.record(pdf, perturbed, result2)
+    fitted2 = values()
+    # each data set now starts from its own result
+    assert store.warmStart(pdf, perturbed)['exact'] and values() == fitted2
+    assert store.warmStart(pdf, copy)['exact'] and values() == fitted
+
+    # fewer floating parameters: closest stored result on the same data
+    slope.setConstant(True)
+    mean.setVal(5250.)
+    entry = store.warmStart(pdf, data)
+    assert None != entry and not entry['exact'] and 0.75 == entry['overlap']
+    assert mean.getVal() == fitted[0]
+    assert None == store.warmStart(pdf, data, minOverlap = 0.8)
+    print 'test_warmstart: OK'
+finally:
+    shutil.rmtree(tmpdir, True)